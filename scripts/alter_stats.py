@@ -1,10 +1,34 @@
 import argparse
 import json
+import os
 import re
-from rich.console import Console
-from data_analytics import augment_json, load_json, print_infos, METRICS
-
-ACTIONS = ['fullrun', 'remove_modules', 'remove_metric', 'scale', 'fullscale']
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from data_analytics import load_json, print_infos, METRICS
+from group_matcher import CachedGroupMatcher
+from resources_io import dump_resources, is_dataset
+
+ACTIONS = ['fullrun', 'remove_modules', 'remove_metric', 'scale', 'fullscale', 'hs23']
+
+# options of each action, and their default values
+ACTION_OPTIONS = {
+    'fullrun': {},
+    'remove_modules': {'filter': '.*'},
+    'remove_metric': {'filter': '.*', 'metric': 'time_real'},
+    'scale': {'filter': '.*', 'metric': 'time_real', 'scale': 1.},
+    'fullscale': {'metric': 'time_real', 'scale': 1., 'add_metric': ''},
+    'hs23': {'score': None},
+}
+
+# metrics converted by the hs23 action, and their description
+HS23_METRICS = {
+    'time_real': 'real time',
+    'time_thread': 'cpu time',
+    'time_real_abs': 'real time abs',
+    'time_thread_abs': 'cpu time abs',
+}
 
 def parse_arguments():
     parser = argparse.ArgumentParser(
@@ -12,7 +36,7 @@ def parse_arguments():
         f"""Alter JSON data based on input parameters.
 
         The script allows the user to perform the following actions: {ACTIONS}.
-        Only one action can be performed at a time.
+        A single action can be given with the --action option, or a sequence of actions with the --pipeline option.
 
         The actions are:
 
@@ -27,11 +51,24 @@ def parse_arguments():
 
         - fullscale: Scale a metric (specified via the metric option) from the input JSON for all modules. This action ignores the filter option. The scale factor is passed by via the scale option. If the option add_metric is set to a non-empty string, that string will be added to the metric name in the output JSON and will contain the scaled version of the to-be-scaled metric. Otherwise the to-be-scaled metric will be overwritten.
 
+        - hs23: Add the HS23-normalised metrics hs23_time_real, hs23_time_thread, hs23_time_real_abs and hs23_time_thread_abs to the input JSON, for all modules and for the total. Each one is the corresponding time, in seconds, multiplied by the HS23 score per thread of the machine that produced the input JSON, so that its value per event is the capacity in HS23/Hz. The absolute times are computed as by the fullrun action, if they are not in the input JSON yet.
+                 The score is passed via the score option of the step, or looked up in the table given by the hs23-table option, by the name of the machine (see the machine option).
+
+        The pipeline file is a JSON list of steps, each one a dictionary with the action and its options, for example:
+
+            [
+                {{"action": "fullrun"}},
+                {{"action": "remove_modules", "filter": "^DQM"}},
+                {{"action": "scale", "filter": "^Muons", "metric": "time_real", "scale": 0.8}},
+                {{"action": "fullscale", "metric": "time_real_abs", "scale": 1.2, "add_metric": "hs23_time_real_abs"}}
+            ]
+
+        The options missing from a step take the same default values as the command line options.
         """,
         formatter_class=argparse.RawTextHelpFormatter
     )
 
-    parser.add_argument('--input-file', required=True, help='Path to the input JSON files to be read, comma separated.')
+    parser.add_argument('--input-file', required=True, help='Path to the input JSON files to be read, comma separated. A directory stands for all the JSON files it contains, and requires --output-dir or --inplace.')
     parser.add_argument('--group-file', required=True, help='Path to the JSON file responsible for grouping.')
     parser.add_argument('--metric', choices=METRICS, default='time_real',
                         help="""Quantity to modify. Valid values are 'mem_alloc', 'mem_free',
@@ -43,155 +80,364 @@ def parse_arguments():
                         help="""Regular expression that is used to filter the output results.
                         Default is '.*'.""")
     parser.add_argument('--action', choices=ACTIONS, default='scale', help='Action to perform. Default is scale.')
+    parser.add_argument('--pipeline', type=str, default=None, help='Path to a JSON file with the list of actions to perform, instead of --action.')
     parser.add_argument('--scale', type=float, default=1., help='Scale factor to apply to the specified metric to all filtered modules. Default is 1.')
     parser.add_argument('--inplace', action="store_true", default=False, help='Overwrite the original input-file.')
-
-    return parser.parse_args()
-
-def fullrun_json(input_data, debug):
-    time_real_abs = 0.
-    time_thread_abs = 0.
-
-    events = input_data['total']['events']
-    input_data['resources'].append({'time_real_abs': 'real time abs'})
-    input_data['resources'].append({'time_thread_abs': 'cpu time abs'})
-
-    for k in input_data['modules']:
-        if k['events'] > 0:
-            if k['label'] != "other":
-                k['time_real_abs'] = k['time_real']/k['events']*events
-                k['time_thread_abs'] = k['time_thread']/k['events']*events
-            else:
-                k['time_real_abs'] = k['time_real']
-                k['time_thread_abs'] = k['time_thread']
-            time_real_abs += k['time_real_abs']
-            time_thread_abs += k['time_thread_abs']
+    parser.add_argument('--output', default=None, help='Path to the output JSON file, compressed if it ends with .gz or .br. Default is the input-file with a _scaled suffix. Only valid with a single input file.')
+    parser.add_argument('--output-dir', default=None, help='Write the output files to this directory, with the same name as the input files (relative to the input directory, if one is given). Two inputs with the same name are refused.')
+    parser.add_argument('--hs23-table', default=None, help='Path to a JSON file with the HS23 score of each machine: either the score per thread, or a dictionary with the "hs23" score of the whole machine and the number of "threads". Used by the hs23 action.')
+    parser.add_argument('--machine', default=None, help='Name of the machine in the HS23 table that produced all the input files. Default is the name of the directory in the path of each input file that matches one of the machines in the table.')
+    parser.add_argument('--compact', action="store_true", default=False, help='Write compact JSON, without indentation.')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of input files to process in parallel. Default is 1.')
+
+    args = parser.parse_args()
+    if args.output and args.output_dir:
+        parser.error('--output and --output-dir cannot be used together')
+    # the _scaled.json files written next to the inputs would be read again by the next run
+    if not (args.output_dir or args.inplace) and any(os.path.isdir(path) for path in args.input_file.split(',')):
+        parser.error('the files in a directory can only be written with --output-dir or --inplace')
+    return args
+
+def load_pipeline(steps):
+    """
+    Validate a list of steps, each one a dictionary with an "action" and its
+    options, and return them with the missing options set to their defaults.
+    """
+    if not isinstance(steps, list):
+        raise SystemExit("ERROR: the pipeline must be a list of steps")
+    pipeline = []
+    for i, step in enumerate(steps):
+        if not isinstance(step, dict) or step.get('action') not in ACTION_OPTIONS:
+            raise SystemExit(f"ERROR: step {i} of the pipeline must have an action among {', '.join(ACTIONS)}")
+        options = ACTION_OPTIONS[step['action']]
+        unknown = set(step) - set(options) - {'action'}
+        if unknown:
+            raise SystemExit(f"ERROR: invalid options for the {step['action']} action in step {i}: {', '.join(sorted(unknown))}")
+        step = dict(options, **step)
+        if 'metric' in step and step['metric'] not in METRICS:
+            raise SystemExit(f"ERROR: invalid metric '{step['metric']}' in step {i}, valid values are {', '.join(METRICS)}")
+        if step['action'] == 'hs23' and step['score'] is not None and not isinstance(step['score'], (int, float)):
+            raise SystemExit(f"ERROR: invalid score '{step['score']}' in step {i}, it must be a number")
+        if 'filter' in step:
+            try:
+                re.compile(step['filter'])
+            except re.error as e:
+                raise SystemExit(f"ERROR: invalid filter '{step['filter']}' in step {i}: {e}")
+        pipeline.append(step)
+    return pipeline
+
+class ModuleColumns:
+    """
+    Vectorised view of the modules of a JSON file, used by the pipeline steps.
+
+    Each metric is converted once to an array (of integers if all its values
+    are integers, of floats otherwise), with a mask of the modules where it is
+    present, and each filter once to a mask of the matching modules; the steps then only work on the arrays. The modules are
+    updated by write_back(), only for the values that were changed, so that
+    the other values keep their original type.
+    """
+
+    def __init__(self, data, matcher):
+        self.data = data
+        self.modules = data['modules']
+        self.matcher = matcher
+        self.keep = np.ones(len(self.modules), dtype=bool)
+        self._expanded = None
+        self._masks = {}
+        self._columns = {}
+        # metric -> mask of the modules whose value was changed, in order of first change
+        self.changed = {}
+
+    def expanded(self):
+        """Return the "group|type|label" name of each module, as done by augment_json()."""
+        if self._expanded is None:
+            self._expanded = []
+            for module in self.modules:
+                group = self.matcher.match(module['type'], module['label'])
+                if group is None:
+                    group = "Unassigned"
+                self._expanded.append("|".join([group, module['type'], module['label']]))
+        return self._expanded
+
+    def matching(self, filter):
+        """Return a mask of the modules whose expanded name matches the filter."""
+        if filter not in self._masks:
+            regex = re.compile(filter)
+            names = self.expanded()
+            self._masks[filter] = np.fromiter((regex.search(name) is not None for name in names), dtype=bool, count=len(names))
+        return self._masks[filter]
+
+    def column(self, metric):
+        """Return the values of a metric, and a mask of the modules where it is present."""
+        if metric not in self._columns:
+            raw = [module.get(metric) for module in self.modules]
+            present = np.array([value is not None for value in raw], dtype=bool)
+            # integer metrics (e.g. the memory) are kept as integers, so that their sums are exact
+            dtype = np.int64 if all(value.__class__ is int for value in raw if value is not None) else np.float64
+            values = np.array([0 if value is None else value for value in raw], dtype=dtype)
+            self._columns[metric] = (values, present)
+        return self._columns[metric]
+
+    def update(self, metric, mask, values):
+        """Set the values of a metric for the modules selected by the mask."""
+        column, present = self.column(metric)
+        if column.dtype != values.dtype:
+            column = column.astype(np.result_type(column, values))
+            self._columns[metric] = (column, present)
+        column[mask] = values
+        present[mask] = True
+        self._touch(metric, mask)
+
+    def remove(self, metric, mask):
+        """Remove a metric from the modules selected by the mask."""
+        _, present = self.column(metric)
+        present[mask] = False
+        self._touch(metric, mask)
+
+    def _touch(self, metric, mask):
+        if metric in self.changed:
+            self.changed[metric] |= mask
         else:
-            k['time_real_abs'] = 0
-            k['time_thread_abs'] = 0
-
-    input_data['total']['time_real_abs'] = time_real_abs
-    input_data['total']['time_thread_abs'] = time_thread_abs
-
-    return input_data
-
-def remove_modules_json(input_data, group_data, filter, debug):
-    augmented_data = augment_json(input_data, group_data, debug)
-
-    total_changed = {key: 0 for key in METRICS}
-    for m in augmented_data['modules'][:]:  # Use a slice to create a copy:
-        if re.search(filter, m['expanded']):
-            original_dict = {key: m[key] for key in METRICS if key in m}
-            if debug:
-                print("Pruning ", m)
-            augmented_data['modules'].remove(m)
-            for k in original_dict:
-                augmented_data['total'][k] -= original_dict[k]
-                total_changed[k] -= original_dict[k]
-        del m['expanded']
-
+            self.changed[metric] = mask.copy()
+
+    def write_back(self):
+        """Apply the changes to the modules, and drop the removed ones."""
+        for metric, changed in self.changed.items():
+            values, present = self._columns[metric]
+            for i in np.flatnonzero(changed & self.keep):
+                if present[i]:
+                    self.modules[i][metric] = values[i].item()
+                else:
+                    self.modules[i].pop(metric, None)
+        if not self.keep.all():
+            self.data['modules'] = [module for module, keep in zip(self.modules, self.keep.tolist()) if keep]
+        return self.data
+
+def fullrun_step(columns, step, debug):
+    data = columns.data
+    total = data['total']
+    data['resources'].append({'time_real_abs': 'real time abs'})
+    data['resources'].append({'time_thread_abs': 'cpu time abs'})
+
+    events, _ = columns.column('events')
+    other = np.array([module['label'] == "other" for module in columns.modules], dtype=bool)
+    active = events > 0
+    factor = np.where(other, 1., total['events'] / np.where(active, events, 1.))
+    for metric in ['time_real', 'time_thread']:
+        values, present = columns.column(metric)
+        mask = present & columns.keep
+        columns.update(metric + '_abs', mask, np.where(active, values * factor, 0.)[mask])
+        total[metric + '_abs'] = columns.column(metric + '_abs')[0][mask].sum().item()
+    if debug:
+        print(f"fullrun: time_real_abs {total['time_real_abs']}, time_thread_abs {total['time_thread_abs']}")
+
+def remove_modules_step(columns, step, debug):
+    mask = columns.matching(step['filter']) & columns.keep
+    total = columns.data['total']
+    total_changed = {}
+    for metric in METRICS:
+        if metric in total:
+            values, present = columns.column(metric)
+            removed = values[mask & present].sum().item()
+            total[metric] -= removed
+            total_changed[metric] = -removed
+    columns.keep &= ~mask
     if debug:
-        print(f"Total changed: {total_changed}")
-
-    return augmented_data
-
-def remove_metric_json(input_data, group_data, filter, metric, debug):
-    augmented_data = augment_json(input_data, group_data, debug)
-
-    total_changed = {key: 0 for key in METRICS}
-    for m in augmented_data['modules']:
-        if re.search(filter, m['expanded']) and metric in m:
-            original_dict = {key: m[key] for key in METRICS if key in m}
-            if debug:
-                print("Pruning ", m[metric])
-            del m[metric]
-            for k in original_dict:
-                if k == metric:
-                    augmented_data['total'][k] -= original_dict[k]
-                    total_changed[k] -= original_dict[k]
-        del m['expanded']
+        print(f"remove_modules: {np.count_nonzero(mask)} modules removed, total changed: {total_changed}")
+
+def remove_metric_step(columns, step, debug):
+    metric = step['metric']
+    values, present = columns.column(metric)
+    mask = columns.matching(step['filter']) & columns.keep & present
+    data = columns.data
+    removed = values[mask].sum().item()
+    if metric in data['total']:
+        data['total'][metric] -= removed
+    columns.remove(metric, mask)
 
     # Remove the metric from the resources and total if its total is close enough to 0
-    for m in augmented_data['resources']:
-        if metric in m and augmented_data['total'][metric] < 0.001:
-            augmented_data['resources'].remove(m)
-            del augmented_data['total'][metric]
+    if any(metric in r for r in data['resources']) and data['total'].get(metric, 0.) < 0.001:
+        data['resources'] = [r for r in data['resources'] if metric not in r]
+        data['total'].pop(metric, None)
 
     if debug:
-        print(f"Total changed: {total_changed}")
-
-    return augmented_data
-
-def scale_json(input_data, group_data, filter, metric, scale, debug):
-    augmented_data = augment_json(input_data, group_data, debug)
-
-    total_changed = {key: 0 for key in METRICS}
-    for m in augmented_data['modules'][:]:  # Use a slice to create a copy:
-        if re.search(filter, m['expanded']):
-            if metric in m:
-                original_dict = {key: m[key] for key in METRICS if key in m}
-                m[metric] *= scale
-                augmented_data['total'][metric] += m[metric] - original_dict[metric]
-                total_changed[metric] = m[metric] - original_dict[metric]
-            del m['expanded']
-
+        print(f"remove_metric: {metric} removed from {np.count_nonzero(mask)} modules, total changed: {-removed}")
+
+def scale_step(columns, step, debug):
+    metric = step['metric']
+    values, present = columns.column(metric)
+    mask = columns.matching(step['filter']) & columns.keep & present
+    scaled = values[mask] * step['scale']
+    delta = (scaled - values[mask]).sum().item()
+    total = columns.data['total']
+    total[metric] = total.get(metric, 0.) + delta
+    columns.update(metric, mask, scaled)
     if debug:
-        print(f"Total changed: {total_changed}")
-
-    return augmented_data
-
-def fullscale_json(input_data, group_data, metric, scale, add_metric,debug):
-    augmented_data = augment_json(input_data, group_data, debug)
-
-    total_changed = {key: 0 for key in METRICS}
-    for m in augmented_data['modules'][:]:  # Use a slice to create a copy:
-        if metric in m:
-            original_dict = {key: m[key] for key in METRICS if key in m}
-            actual_metric = add_metric if add_metric != "" else metric
-            m[actual_metric] = m[metric]
-            m[add_metric] *= scale
-            if not add_metric in augmented_data['total']:
-                augmented_data['total'][add_metric] = 0
-            augmented_data['total'][add_metric] += m[actual_metric]
-            total_changed[metric] = m[metric]
-        del m['expanded']
-
+        print(f"scale: {metric} scaled in {np.count_nonzero(mask)} modules, total changed: {delta}")
+
+def fullscale_step(columns, step, debug):
+    metric = step['metric']
+    target = step['add_metric'] or metric
+    values, present = columns.column(metric)
+    mask = columns.keep & present
+    scaled = values[mask] * step['scale']
+    data = columns.data
+    columns.update(target, mask, scaled)
+    if target == metric:
+        # all the modules are scaled, and so is the total
+        if metric in data['total']:
+            data['total'][metric] *= step['scale']
+    else:
+        data['total'][target] = scaled.sum().item()
+        # If the user added a new metric, add it to the resources
+        if not any(target in r for r in data['resources']):
+            data['resources'].append({target: target})
     if debug:
-        print(f"Total changed: {total_changed}")
-
-    # If the user added a new metric, add it to the resources
-    if add_metric != "":
-        augmented_data['resources'].append({add_metric: add_metric})
-
-    return augmented_data
+        print(f"fullscale: {metric} scaled into {target} in {np.count_nonzero(mask)} modules")
+
+def hs23_step(columns, step, debug):
+    data = columns.data
+    total = data['total']
+    if 'time_real_abs' not in total or 'time_thread_abs' not in total:
+        fullrun_step(columns, step, debug)
+
+    # the times are in ms
+    factor = step['score'] / 1000.
+    for metric, description in HS23_METRICS.items():
+        target = 'hs23_' + metric
+        values, present = columns.column(metric)
+        mask = columns.keep & present
+        columns.update(target, mask, values[mask] * factor)
+        total[target] = total[metric] * factor
+        if not any(target in r for r in data['resources']):
+            data['resources'].append({target: description + ' hs23'})
+    if debug:
+        print(f"hs23: score {step['score']}, " + ", ".join(f"hs23_{metric} {total['hs23_' + metric]}" for metric in HS23_METRICS))
+
+STEPS = {
+    'fullrun': fullrun_step,
+    'remove_modules': remove_modules_step,
+    'remove_metric': remove_metric_step,
+    'scale': scale_step,
+    'fullscale': fullscale_step,
+    'hs23': hs23_step,
+}
+
+def apply_pipeline(input_data, matcher, pipeline, debug=False):
+    """
+    Apply the steps of a pipeline to the data of a JSON file, using a
+    CachedGroupMatcher. The modules are matched to their groups only once,
+    and only if a step needs it.
+    """
+    columns = ModuleColumns(input_data, matcher)
+    for step in pipeline:
+        STEPS[step['action']](columns, step, debug)
+    matcher.save()
+    return columns.write_back()
+
+_matchers = {}
+
+def alter_file(task):
+    """Apply a pipeline to one file; the group file is loaded once per process."""
+    input_file, output_file, group_file, pipeline, compact, debug = task
+    if group_file not in _matchers:
+        _matchers[group_file] = CachedGroupMatcher(load_json(group_file))
+    output_json = apply_pipeline(load_json(input_file), _matchers[group_file], pipeline, debug)
+    dump_resources(output_json, output_file, compact=compact, indent=4)
+    return input_file, output_file
+
+def load_hs23_table(path):
+    """Return the HS23 score per thread of each machine in an HS23 table."""
+    table = load_json(path)
+    scores = {}
+    for machine, entry in table.items():
+        if isinstance(entry, dict):
+            try:
+                scores[machine] = entry['hs23'] / entry['threads']
+            except (KeyError, TypeError, ZeroDivisionError):
+                raise SystemExit(f"ERROR: invalid HS23 score for {machine} in {path}, expected a dictionary with the 'hs23' score and the number of 'threads'")
+        elif isinstance(entry, (int, float)):
+            scores[machine] = entry
+        else:
+            raise SystemExit(f"ERROR: invalid HS23 score for {machine} in {path}")
+    return scores
+
+def machine_of(input_file, scores, machine=None):
+    """Return the machine of an input file: the given one, or the only directory in its path named after a machine."""
+    if machine is None:
+        parts = os.path.abspath(input_file).split(os.sep)[:-1]
+        machines = sorted(set(part for part in parts if part in scores))
+        if len(machines) != 1:
+            raise SystemExit(f"ERROR: cannot determine the machine of {input_file}, use --machine")
+        machine = machines[0]
+    if machine not in scores:
+        raise SystemExit(f"ERROR: the machine {machine} is not in the HS23 table")
+    return machine
+
+def file_pipeline(pipeline, input_file, scores, machine):
+    """Return the pipeline for an input file, with the HS23 score of its machine."""
+    if all(step['action'] != 'hs23' or step['score'] is not None for step in pipeline):
+        return pipeline
+    if scores is None:
+        raise SystemExit("ERROR: the hs23 action requires a score, or an HS23 table given with --hs23-table")
+    score = scores[machine_of(input_file, scores, machine)]
+    return [dict(step, score=score) if step['action'] == 'hs23' and step['score'] is None else step for step in pipeline]
+
+def find_inputs(input_file):
+    """Return the (input file, name relative to its directory) of the comma separated inputs."""
+    inputs = []
+    for path in input_file.split(','):
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                inputs.extend((os.path.join(root, name), os.path.relpath(os.path.join(root, name), path)) for name in sorted(files) if is_dataset(name))
+        else:
+            inputs.append((path, os.path.basename(path)))
+    return inputs
+
+def output_name(args, input_file, relative):
+    if args.output:
+        return args.output
+    if args.output_dir:
+        output_file = os.path.join(args.output_dir, relative)
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        return output_file
+    if args.inplace:
+        return input_file
+    return input_file.replace('.json', '_scaled.json')
 
 def main():
     args = parse_arguments()
 
-    # Load input data and group data
-    group_data = load_json(args.group_file)
-    input_data = load_json(args.input_file)
-    output_json = None
-
     print_infos(args)
 
-    if args.action == 'fullrun':
-        output_json = fullrun_json(input_data, args.debug)
-    elif args.action == 'remove_modules':
-        output_json = remove_modules_json(input_data, group_data, args.filter, args.debug)
-    elif args.action == 'remove_metric':
-        output_json = remove_metric_json(input_data, group_data, args.filter, args.metric, args.debug)
-    elif args.action == 'scale':
-        output_json = scale_json(input_data, group_data, args.filter, args.metric, args.scale, args.debug)
-    elif args.action == 'fullscale':
-        output_json = fullscale_json(input_data, group_data, args.metric, args.scale, args.add_metric, args.debug)
-
-    output_file = args.input_file
-    if not args.inplace:
-        output_file = args.input_file.replace('.json', '_scaled.json')
-    with open(output_file, 'w') as file:
-        json.dump(output_json, file, indent=4)
+    if args.pipeline:
+        with open(args.pipeline) as f:
+            pipeline = load_pipeline(json.load(f))
+    else:
+        step = {'action': args.action}
+        step.update({option: getattr(args, option, default) for option, default in ACTION_OPTIONS[args.action].items()})
+        pipeline = load_pipeline([step])
+
+    inputs = find_inputs(args.input_file)
+    if args.output and len(inputs) > 1:
+        raise SystemExit("ERROR: --output can only be used with a single input file, use --output-dir instead")
+
+    scores = load_hs23_table(args.hs23_table) if args.hs23_table else None
+    tasks = [(input_file, output_name(args, input_file, relative), args.group_file, file_pipeline(pipeline, input_file, scores, args.machine), args.compact, args.debug) for input_file, relative in inputs]
+    outputs = {}
+    for input_file, output_file, *_ in tasks:
+        key = os.path.normpath(output_file)
+        if key in outputs:
+            raise SystemExit(f"ERROR: {outputs[key]} and {input_file} would both be written to {output_file}, give their common parent directory as the input instead")
+        outputs[key] = input_file
+    if args.jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(alter_file, tasks))
+    else:
+        results = [alter_file(task) for task in tasks]
+    if len(results) > 1:
+        print(f"{len(results)} files written")
 
 if __name__ == "__main__":
     main()
-
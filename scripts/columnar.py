@@ -0,0 +1,279 @@
+#! /usr/bin/env python3
+"""
+Compact columnar storage for the "resources.json" files produced by the FastTimerService.
+
+The file starts with an 8-byte magic string and the length of a JSON header,
+followed by the header itself and by one binary array per module attribute,
+each aligned to 8 bytes so that it can be memory-mapped with NumPy:
+
+  - string attributes (type, label, ...) are stored as int32 indices into a
+    string table kept in the header;
+  - integer attributes are stored as int64, floating point ones as float64;
+  - the order of the attributes of each module is stored as an int32 index
+    into a table of layouts, so that missing attributes and the original key
+    order are preserved;
+  - the few values that do not fit the type of their column are kept in the
+    header, as sparse "extras".
+
+The top-level fields other than "modules" ("resources", "total", ...) are kept
+in the header as JSON. The conversion to and from JSON is lossless.
+"""
+
+import argparse
+import json
+import struct
+import sys
+from array import array
+
+MAGIC = b'CIRCLES\x01'
+VERSION = 1
+PREFIX = struct.Struct('<8sQ')
+ALIGNMENT = 8
+
+# kind of column -> (dtype on disk, array typecode)
+DTYPES = {
+    'str': ('<i4', 'i'),
+    'int': ('<i8', 'q'),
+    'float': ('<f8', 'd'),
+}
+LAYOUT = '<i4'
+
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+
+
+def align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def kind_of(value):
+    """Return the kind of column that can hold the value, or None if it has to be stored as JSON."""
+    cls = value.__class__
+    if cls is str:
+        return 'str'
+    if cls is int and INT64_MIN <= value <= INT64_MAX:
+        return 'int'
+    if cls is float:
+        return 'float'
+    return None
+
+
+def is_columnar(path):
+    """Check the magic string at the beginning of a file."""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_columnar(data, f):
+    """Write a resources.json document, already parsed, to a binary file object in the columnar format."""
+    modules = data.get("modules", [])
+
+    # the kind of each column is given by its first value
+    kinds = {}
+    layouts = []
+    layout_index = {}
+    layout = array('i')
+    for module in modules:
+        keys = tuple(module)
+        index = layout_index.get(keys)
+        if index is None:
+            index = layout_index[keys] = len(layouts)
+            layouts.append(list(keys))
+            for key in keys:
+                if key not in kinds:
+                    kinds[key] = kind_of(module[key])
+        layout.append(index)
+
+    strings = []
+    string_index = {}
+    columns = {key: array(DTYPES[kind][1], [0]) * len(modules) for key, kind in kinds.items() if kind is not None}
+    extras = {}
+    for row, module in enumerate(modules):
+        for key, value in module.items():
+            kind = kinds[key]
+            if kind is not None and kind_of(value) == kind:
+                if kind == 'str':
+                    index = string_index.get(value)
+                    if index is None:
+                        index = string_index[value] = len(strings)
+                        strings.append(value)
+                    value = index
+                columns[key][row] = value
+            else:
+                extras.setdefault(str(row), {})[key] = value
+
+    # lay out the arrays one after the other, after the layout column
+    offset = 0
+    blocks = []
+    header_columns = []
+    for key, kind in kinds.items():
+        if kind is None:
+            header_columns.append({"name": key, "kind": "json"})
+            continue
+        header_columns.append({"name": key, "kind": kind, "dtype": DTYPES[kind][0], "offset": offset})
+        blocks.append(columns[key])
+        offset = align(offset + len(modules) * columns[key].itemsize)
+    layout_offset = offset
+    blocks.append(layout)
+
+    header = {
+        "version": VERSION,
+        "rows": len(modules),
+        "document": {key: (None if key == "modules" else value) for key, value in data.items()},
+        "strings": strings,
+        "layouts": layouts,
+        "layout": {"dtype": LAYOUT, "offset": layout_offset},
+        "columns": header_columns,
+        "extras": extras,
+    }
+
+    encoded = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    f.write(PREFIX.pack(MAGIC, len(encoded)))
+    f.write(encoded)
+    position = PREFIX.size + len(encoded)
+    f.write(bytes(align(position) - position))
+    position = 0
+    for block in blocks:
+        if sys.byteorder != 'little':
+            block = array(block.typecode, block)
+            block.byteswap()
+        raw = block.tobytes()
+        f.write(raw)
+        position += len(raw)
+        f.write(bytes(align(position) - position))
+        position = align(position)
+
+
+class ColumnarResources:
+    """
+    Read-only view of a file in the columnar format.
+
+    column(name) returns the values of a module attribute as an array, memory-mapped
+    with NumPy if available; strings are returned as indices into self.strings.
+    values(name) returns the values of a module attribute as a list, like in the
+    original document. to_json() rebuilds the original resources.json document.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, 'rb') as f:
+            magic, length = PREFIX.unpack(f.read(PREFIX.size))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a file in the columnar format")
+            self.header = json.loads(f.read(length).decode('utf-8'))
+        if self.header.get("version") != VERSION:
+            raise ValueError(f"{self.path}: unsupported version {self.header.get('version')} of the columnar format")
+        self.base = align(PREFIX.size + length)
+        self.rows = self.header["rows"]
+        self.strings = self.header["strings"]
+        self.columns = {column["name"]: column for column in self.header["columns"]}
+
+    def _array(self, dtype, offset):
+        # NumPy is only imported when needed, since it is slow to load and takes a lot of memory
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        if numpy is not None:
+            if self.rows == 0:
+                return numpy.empty(0, dtype=dtype)
+            return numpy.memmap(self.path, dtype=dtype, mode='r', offset=self.base + offset, shape=(self.rows,))
+        typecode = {'<i4': 'i', '<i8': 'q', '<f8': 'd'}[dtype]
+        values = array(typecode)
+        with open(self.path, 'rb') as f:
+            f.seek(self.base + offset)
+            values.frombytes(f.read(self.rows * values.itemsize))
+        if sys.byteorder != 'little':
+            values.byteswap()
+        return values
+
+    def column(self, name):
+        column = self.columns[name]
+        if column["kind"] == "json":
+            raise ValueError(f"the column {name} is not stored as an array")
+        return self._array(column["dtype"], column["offset"])
+
+    def layout(self):
+        return self._array(self.header["layout"]["dtype"], self.header["layout"]["offset"])
+
+    def values(self, name):
+        """Return the values of a module attribute as a list, with None for the modules that do not have it."""
+        column = self.columns.get(name)
+        if column is None:
+            return [None] * self.rows
+        if column["kind"] == "json":
+            values = [None] * self.rows
+        elif column["kind"] == "str":
+            strings = self.strings
+            values = [strings[i] for i in self.column(name).tolist()]
+        else:
+            values = self.column(name).tolist()
+        # the modules without the attribute, and the values that do not fit the type of the column
+        missing = [name not in keys for keys in self.header["layouts"]]
+        if any(missing):
+            for row, index in enumerate(self.layout().tolist()):
+                if missing[index]:
+                    values[row] = None
+        for row, extra in self.header["extras"].items():
+            if name in extra:
+                values[int(row)] = extra[name]
+        return values
+
+    def to_json(self):
+        values = {}
+        for name, column in self.columns.items():
+            if column["kind"] == "json":
+                values[name] = None
+            elif column["kind"] == "str":
+                values[name] = [self.strings[i] for i in self.column(name).tolist()]
+            else:
+                values[name] = self.column(name).tolist()
+        layouts = self.header["layouts"]
+        extras = self.header["extras"]
+
+        modules = []
+        for row, index in enumerate(self.layout().tolist()):
+            extra = extras.get(str(row))
+            if extra is None:
+                modules.append({key: values[key][row] for key in layouts[index]})
+            else:
+                modules.append({key: extra[key] if key in extra else values[key][row] for key in layouts[index]})
+
+        # the modules are stored as None in the document, to preserve the order of the keys
+        data = dict(self.header["document"])
+        if "modules" in data:
+            data["modules"] = modules
+        return data
+
+
+def read_columnar(path):
+    """Read a file in the columnar format, and return the equivalent resources.json document."""
+    return ColumnarResources(path).to_json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a "resources.json" file to the compact columnar format, or back to JSON.')
+    parser.add_argument("input", metavar='FILE', help='input file, in JSON (possibly compressed) or columnar format')
+    parser.add_argument("-o", "--output", default='-', metavar='FILE', help='write the result to FILE instead of standard output; JSON output is compressed if FILE ends with .gz or .br')
+    parser.add_argument("-t", "--to", choices=['json', 'columnar'], default=None, help='output format (default: the other one with respect to the input)')
+    parser.add_argument("--compact", action='store_true', help='write compact JSON, without indentation')
+    args = parser.parse_args()
+
+    # resources_io imports this module
+    from resources_io import load_resources, dump_resources
+
+    columnar = is_columnar(args.input)
+    data = load_resources(args.input)
+    to = args.to or ('json' if columnar else 'columnar')
+
+    if to == 'json':
+        dump_resources(data, args.output, args.compact)
+    else:
+        out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+        write_columnar(data, out)
+        if args.output != '-':
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,17 @@ import re
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 
+import numpy as np
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from matplotlib.colors import to_rgb, to_hex
 from matplotlib.patches import Patch
 
+from group_matcher import CachedGroupMatcher
+from resources_io import load_columns, load_resources
+from repeat_stats import DEFAULT_BOOTSTRAP, DEFAULT_CONFIDENCE, RepeatStats, difference_interval, expand_repeat_set, mean_aggregate
+
 
 # ------------------------
 # Mapping / augmentation
@@ -26,43 +31,18 @@ def augment_json(input_data, group_data, debug):
     "Unassigned". The separator between the different fields is '|'.
     """
 
-    groups = []
-    for raw_pattern, group in group_data.items():
-        # tolerant: accept non-string keys, and split on the FIRST pipe only
-        pattern = str(raw_pattern)
-        ctype, sep, label = pattern.partition("|")
-        if sep == "":
-            ctype = ""
-            label = pattern
-        ctype = ctype.strip()
-        label = label.strip()
-        ctype = (
-            re.compile(ctype.replace("?", ".").replace("*", ".*") + "$")
-            if ctype
-            else None
-        )
-        label = (
-            re.compile(label.replace("?", ".").replace("*", ".*") + "$")
-            if label
-            else None
-        )
-        groups.append([ctype, label, str(group)])
+    matcher = CachedGroupMatcher(group_data)
 
     for module in input_data.get("modules", []):
-        found = False
         mtype = module.get("type", "")
         mlabel = module.get("label", "")
-        for ctype_rx, label_rx, group in groups:
-            if (ctype_rx is None or ctype_rx.match(mtype)) and (
-                label_rx is None or label_rx.match(mlabel)
-            ):
-                module["expanded"] = "|".join([group, mtype, mlabel])
-                found = True
-                break
-        if not found:
+        group = matcher.match(mtype, mlabel)
+        if group is None:
             if debug:
                 print(f"Failed to parse {module}")
-            module["expanded"] = "|".join(["Unassigned", mtype, mlabel])
+            group = "Unassigned"
+        module["expanded"] = "|".join([str(group), mtype, mlabel])
+    matcher.save()
 
     return input_data
 
@@ -71,8 +51,7 @@ def augment_json(input_data, group_data, debug):
 # I/O helpers
 # ------------------------
 def load_full_json(path: Path) -> Dict:
-    with path.open("r") as f:
-        data = json.load(f)
+    data = load_resources(path)
     if "modules" not in data or not isinstance(data["modules"], list):
         raise ValueError(f"{path} does not contain a top-level 'modules' list")
     return data
@@ -139,17 +118,135 @@ def key_for_level(m: Dict, level: str) -> str:
 # ------------------------
 # Aggregation & alignment
 # ------------------------
+# attribute of the modules that gives their key at each level
+LEVEL_ATTRIBUTES = {"label": "label", "type": "type", "package": "expanded", "expanded": "expanded"}
+
+
+class ModuleTable:
+    """
+    Vectorised view of the modules of a timing JSON.
+
+    The modules are given either as a list of dictionaries, or as columns: a
+    dictionary attribute -> list of the values of each module, None where
+    missing, as returned by load_columns().
+
+    The key of each module at a given level is converted once to an integer
+    code (in order of first appearance), and each metric once to a float64
+    array with a mask of the modules where it is numeric; the aggregations
+    are then computed with np.bincount.
+    """
+
+    def __init__(self, mods: Optional[List[Dict]], total_events: float = 1.0, columns: Optional[Dict[str, List]] = None):
+        self.mods = mods
+        self.columns = dict(columns or {})
+        self.rows = len(mods) if mods is not None else len(next(iter(self.columns.values()), []))
+        self.total_events = total_events
+        self._codes: Dict[str, Tuple[np.ndarray, List[str]]] = {}
+        self._metrics: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def column(self, name: str) -> List:
+        """Return the values of an attribute of the modules, None where missing."""
+        if name not in self.columns:
+            if self.mods is None:
+                raise ValueError(f"the attribute {name} of the modules was not loaded")
+            self.columns[name] = [m.get(name) for m in self.mods]
+        return self.columns[name]
+
+    def codes(self, level: str) -> Tuple[np.ndarray, List[str]]:
+        """Return the code of the key of each module at the given level, and the keys."""
+        if level not in self._codes:
+            if level not in LEVEL_ATTRIBUTES:
+                raise ValueError("level must be one of: package, type, label, expanded")
+            attribute = LEVEL_ATTRIBUTES[level]
+            index: Dict[str, int] = {}
+            codes = np.fromiter(
+                (index.setdefault(key_for_level({} if v is None else {attribute: v}, level), len(index)) for v in self.column(attribute)),
+                dtype=np.intp,
+                count=self.rows,
+            )
+            self._codes[level] = (codes, list(index))
+        return self._codes[level]
+
+    def values(self, metric: str, per_event: bool) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the metric of each module, and a mask of the modules where it is numeric."""
+        if metric not in self._metrics:
+            vals = np.zeros(self.rows)
+            valid = np.zeros(self.rows, dtype=bool)
+            for i, v in enumerate(self.column(metric)):
+                v = None if v is None else numeric_metric({metric: v}, metric, False, 1.0)
+                if v is not None:
+                    vals[i] = v
+                    valid[i] = True
+            self._metrics[metric] = (vals, valid)
+        vals, valid = self._metrics[metric]
+        if per_event and self.total_events > 0:
+            vals = vals / self.total_events
+        return vals, valid
+
+    def select(self, mask: np.ndarray) -> "ModuleTable":
+        """Return a table with the modules selected by a boolean mask."""
+        idx = np.flatnonzero(mask)
+        mods = None if self.mods is None else [self.mods[i] for i in idx]
+        out = ModuleTable(mods, self.total_events, {name: [values[i] for i in idx] for name, values in self.columns.items()})
+        out.rows = len(idx)
+        out._codes = {level: (codes[idx], keys) for level, (codes, keys) in self._codes.items()}
+        out._metrics = {metric: (vals[idx], valid[idx]) for metric, (vals, valid) in self._metrics.items()}
+        return out
+
+    def package_mask(self, predicate) -> np.ndarray:
+        """Return a mask of the modules whose package satisfies the predicate."""
+        codes, keys = self.codes("package")
+        keep = np.array([bool(predicate(k)) for k in keys], dtype=bool)
+        return keep[codes]
+
+    def aggregate(self, metric: str, per_event: bool, level: str) -> Dict[str, float]:
+        """Sum the metric by key at the given level, skipping the modules where it is not numeric."""
+        codes, keys = self.codes(level)
+        vals, valid = self.values(metric, per_event)
+        codes = codes[valid]
+        sums = np.bincount(codes, weights=vals[valid], minlength=len(keys))
+        # keep the keys in order of first appearance among the modules with a numeric value
+        present, first = np.unique(codes, return_index=True)
+        present = present[np.argsort(first, kind="stable")]
+        return {keys[c]: float(sums[c]) for c in present.tolist()}
+
+
+def module_table(data: Dict) -> ModuleTable:
+    """Build the ModuleTable of an (augmented) timing JSON, normalised to its total events."""
+    return ModuleTable(data["modules"], get_total_events(data))
+
+
+def load_table(path: Path, group_data: Dict, metrics: List[str], debug: bool = False) -> ModuleTable:
+    """
+    Load only the type, label and given metrics of the modules of a timing
+    JSON, and build their ModuleTable with the 'expanded' names of
+    augment_json: the files in the columnar format are read through their
+    arrays, without building the modules.
+    """
+    data, columns = load_columns(path, ["type", "label"] + list(metrics))
+    matcher = CachedGroupMatcher(group_data)
+    expanded = []
+    for mtype, mlabel in zip(columns["type"], columns["label"]):
+        mtype = "" if mtype is None else mtype
+        mlabel = "" if mlabel is None else mlabel
+        group = matcher.match(mtype, mlabel)
+        if group is None:
+            if debug:
+                print(f"Failed to parse {mtype}|{mlabel}")
+            group = "Unassigned"
+        expanded.append("|".join([str(group), mtype, mlabel]))
+    matcher.save()
+    columns["expanded"] = expanded
+    return ModuleTable(None, get_total_events(data), columns)
+
+
 def aggregate(
     mods: List[Dict], metric: str, per_event: bool, level: str, total_events: float
 ) -> Dict[str, float]:
-    agg: Dict[str, float] = {}
-    for m in mods:
-        v = numeric_metric(m, metric, per_event, total_events)
-        if v is None:
-            continue
-        k = key_for_level(m, level)
-        agg[k] = agg.get(k, 0.0) + v
-    return agg
+    return ModuleTable(mods, total_events).aggregate(metric, per_event, level)
 
 
 def align_for_bars(
@@ -190,37 +287,54 @@ def pick_base_color(package: str, cmap: Dict[str, str]) -> str:
 def cat_to_package(
     cats: List[str],
     level: str,
-    mods_a: List[Dict],
-    mods_b: List[Dict],
+    tables: List[ModuleTable],
     metric: str,
     per_event: bool,
-    total_events_a: float,
-    total_events_b: float,
 ) -> Dict[str, str]:
-    """Determine a dominant package for each category (for type/label levels)."""
-    mapping: Dict[str, Dict[str, float]] = {c: {} for c in cats}
-    for m in mods_a:
-        v = numeric_metric(m, metric, per_event, total_events_a)
-        if v is None:
-            continue
-        k = key_for_level(m, level)
-        if k not in mapping:
-            continue
-        pkg = package_from_expanded(m)
-        mapping[k][pkg] = mapping[k].get(pkg, 0.0) + v
-    for m in mods_b:
-        v = numeric_metric(m, metric, per_event, total_events_b)
-        if v is None:
-            continue
-        k = key_for_level(m, level)
-        if k not in mapping:
-            continue
-        pkg = package_from_expanded(m)
-        mapping[k][pkg] = mapping[k].get(pkg, 0.0) + v
-
-    out: Dict[str, str] = {}
-    for k, d in mapping.items():
-        out[k] = max(d.items(), key=lambda x: x[1])[0] if d else "Unassigned"
+    """
+    Determine a dominant package for each category (for type/label levels),
+    by summed contribution across all the tables; ties go to the package seen first.
+    """
+    cat_index: Dict[str, int] = {}
+    pkg_index: Dict[str, int] = {}
+    cat_codes, pkg_codes, weights = [], [], []
+    for table in tables:
+        kc, kn = table.codes(level)
+        pc, pn = table.codes("package")
+        vals, valid = table.values(metric, per_event)
+        kmap = np.array([cat_index.setdefault(k, len(cat_index)) for k in kn], dtype=np.intp)
+        pmap = np.array([pkg_index.setdefault(p, len(pkg_index)) for p in pn], dtype=np.intp)
+        if valid.any():
+            cat_codes.append(kmap[kc[valid]])
+            pkg_codes.append(pmap[pc[valid]])
+            weights.append(vals[valid])
+
+    out: Dict[str, str] = {c: "Unassigned" for c in cats}
+    if not weights:
+        return out
+    cat_codes = np.concatenate(cat_codes)
+    pkg_codes = np.concatenate(pkg_codes)
+    weights = np.concatenate(weights)
+
+    # sum by (category, package) pair, in the order of the modules
+    pairs, first, inverse = np.unique(
+        cat_codes * len(pkg_index) + pkg_codes, return_index=True, return_inverse=True
+    )
+    sums = np.bincount(inverse.ravel(), weights=weights, minlength=len(pairs))
+    pair_cat = pairs // len(pkg_index)
+    pair_pkg = pairs % len(pkg_index)
+
+    # for each category, the pair with the largest sum, or the first one seen in case of ties
+    order = np.lexsort((first, -sums, pair_cat))
+    is_best = np.ones(len(order), dtype=bool)
+    is_best[1:] = pair_cat[order][1:] != pair_cat[order][:-1]
+    best = order[is_best]
+
+    cat_names = list(cat_index)
+    pkg_names = list(pkg_index)
+    for c, p in zip(pair_cat[best].tolist(), pair_pkg[best].tolist()):
+        if cat_names[c] in out:
+            out[cat_names[c]] = pkg_names[p]
     return out
 
 
@@ -304,7 +418,12 @@ def bar_panels(
     stack_key: str,
     save: Optional[Path],
     show: bool,
+    A_err: Optional[List[List[float]]] = None,
+    B_err: Optional[List[List[float]]] = None,
+    D_err: Optional[List[List[float]]] = None,
 ):
+    # A_err, B_err and D_err are the optional 2 x N (lower, upper) error bars
+    # of repeat sets, drawn on the grouped bars and on the differences
     if not cats:
         print("No categories to plot after filtering.")
         return
@@ -396,6 +515,8 @@ def bar_panels(
                 edgecolor=edge_colors,
                 linewidth=outline_width,
                 label=f"A: {name_a}",
+                yerr=A_err,
+                capsize=2,
             )
             ax1.bar(
                 [i + width / 2 for i in x],
@@ -404,6 +525,8 @@ def bar_panels(
                 color=colors_B,
                 edgecolor="none",
                 label=f"B: {name_b}",
+                yerr=B_err,
+                capsize=2,
             )
         else:
             ax1.bar(
@@ -414,6 +537,8 @@ def bar_panels(
                 hatch="///",
                 edgecolor="black",
                 label=f"A: {name_a}",
+                yerr=A_err,
+                capsize=2,
             )
             ax1.bar(
                 [i + width / 2 for i in x],
@@ -423,6 +548,8 @@ def bar_panels(
                 hatch="\\\\\\\\",
                 edgecolor="black",
                 label=f"B: {name_b}",
+                yerr=B_err,
+                capsize=2,
             )
 
         ax1.set_ylabel(metric_label)
@@ -458,7 +585,7 @@ def bar_panels(
 
     # ---- Bottom panel: differences per category ----
     ax2 = fig.add_subplot(gs[1, 0])
-    ax2.bar(x, D, color=colors_B, edgecolor="black", linewidth=0.6)
+    ax2.bar(x, D, color=colors_B, edgecolor="black", linewidth=0.6, yerr=D_err, capsize=2)
     ax2.axhline(0, linestyle="--", linewidth=1)
     ax2.set_ylabel(f"Δ(B−A) {metric_label}")
     ax2.set_xticks(x)
@@ -476,10 +603,126 @@ def bar_panels(
         save.parent.mkdir(parents=True, exist_ok=True)
         fig.savefig(save, dpi=150, bbox_inches="tight")
         print(f"Saved figure to: {save}")
+        plt.close(fig)
     if show and not save:
         plt.show()
 
 
+# ------------------------
+# Comparison
+# ------------------------
+def prepare_comparison(
+    data_a: Dict,
+    data_b: Dict,
+    color_map: Dict[str, str],
+    metric: str = "time_real",
+    per_event: bool = False,
+    level: str = "label",
+    package: Optional[str] = None,
+    package_regex: Optional[str] = None,
+    require_map: bool = False,
+    sort_by: str = "B",
+    top: Optional[int] = None,
+    package_top: str = "stacked",
+    stack_sort_by: str = "diff",
+    n_boot: int = DEFAULT_BOOTSTRAP,
+    confidence: float = DEFAULT_CONFIDENCE,
+) -> Dict:
+    """
+    Filter, aggregate, sort and colour the modules of two augmented timing JSONs.
+    Return the data arguments of bar_panels: the categories, the values for A
+    and B and their differences, the colours and the subtitle.
+    The inputs can also be ModuleTables, to reuse their keys and metrics
+    across multiple calls, or lists of them for repeat sets: then A and B are
+    the means over the runs, with bootstrap confidence intervals as error bars.
+    """
+    # Modules of each file, normalised to the file total events
+    runs_a = data_a if isinstance(data_a, list) else [data_a]
+    runs_b = data_b if isinstance(data_b, list) else [data_b]
+    tables_a = [d if isinstance(d, ModuleTable) else module_table(d) for d in runs_a]
+    tables_b = [d if isinstance(d, ModuleTable) else module_table(d) for d in runs_b]
+
+    # Filters
+    rx = re.compile(package_regex) if package_regex else None
+
+    def apply_filters(table: ModuleTable) -> ModuleTable:
+        if require_map:
+            table = table.select(table.package_mask(lambda p: p != "Unassigned"))
+        if package:
+            table = table.select(table.package_mask(lambda p: p == package))
+        if rx:
+            table = table.select(table.package_mask(rx.search))
+        return table
+
+    tables_a = [apply_filters(t) for t in tables_a]
+    tables_b = [apply_filters(t) for t in tables_b]
+
+    # Aggregate (note: normalization uses file total events)
+    aggs_a = [t.aggregate(metric, per_event, level) for t in tables_a]
+    aggs_b = [t.aggregate(metric, per_event, level) for t in tables_b]
+    agg_a = aggs_a[0] if len(aggs_a) == 1 else mean_aggregate(aggs_a)
+    agg_b = aggs_b[0] if len(aggs_b) == 1 else mean_aggregate(aggs_b)
+    cats, Avals, Bvals, Dvals = align_for_bars(agg_a, agg_b)
+
+    # Sort + top: in stacked composition, force order by abs diff so bottom plot starts with largest |Δ|
+    if level == "package" and package_top == "stacked":
+        order = sort_indices(cats, Avals, Bvals, Dvals, stack_sort_by)  # default 'diff'
+    else:
+        order = sort_indices(cats, Avals, Bvals, Dvals, sort_by)
+
+    cats, Avals, Bvals, Dvals = apply_top(cats, Avals, Bvals, Dvals, order, top)
+
+    # Error bars of the repeat sets, for the selected categories
+    A_err = B_err = D_err = None
+    if len(aggs_a) > 1 or len(aggs_b) > 1:
+        stats_a = RepeatStats(aggs_a, cats, n_boot, confidence)
+        stats_b = RepeatStats(aggs_b, cats, n_boot, confidence)
+        diff, low, high = difference_interval(stats_a.values, stats_b.values, n_boot, confidence)
+        A_err = stats_a.errors().tolist()
+        B_err = stats_b.errors().tolist()
+        D_err = np.vstack([diff - low, high - diff]).clip(min=0.0).tolist()
+
+    # Colors per category
+    if level == "package":
+        pkg_for_cat = {c: c for c in cats}
+    else:
+        pkg_for_cat = cat_to_package(cats, level, tables_a + tables_b, metric, per_event)
+
+    colors_A, colors_B, edge_colors = [], [], []
+    for c in cats:
+        base_pkg = pkg_for_cat.get(c, "others")
+        base_hex = pick_base_color(base_pkg, color_map)
+        varied_hex = color_for_category(c, level, base_pkg, color_map)
+        colors_B.append(varied_hex)
+        colors_A.append(varied_hex)
+        edge_colors.append(base_hex)  # outline edge uses exact package color
+
+    metric_label = metric + (" (per event)" if per_event else "")
+    subtitle_bits = [f"level={level}"]
+    if package:
+        subtitle_bits.append(f"package == {package!r}")
+    if package_regex:
+        subtitle_bits.append(f"package ~ /{package_regex}/")
+    if require_map:
+        subtitle_bits.append("require_map")
+    subtitle = "; ".join(subtitle_bits)
+
+    return dict(
+        cats=cats,
+        A=Avals,
+        B=Bvals,
+        D=Dvals,
+        colors_A=colors_A,
+        colors_B=colors_B,
+        edge_colors=edge_colors,
+        metric_label=metric_label,
+        subtitle=subtitle,
+        A_err=A_err,
+        B_err=B_err,
+        D_err=D_err,
+    )
+
+
 # ------------------------
 # CLI
 # ------------------------
@@ -487,8 +730,8 @@ def main():
     p = argparse.ArgumentParser(
         description="Compare two timing JSONs using a grouping JSON (augment_json) and plot bar charts with package colors."
     )
-    p.add_argument("json_a", type=Path, help="First timing JSON")
-    p.add_argument("json_b", type=Path, help="Second timing JSON")
+    p.add_argument("json_a", type=Path, help="First timing JSON (a repeat set with --repeat-sets)")
+    p.add_argument("json_b", type=Path, help="Second timing JSON (a repeat set with --repeat-sets)")
 
     # Mapping & colors
     p.add_argument(
@@ -595,6 +838,26 @@ def main():
         help="For stacked composition, order packages & stack layers by this key (default: diff=|B-A|)",
     )
 
+    # Repeated measurements
+    p.add_argument(
+        "--repeat-sets",
+        action="store_true",
+        help="Treat json_a and json_b as repeat sets: '+' separated lists of files, or glob patterns, "
+        "with repeated measurements of the same configuration; plot their means with bootstrap confidence intervals",
+    )
+    p.add_argument(
+        "--confidence",
+        type=float,
+        default=DEFAULT_CONFIDENCE,
+        help=f"Confidence level of the error bars with --repeat-sets (default: {DEFAULT_CONFIDENCE})",
+    )
+    p.add_argument(
+        "--bootstrap",
+        type=int,
+        default=DEFAULT_BOOTSTRAP,
+        help=f"Number of bootstrap replicas with --repeat-sets (default: {DEFAULT_BOOTSTRAP})",
+    )
+
     # Output
     p.add_argument("--title", default=None)
     p.add_argument(
@@ -608,93 +871,38 @@ def main():
     args = p.parse_args()
 
     # Load base files and colors
-    data_a = load_full_json(args.json_a)
-    data_b = load_full_json(args.json_b)
     group_data = load_grouping(args.map)
     color_map = load_colors(args.colors)
-
-    # Total events (file-level) for correct per-event normalization
-    total_events_a = get_total_events(data_a)
-    total_events_b = get_total_events(data_b)
-
-    # Augment
-    data_a = augment_json(data_a, group_data, args.debug_map)
-    data_b = augment_json(data_b, group_data, args.debug_map)
-    mods_a = data_a["modules"]
-    mods_b = data_b["modules"]
-
-    # Filters
-    if args.require_map:
-        mods_a = [m for m in mods_a if package_from_expanded(m) != "Unassigned"]
-        mods_b = [m for m in mods_b if package_from_expanded(m) != "Unassigned"]
-    if args.package:
-        mods_a = [m for m in mods_a if package_from_expanded(m) == args.package]
-        mods_b = [m for m in mods_b if package_from_expanded(m) == args.package]
-    if args.package_regex:
-        rx = re.compile(args.package_regex)
-        mods_a = [m for m in mods_a if rx.search(package_from_expanded(m))]
-        mods_b = [m for m in mods_b if rx.search(package_from_expanded(m))]
-
-    # Aggregate (note: normalization uses file total events)
-    agg_a = aggregate(mods_a, args.metric, args.per_event, args.level, total_events_a)
-    agg_b = aggregate(mods_b, args.metric, args.per_event, args.level, total_events_b)
-    cats, Avals, Bvals, Dvals = align_for_bars(agg_a, agg_b)
-
-    # Sort + top: in stacked composition, force order by abs diff so bottom plot starts with largest |Δ|
-    if args.level == "package" and args.package_top == "stacked":
-        order = sort_indices(
-            cats, Avals, Bvals, Dvals, args.stack_sort_by
-        )  # default 'diff'
+    if args.repeat_sets:
+        # Load and augment each run of the repeat sets
+        data_a = [load_table(Path(f), group_data, [args.metric], args.debug_map) for f in expand_repeat_set(str(args.json_a))]
+        data_b = [load_table(Path(f), group_data, [args.metric], args.debug_map) for f in expand_repeat_set(str(args.json_b))]
     else:
-        order = sort_indices(cats, Avals, Bvals, Dvals, args.sort_by)
-
-    cats, Avals, Bvals, Dvals = apply_top(cats, Avals, Bvals, Dvals, order, args.top)
-
-    # Colors per category
-    if args.level == "package":
-        pkg_for_cat = {c: c for c in cats}
-    else:
-        pkg_for_cat = cat_to_package(
-            cats,
-            args.level,
-            mods_a,
-            mods_b,
-            args.metric,
-            args.per_event,
-            total_events_a,
-            total_events_b,
-        )
-
-    colors_A, colors_B, edge_colors = [], [], []
-    for c in cats:
-        base_pkg = pkg_for_cat.get(c, "others")
-        base_hex = pick_base_color(base_pkg, color_map)
-        varied_hex = color_for_category(c, args.level, base_pkg, color_map)
-        colors_B.append(varied_hex)
-        colors_A.append(varied_hex)
-        edge_colors.append(base_hex)  # outline edge uses exact package color
-
-    metric_label = args.metric + (" (per event)" if args.per_event else "")
-    subtitle_bits = [f"level={args.level}"]
-    if args.package:
-        subtitle_bits.append(f"package == {args.package!r}")
-    if args.package_regex:
-        subtitle_bits.append(f"package ~ /{args.package_regex}/")
-    if args.require_map:
-        subtitle_bits.append("require_map")
-    subtitle = "; ".join(subtitle_bits)
+        # Load and augment only the metric of the modules
+        data_a = load_table(args.json_a, group_data, [args.metric], args.debug_map)
+        data_b = load_table(args.json_b, group_data, [args.metric], args.debug_map)
+
+    panels = prepare_comparison(
+        data_a,
+        data_b,
+        color_map,
+        metric=args.metric,
+        per_event=args.per_event,
+        level=args.level,
+        package=args.package,
+        package_regex=args.package_regex,
+        require_map=args.require_map,
+        sort_by=args.sort_by,
+        top=args.top,
+        package_top=args.package_top,
+        stack_sort_by=args.stack_sort_by,
+        n_boot=args.bootstrap,
+        confidence=args.confidence,
+    )
 
     bar_panels(
-        cats,
-        Avals,
-        Bvals,
-        Dvals,
-        colors_A=colors_A,
-        colors_B=colors_B,
-        edge_colors=edge_colors,
-        metric_label=metric_label,
+        **panels,
         title=args.title,
-        subtitle=subtitle,
         name_a=args.json_a.name,
         name_b=args.json_b.name,
         rotate=args.rotate,
@@ -6,7 +6,7 @@ import json
 import re
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
-from collections import defaultdict, OrderedDict
+from collections import OrderedDict
 from packaging import version
 
 import matplotlib
@@ -19,6 +19,7 @@ import mplhep as hep
 hep.style.use("CMS")
 
 import compare_json_hist as cjh
+from repeat_stats import DEFAULT_BOOTSTRAP, DEFAULT_CONFIDENCE, RepeatStats, difference_interval, expand_repeat_set, mean_aggregate
 
 def union_categories(aggs: List[Dict[str, float]]) -> List[str]:
     cats = set()
@@ -26,28 +27,6 @@ def union_categories(aggs: List[Dict[str, float]]) -> List[str]:
         cats |= set(a.keys())
     return sorted(cats)
 
-def dominant_package_for_cat(
-    cat: str,
-    level: str,
-    mods_by_file: List[List[Dict]],
-    metric: str,
-    normalise: bool,
-    total_events_by_file: List[float],
-) -> str:
-    """
-    For type/label/expanded categories: determine dominant package by summed contribution across ALL files.
-    """
-    contrib = defaultdict(float)
-    for mods, tev in zip(mods_by_file, total_events_by_file):
-        for m in mods:
-            if cjh.key_for_level(m, level) != cat:
-                continue
-            v = cjh.numeric_metric(m, metric, normalise, tev)
-            if v is None:
-                continue
-            contrib[cjh.package_from_expanded(m)] += v
-    return max(contrib.items(), key=lambda x: x[1])[0] if contrib else "Unassigned"
-
 # ------------------------
 # Plotting (N files)
 # ------------------------
@@ -71,7 +50,12 @@ def plot_stacked_bars(
     baseline_idx: int,
     save: Optional[Path],
     show: bool,
+    total_errors: Optional[List[List[float]]] = None,
+    delta_errors: Optional[List[List[float]]] = None,
 ):
+    # total_errors and delta_errors are the optional 2 x n_files (lower, upper)
+    # error bars of the totals and of their differences with the baseline,
+    # for repeat sets
     def maybe_truncate(names: List[str], n: Optional[int]) -> List[str]:
         if not n or n <= 0:
             return names
@@ -125,9 +109,12 @@ def plot_stacked_bars(
 
     # annotate totals
     ymax = max(bottoms) if bottoms else 0.0
+    if total_errors is not None:
+        ax1.errorbar(x, bottoms, yerr=total_errors, fmt="none", ecolor="black", elinewidth=1, capsize=4)
     for i, tot in enumerate(bottoms):
         fmt = f"{{:.{ndigis}f}}"
-        ax1.text(x[i], tot + 0.02 * (ymax if ymax > 0 else 1.0), fmt.format(tot), ha="center", va="bottom", fontsize=12, fontweight="bold")
+        top = tot + (total_errors[1][i] if total_errors is not None else 0.0)
+        ax1.text(x[i], top + 0.02 * (ymax if ymax > 0 else 1.0), fmt.format(tot), ha="center", va="bottom", fontsize=12, fontweight="bold")
 
     # legend (categories)
     # If too many categories, legend can get huge; user can restrict with --top in future if needed.
@@ -165,6 +152,12 @@ def plot_stacked_bars(
         pos_bottom += pos
         neg_bottom += neg
 
+    if delta_errors is not None:
+        ax2.errorbar(x, delta.sum(axis=1), yerr=delta_errors, fmt="none", ecolor="black", elinewidth=1, capsize=4)
+        # make room for the error bars in the y range
+        pos_bottom = np.maximum(pos_bottom, delta.sum(axis=1) + np.array(delta_errors[1]))
+        neg_bottom = np.minimum(neg_bottom, delta.sum(axis=1) - np.array(delta_errors[0]))
+
     ax2.axhline(0, linestyle='--', linewidth=1, color='black')
     ax2.tick_params(axis='y', labelsize=fontsize, rotation=rotate_labels)
     ax2.set_ylabel(f'Δt vs {file_labels[baseline_idx]} [ms]', fontsize=fontsize+2)
@@ -200,7 +193,7 @@ def main():
     p = argparse.ArgumentParser(
         description="Compare N timing JSONs using a grouping JSON and plot stacked bars by category."
     )
-    p.add_argument("json_files", nargs="+", type=Path, help="Timing JSON files (2 or more)")
+    p.add_argument("json_files", nargs="+", type=Path, help="Timing JSON files (2 or more), or repeat sets with --repeat-sets")
 
     # Groups & colors
     p.add_argument("--group", type=Path, required=True,
@@ -238,6 +231,13 @@ def main():
     # Baseline for delta
     p.add_argument("--baseline", type=int, default=0, help="Index of baseline file for Δ (default 0)")
 
+    # Repeated measurements
+    p.add_argument("--repeat-sets", action="store_true",
+                   help="Treat each input as a repeat set: a '+' separated list of files, or a glob pattern, with repeated measurements of the same configuration. "
+                   "Plot their means, with bootstrap confidence intervals on the totals and on their differences with the baseline.")
+    p.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE, help=f"Confidence level of the error bars with --repeat-sets (default: {DEFAULT_CONFIDENCE})")
+    p.add_argument("--bootstrap", type=int, default=DEFAULT_BOOTSTRAP, help=f"Number of bootstrap replicas with --repeat-sets (default: {DEFAULT_BOOTSTRAP})")
+
     # Output
     p.add_argument("--title", default=None)
     p.add_argument("--save", type=Path, default="out.png", help="Save figure (default: out.png)")
@@ -266,31 +266,48 @@ def main():
 
     # Load, augment, filter, aggregate each file
     aggs = []
-    mods_by_file = []
-    total_events_by_file = []
+    tables = []
+    run_totals = []
 
     for jf in args.json_files:
-        data = cjh.load_full_json(jf)
-        tev = cjh.get_total_events(data)
-        total_events_by_file.append(tev)
-
-        data = cjh.augment_json(data, group_data, args.show_unassigned)
-        mods = data["modules"]
-
-        # Filters
-        if args.ignore_unassigned:
-            mods = [m for m in mods if cjh.package_from_expanded(m) != "Unassigned"]
-        if args.package:
-            mods = [m for m in mods if cjh.package_from_expanded(m) == args.package]
-        if args.package_regex:
-            rx = re.compile(args.package_regex)
-            mods = [m for m in mods if rx.search(cjh.package_from_expanded(m))]
-
-        mods_by_file.append(mods)
-        aggs.append(cjh.aggregate(mods, args.metric, args.normalise, args.level, tev))
+        files = expand_repeat_set(str(jf)) if args.repeat_sets else [jf]
+        run_aggs = []
+        for f in files:
+            table = cjh.load_table(Path(f), group_data, [args.metric], args.show_unassigned)
+
+            # Filters
+            if args.ignore_unassigned:
+                table = table.select(table.package_mask(lambda p: p != "Unassigned"))
+            if args.package:
+                table = table.select(table.package_mask(lambda p: p == args.package))
+            if args.package_regex:
+                rx = re.compile(args.package_regex)
+                table = table.select(table.package_mask(rx.search))
+
+            tables.append(table)
+            run_aggs.append(table.aggregate(args.metric, args.normalise, args.level))
+
+        # the mean over the runs of a repeat set
+        aggs.append(run_aggs[0] if len(run_aggs) == 1 else mean_aggregate(run_aggs))
+        run_totals.append([{"total": sum(agg.values())} for agg in run_aggs])
 
     cats = union_categories(aggs)
 
+    # Error bars of the totals, and of their differences with the baseline
+    total_errors = delta_errors = None
+    if args.repeat_sets:
+        stats = [RepeatStats(totals, ["total"], args.bootstrap, args.confidence) for totals in run_totals]
+        total_errors = np.hstack([s.errors() for s in stats]).tolist()
+        delta_errors = [[], []]
+        for i, s in enumerate(stats):
+            if i == args.baseline:
+                delta_errors[0].append(0.0)
+                delta_errors[1].append(0.0)
+                continue
+            diff, low, high = difference_interval(stats[args.baseline].values, s.values, args.bootstrap, args.confidence)
+            delta_errors[0].append(max(0.0, float(diff[0] - low[0])))
+            delta_errors[1].append(max(0.0, float(high[0] - diff[0])))
+
     # Build values matrix [n_files][n_cats]
     values_by_file = []
     for agg in aggs:
@@ -302,10 +319,7 @@ def main():
         for c in cats:
             pkg_for_cat[c] = c
     else:
-        for c in cats:
-            pkg_for_cat[c] = dominant_package_for_cat(
-                c, args.level, mods_by_file, args.metric, args.normalise, total_events_by_file
-            )
+        pkg_for_cat = cjh.cat_to_package(cats, args.level, tables, args.metric, args.normalise)
 
     # Colors per category
     cat_colors = []
@@ -343,6 +357,8 @@ def main():
         baseline_idx=args.baseline,
         save=args.save,
         show=not args.no_show,
+        total_errors=total_errors,
+        delta_errors=delta_errors,
     )
 
 if __name__ == "__main__":
@@ -1,28 +1,17 @@
 #! /usr/bin/env python3
 
 import sys
+import os
+import argparse
 import json
+from concurrent.futures import ProcessPoolExecutor
 
-if (len(sys.argv) > 1):
-  input  = json.load(open(sys.argv[1]))
-else:
-  input  = json.load(sys.stdin)
+from columnar import is_columnar
+from resources_io import open_resources, iter_resources, dump_resources, is_dataset
 
-output = {}
-
-# the legacy JOSN files stored only the "real time"
-output["resources"] = [ { "time_real": "real time" } ]
-
-# convert the top level object to the "total"
-#   - propagate the proces name
-#   - propagate the weight to the real time (in ms)
-#   - set the number of event to 1, since the legacy JSON stores the average per event
-output["total"] = {
-  "type": "Job",
-  "label": input["label"],
-  "time_real": input["weight"],
-  "events": 1
-}
+# top-level keys of the legacy JSON files produced by make_circles.py, and of the current ones
+LEGACY_KEYS = ('groups', 'weight')
+CURRENT_KEYS = ('resources', 'total', 'modules')
 
 # check if the node's children are leaves, i.e. if they do not have child nodes
 def is_module_type(node):
@@ -32,24 +21,148 @@ def is_module_type(node):
       is_type = True
     else:
       if is_type:
-        sys.stderr("Error: descendents of node %s are a mixture of terminals and non-terminals")
-        sys.exit(1)
+        raise ValueError("descendents of node %s are a mixture of terminals and non-terminals" % node["label"])
   return is_type
 
-# navigate the JSON to find the outermost leaves (corresponding to the module
-# labels) and their parents (corresponding to the module types)
-output["modules"] = []
+def convert(input):
+  output = {}
+
+  # the legacy JOSN files stored only the "real time"
+  output["resources"] = [ { "time_real": "real time" } ]
+
+  # convert the top level object to the "total"
+  #   - propagate the proces name
+  #   - propagate the weight to the real time (in ms)
+  #   - set the number of event to 1, since the legacy JSON stores the average per event
+  output["total"] = {
+    "type": "Job",
+    "label": input["label"],
+    "time_real": input["weight"],
+    "events": 1
+  }
+
+  # navigate the JSON to find the outermost leaves (corresponding to the module
+  # labels) and their parents (corresponding to the module types)
+  output["modules"] = []
+
+  nodes_to_be_processed = list(input["groups"])
+  while nodes_to_be_processed:
+    node = nodes_to_be_processed.pop()
+    if is_module_type(node):
+      # this node identifies a C++ type, with individual modules as children
+      output["modules"].extend([{ "type" : node["label"], "label": child["label"], "time_real": child["weight"] } for child in node["groups"]])
+    else:
+      # this node is a group of subgroup
+      nodes_to_be_processed.extend(node["groups"])
+
+  return output
+
+def read_legacy(name):
+  # return the content of a legacy file, or None for a file in the current format;
+  # the latter is read only up to the first top-level key that tells the two formats apart
+  if is_columnar(name):
+    return None
+  data = {}
+  legacy = False
+  with open_resources(name) as f:
+    for key, value in iter_resources(f):
+      if key in CURRENT_KEYS and not legacy:
+        return None
+      if key in LEGACY_KEYS:
+        legacy = True
+      data[key] = value
+  return data if legacy else None
+
+def find_files(root):
+  for path, dirs, files in os.walk(root):
+    dirs.sort()
+    for name in sorted(files):
+      # skip the temporary files left behind by an interrupted conversion
+      if is_dataset(name) and not name.startswith('.'):
+        yield os.path.join(path, name)
 
-nodes_to_be_processed = input["groups"]
-while nodes_to_be_processed:
-  node = nodes_to_be_processed.pop()
-  if is_module_type(node):
-    # this node identifies a C++ type, with individual modules as children
-    output["modules"].extend([{ "type" : node["label"], "label": child["label"], "time_real": child["weight"] } for child in node["groups"]])
+def convert_file(task):
+  # convert a single file, and return what was done with it
+  source, target, force = task
+  try:
+    if target != source and not force and os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+      return 'skipped', None
+    input = read_legacy(source)
+    if input is None:
+      return 'current', None
+    output = convert(input)
+    # write to a temporary file with the same suffix and rename it, so an interrupted conversion never leaves a partial file
+    os.makedirs(os.path.dirname(target) or '.', exist_ok = True)
+    tmp = os.path.join(os.path.dirname(target), '.' + os.path.basename(target))
+    try:
+      dump_resources(output, tmp)
+      os.replace(tmp, target)
+    finally:
+      if os.path.exists(tmp):
+        os.remove(tmp)
+    return 'converted', None
+  except Exception as e:
+    # a truncated or corrupt file raises EOFError, brotli.error, ...: report it, and convert the other files
+    return 'failed', '%s: %s' % (source, e)
+
+def convert_tree(root, output_dir, jobs, force, quiet):
+  files = list(find_files(root))
+  if output_dir:
+    tasks = [ (name, os.path.join(output_dir, os.path.relpath(name, root)), force) for name in files ]
+  else:
+    tasks = [ (name, name, force) for name in files ]
+
+  counts = { 'converted': 0, 'skipped': 0, 'current': 0, 'failed': 0 }
+  if jobs > 1:
+    with ProcessPoolExecutor(max_workers = jobs) as pool:
+      results = list(pool.map(convert_file, tasks, chunksize = 4))
+  else:
+    results = [ convert_file(task) for task in tasks ]
+  for (source, target, force), (status, error) in zip(tasks, results):
+    counts[status] += 1
+    if error:
+      sys.stderr.write('Error: %s\n' % error)
+    elif status == 'converted' and not quiet:
+      sys.stderr.write('%s -> %s\n' % (source, target) if target != source else 'converted %s\n' % source)
+
+  if not quiet:
+    sys.stderr.write('%(converted)d files converted, %(current)d already in the current format, %(skipped)d already converted, %(failed)d failed\n' % counts)
+  return counts['failed'] == 0
+
+def main():
+  parser = argparse.ArgumentParser(description = 'Convert the legacy JSON files produced by make_circles.py to the format used by the FastTimerService.')
+  parser.add_argument("file", nargs = '?', metavar = 'FILE', help = 'legacy JSON file to convert and print to the standard output (default: read from the standard input)')
+  parser.add_argument("-r", "--tree", metavar = 'DIR', help = 'convert all the legacy JSON files found under DIR, replacing them with the converted files')
+  parser.add_argument("-o", "--output-dir", metavar = 'DIR', help = 'with --tree, write the converted files to the same relative path under DIR, and keep the legacy files')
+  parser.add_argument("-j", "--jobs", type = int, default = 1, metavar = 'N', help = 'with --tree, convert N files in parallel')
+  parser.add_argument("-f", "--force", action = 'store_true', help = 'with --output-dir, convert again the files that already have a converted copy')
+  parser.add_argument("-q", "--quiet", action = 'store_true', help = 'with --tree, print only the errors')
+  args = parser.parse_args()
+
+  if args.tree:
+    if args.file:
+      parser.error('a FILE cannot be converted together with --tree')
+    if not convert_tree(args.tree, args.output_dir, args.jobs, args.force, args.quiet):
+      sys.exit(1)
+    return
+  if args.output_dir:
+    parser.error('--output-dir requires --tree')
+
+  if args.file:
+    with open_resources(args.file) as f:
+      input = json.load(f)
   else:
-    # this node is a group of subgroup
-    nodes_to_be_processed.extend(node["groups"])
+    input = json.load(sys.stdin)
+
+  try:
+    output = convert(input)
+  except ValueError as e:
+    sys.stderr.write('Error: %s\n' % e)
+    sys.exit(1)
+
+  json.dump(output, sys.stdout, indent = 2 )
+  sys.stdout.write('\n')
 
 
-json.dump(output, sys.stdout, indent = 2 )
-sys.stdout.write('\n')
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,153 @@
+#! /usr/bin/env python3
+"""
+Find the critical path of a CMSSW job through its module dependency graph.
+
+Each module of the graph written by the DependencyGraph service is weighted by
+its per-event time measured in the resources.json file of the same job. With
+enough threads and streams, an event cannot be processed faster than the most
+expensive chain of dependent modules: the modules on this critical path limit
+the per-event latency, while every other module can be delayed by its slack
+without making the event any slower.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from dependency_graph import read_graph, module_costs, node_costs
+from group_matcher import CachedGroupMatcher
+
+BASE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+
+def topological_order(graph, consumers):
+    """Return the nodes of a graph in topological order, or raise a ValueError if the graph has a cycle."""
+    pending = {node: 0 for node in graph.nodes}
+    for producer, consumer in graph.edges:
+        pending[consumer] += 1
+    order = [node for node, count in pending.items() if count == 0]
+    for node in order:
+        for consumer in consumers[node]:
+            pending[consumer] -= 1
+            if pending[consumer] == 0:
+                order.append(consumer)
+    if len(order) != len(graph.nodes):
+        raise ValueError(f'the dependency graph has a cycle through {len(graph.nodes) - len(order)} modules')
+    return order
+
+
+def critical_path(graph, costs):
+    """
+    Return the length of the critical path, the list of its nodes, and the
+    earliest finish time and the slack of each node, in a single forward and
+    a single backward pass over the graph.
+    """
+    consumers = graph.consumers()
+    order = topological_order(graph, consumers)
+
+    # earliest finish time of each node, and its most expensive producer
+    finish = {}
+    previous = {}
+    for node in order:
+        finish[node] = finish.get(node, 0.) + costs[node]
+        for consumer in consumers[node]:
+            if finish[node] > finish.get(consumer, 0.):
+                finish[consumer] = finish[node]
+                previous[consumer] = node
+    # finish[consumer] holds the earliest start time until the consumer is visited
+
+    length = max(finish.values(), default=0.)
+
+    # latest finish time of each node that does not delay the whole event
+    latest = {}
+    for node in reversed(order):
+        latest[node] = min((latest[consumer] - costs[consumer] for consumer in consumers[node]), default=length)
+    slack = {node: latest[node] - finish[node] for node in order}
+
+    path = []
+    if order:
+        node = max(order, key=lambda node: finish[node])
+        while node is not None:
+            path.append(node)
+            node = previous.get(node)
+        path.reverse()
+    return length, path, finish, slack
+
+
+def group_times(nodes, groups, costs):
+    """Return the time spent in each group by a list of nodes."""
+    times = {}
+    for node in nodes:
+        times[groups[node]] = times.get(groups[node], 0.) + costs[node]
+    return times
+
+
+def main():
+    groupsmap = {name[:-len('.json')]: os.path.join(BASE_DIR, 'web', 'groups', name) for name in os.listdir(os.path.join(BASE_DIR, 'web', 'groups')) if name.endswith('.json')}
+
+    parser = argparse.ArgumentParser(description='Find the critical path through a DependencyGraph .dot file, weighted by the per-event time of each module, and the slack of the other modules.')
+    parser.add_argument('graph', metavar='DOT', help='Graphviz .dot file written by the DependencyGraph service')
+    parser.add_argument('resources', metavar='JSON', help='resources.json file of the same job, written by the FastTimerService')
+    parser.add_argument('-g', '--groups', choices=groupsmap, metavar='GROUP', default='hlt', help='module groupings (default: hlt)')
+    parser.add_argument('-m', '--metric', choices=['time_real', 'time_thread'], default='time_real', help='metric used for the weight of the modules (default: time_real)')
+    parser.add_argument('-n', '--slack', type=int, default=10, metavar='N', help='also print the N most expensive modules off the critical path, with their slack (default: 10)')
+    parser.add_argument('--json', metavar='FILE', help='write the critical path, the time of each group on it, and the slack of each module to FILE, as JSON')
+    args = parser.parse_args()
+
+    with open(groupsmap[args.groups]) as f:
+        matcher = CachedGroupMatcher(json.load(f))
+
+    graph = read_graph(args.graph)
+    costs, total = module_costs(args.resources, args.metric)
+    costs = node_costs(graph, costs)
+    try:
+        length, path, finish, slack = critical_path(graph, costs)
+    except ValueError as e:
+        sys.exit(f'{args.graph}: {e}')
+    groups = {node: matcher.match(*graph.module(node)) or 'Unassigned' for node in graph.nodes}
+    matcher.save()
+
+    work = sum(costs.values())
+    print(f'critical path: {length:.3f} ms/event through {len(path)} of {len(graph.nodes)} modules')
+    print(f'sum of the modules: {work:.3f} ms/event (job total {total:.3f} ms/event)')
+    if length > 0:
+        print(f'largest speed-up from concurrent modules: {work / length:.2f}x')
+
+    print()
+    width = max((len(group) for group in groups.values()), default=0)
+    print(f'{"group":<{width}}  {"ms/event":>10}  {"path":>6}')
+    for group, time in sorted(group_times(path, groups, costs).items(), key=lambda item: (-item[1], item[0])):
+        print(f'{group:<{width}}  {time:>10.3f}  {100 * time / length if length else 0.:>5.1f}%')
+
+    print()
+    modules = ['|'.join(graph.module(node)) for node in graph.nodes]
+    width = max((len(module) for module in modules), default=0)
+    print(f'{"module":<{width}}  {"ms/event":>10}  {"finish":>10}')
+    for node in path:
+        print(f'{"|".join(graph.module(node)):<{width}}  {costs[node]:>10.3f}  {finish[node]:>10.3f}')
+
+    if args.slack > 0:
+        on_path = set(path)
+        others = sorted((node for node in graph.nodes if node not in on_path and costs[node] > 0), key=lambda node: (-costs[node], node))[:args.slack]
+        if others:
+            print()
+            print(f'{"module":<{width}}  {"ms/event":>10}  {"slack":>10}')
+            for node in others:
+                print(f'{"|".join(graph.module(node)):<{width}}  {costs[node]:>10.3f}  {slack[node]:>10.3f}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'metric': args.metric,
+                'length': length,
+                'work': work,
+                'path': ['|'.join(graph.module(node)) for node in path],
+                'groups': group_times(path, groups, costs),
+                'modules': {'|'.join(graph.module(node)): {args.metric: costs[node], 'finish': finish[node], 'slack': slack[node], 'group': groups[node]} for node in graph.nodes},
+            }, f, indent=2)
+            f.write('\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
 import argparse
-import json
+import os
 import re
 from collections import defaultdict
+from contextlib import redirect_stdout
 from rich.console import Console
 from pprint import pprint
+from group_matcher import CachedGroupMatcher
+from resources_io import load_columns, load_resources
+from repeat_stats import DEFAULT_BOOTSTRAP, DEFAULT_CONFIDENCE, align, expand_repeat_set, mean_aggregate, significant
 
 METRICS = ['mem_alloc', 'mem_free',
            'time_real', 'time_thread',
@@ -28,70 +32,112 @@ def parse_arguments():
     parser.add_argument('--cutoff', type=float, default=-1., help='Cutoff to be applied to the relative fraction of each selected components to be printed on the terminal.')
     parser.add_argument('--latexcutoff', type=float, default=-1., help='Cutoff to be applied to the relative fraction of each selected components to be printed on aggregate latex tables.')
     parser.add_argument('--dropfirst', type=int, default=0, help='Drop the first specified elements from the full path of the modules.')
-    parser.add_argument('--alert', type=float, default=5, help='Alert threshold, in percetage, to be used to highlight differences between the two input files.')
+    parser.add_argument('--alert', type=float, default=5, help='Alert threshold, in percetage, to be used to highlight differences between the input files and the baseline.')
+    parser.add_argument('--baseline', type=int, default=0, help='Index of the input file used as baseline for the alerts when comparing several input files. Default is 0.')
+    parser.add_argument('--repeat-sets', action="store_true", default=False, help="Treat each input file as a repeat set: a '+' separated list of files, or a glob pattern, with repeated measurements of the same configuration. The tables show the mean over the repeated measurements, and only the statistically significant differences are highlighted by --alert: the bootstrap resamples the percentages compared by --alert, i.e. the mean per event of each key divided by the mean total per event of the metric.")
+    parser.add_argument('--confidence', type=float, default=DEFAULT_CONFIDENCE, help=f'Confidence level of the bootstrap intervals used with --repeat-sets. Default is {DEFAULT_CONFIDENCE}.')
+    parser.add_argument('--bootstrap', type=int, default=DEFAULT_BOOTSTRAP, help=f'Number of bootstrap replicas used with --repeat-sets. Default is {DEFAULT_BOOTSTRAP}.')
     parser.add_argument('--aggregate', action="store_true", default=False, help='Aggregate the filtered data in a hierarchical representation. This options only works when --latex is enabled.')
+    parser.add_argument('--metrics', type=str, default=None, help='Comma separated list of quantities to aggregate in a single run, instead of --metric. Requires --output-dir.')
+    parser.add_argument('--levels', type=str, default=None, help='Comma separated list of levels to aggregate in a single run, instead of --level. Requires --output-dir.')
+    parser.add_argument('--output-dir', type=str, default=None, help='Write the terminal, Markdown and latex tables for each metric and level to separate files in this directory, named <metric>_level<level>.{txt,md,tex}.')
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if (args.metrics or args.levels) and not args.output_dir:
+        parser.error('--metrics and --levels require --output-dir')
+    args.metrics = args.metrics.split(',') if args.metrics else [args.metric]
+    args.levels = [int(level) for level in args.levels.split(',')] if args.levels else [args.level]
+    for metric in args.metrics:
+        if metric not in METRICS:
+            parser.error(f"invalid metric '{metric}' in --metrics, valid values are {', '.join(METRICS)}")
+
+    return args
 
 def load_json(file_path):
-    """Helper function to load JSON data from a file."""
-    with open(file_path, 'r') as file:
-        return json.load(file)
+    """Helper function to load JSON data from a file, in JSON or columnar format."""
+    return load_resources(file_path)
+
+def load_modules(file_path, metrics):
+    """
+    Load the input json without its modules, and only the type, label and
+    given metrics of the modules, as columns: the files in the columnar format
+    are read through their arrays, without building the modules.
+    """
+    return load_columns(file_path, ['type', 'label'] + list(metrics))
 
-def augment_json(input_data, group_data, debug):
+def augment_json(columns, group_data, debug):
     """
-    Get the input json via input_data and augment it by adding a new key to
-    each element, named 'expanded', that will combine the information coming
+    Get the columns of the modules of the input json and augment them by adding
+    a new column, named 'expanded', that will combine the information coming
     from the input json and from the grouping json. All modules that cannot be
     found in the original group_data will be assigned to the macro package
     "Unassigned". The separator between the different fields is '|'.
     """
 
-    groups = []
-    for pattern, group in group_data.items():
-        if '|' in pattern:
-            ctype, label = pattern.split('|')
-        else:
-            ctype = ''
-            label = pattern
-        ctype = re.compile(ctype.replace('?', '.').replace('*', '.*') + '$') if ctype else None
-        label = re.compile(label.replace('?', '.').replace('*', '.*') + '$') if label else None
-        groups.append([ctype, label, group])
-
-    for module in input_data['modules']:
-        found = False
-        for g in groups:
-            if (g[0] is None or g[0].match(module['type'])) and (g[1] is None or g[1].match(module['label'])):
-                module['expanded'] = "|".join([g[2], module['type'], module['label']])
-                found = True
-                break;
-        if not found:
+    matcher = CachedGroupMatcher(group_data)
+
+    expanded = []
+    for module_type, module_label in zip(columns['type'], columns['label']):
+        group = matcher.match(module_type, module_label)
+        if group is None:
             if debug:
-                print("Failed to parse {}".format(module))
-            module['expanded'] =  "|".join(["Unassigned", module['type'], module['label']])
+                print("Failed to parse {}|{}".format(module_type, module_label))
+            group = "Unassigned"
+        expanded.append("|".join([group, module_type, module_label]))
+    columns['expanded'] = expanded
+    matcher.save()
 
-    return input_data
+    return columns
 
-def aggregate_data(input_data, metric, level, filter, dropfirst=0):
+def aggregate_data(input_data, columns, metric, level, filter, dropfirst=0):
     """
     Aggregate the data in the original json according to the command line arguments supplied.
     """
 
+    return aggregate_many(input_data, columns, [metric], [level], filter, dropfirst)[(metric, level)]
+
+def aggregate_many(input_data, columns, metrics, levels, filter, dropfirst=0):
+    """
+    Aggregate the data in the original json for several metrics and levels at
+    once, from the augmented columns of its modules: each module is filtered
+    and its expanded name is split only once.
+    Return a dictionary with the aggregated data for each (metric, level).
+    """
+
     try:
         re_filter = re.compile(filter)
     except Exception as _:
         print("Failed to compile the supplied Regular expression {}".format(filter))
         re_filter = re.compile(".*")
 
-    result = {}
-    for module in input_data['modules']:
-        if re_filter.match(module['expanded']):
-            key = '|'.join(module['expanded'].split('|')[dropfirst:level])
-            if not key in result.keys():
-                result[key] = 0.
-            result[key] += module[metric]/input_data['total']['events']
+    results = {(metric, level): {} for metric in metrics for level in levels}
+    events = input_data['total']['events']
+    values = [columns[metric] for metric in metrics]
+    for expanded, *row in zip(columns['expanded'], *values):
+        if re_filter.match(expanded):
+            fields = expanded.split('|')
+            for level in levels:
+                key = '|'.join(fields[dropfirst:level])
+                for metric, value in zip(metrics, row):
+                    result = results[(metric, level)]
+                    if not key in result:
+                        result[key] = 0.
+                    result[key] += value/events
+
+    return results
+
+def sort_and_limit(aggregated_data, sort, limit):
+    """
+    Flatten and sort the aggregated data, and return it together with its first limit elements.
+    """
+    # Flatten the aggregated data
+    flat_data = flatten_dict(aggregated_data)
 
-    return result
+    # Sort the data based on the second element of the tuple
+    flat_data.sort(key=lambda x: x[1], reverse=(sort == 'd'))
+
+    # Limit the output
+    return flat_data, flat_data[:limit]
 
 def flatten_dict(data):
     """
@@ -245,39 +291,46 @@ def print_infos(args):
         print(key, vargs[key])
     print()
 
-def main():
-    args = parse_arguments()
-
-    # Load input data and group data
-    # Split the comma-separated list of file names into a list
-    group_data = load_json(args.group_file)
-    input_data = []
-    augmented_data = []
-    aggregated_data = []
-    flat_data = []
-    limited_data = []
-    file_list = args.input_files.split(',')
-    if len(file_list) > 2:
-        print("Only two input files are supported at the moment.")
-        return
-    for file in file_list:
-        input_data.append(load_json(file))
-
-        augmented_data.append(augment_json(input_data[-1], group_data, args.debug))
-
-        # Aggregate the data based on the provided level and group_by_keys
-        aggregated_data.append(aggregate_data(augmented_data[-1], args.metric, args.level, args.filter, args.dropfirst))
-
-        # Flatten the aggregated data
-        flat_data.append(flatten_dict(aggregated_data[-1]))
-
-        # Sort the data based on the second element of the tuple
-        flat_data[-1].sort(key=lambda x: x[1], reverse=(args.sort == 'd'))
-
-        # Limit the output
-        limited_data.append(flat_data[-1][:args.limit])
-
-    print_infos(args)
+def comparison_matrix(limited_data):
+    """
+    Align the aggregated data of several input files in a single pass: return
+    a dictionary that maps each key to the list of its values in each file,
+    with None for the files where the key is missing.
+    """
+    n = len(limited_data)
+    matrix = {}
+    for i, data in enumerate(limited_data):
+        for key, value in data:
+            row = matrix.get(key)
+            if row is None:
+                row = matrix[key] = [None] * n
+            row[i] = value
+    return matrix
+
+def mean_input(runs):
+    """
+    Return a stand-in for the input data of a repeat set, with the mean over
+    the runs of the per-event totals of each metric.
+    """
+    totals = [run['total'] for run in runs]
+    total = {'events': 1}
+    for key, value in totals[0].items():
+        if key != 'events' and isinstance(value, (int, float)):
+            total[key] = sum(t.get(key, 0) / t['events'] for t in totals) / len(totals)
+    return {'total': total}
+
+def print_tables(args, file_list, input_data, flat_data, limited_data, metric, level, markdown=False, latex=False, samples=None, terminal=True, totals=None):
+    """
+    Print the table with the aggregated data of one or more input files, for
+    the given metric and level, in terminal, Markdown or latex format.
+    Several input files are compared key by key, and their differences with
+    respect to the baseline file are highlighted. For repeat sets, samples
+    holds the aggregated data of each run of each input, and only the
+    statistically significant differences are highlighted; with the total per
+    event of each run (totals), the significance is computed for the same
+    percentages compared by the alert. The highlighting uses terminal colours,
+    unless terminal is False.
+    """
 
     if len(input_data) == 1:
         hierarchical_data = None
@@ -288,14 +341,14 @@ def main():
             everything_else = 100
             print(f"\n {i} " + file_list[i])
             for key, value in limited_data[i]:
-                norm_value = value *input_data[i]['total']['events'] / input_data[i]['total'][args.metric] * 100.
+                norm_value = value *input_data[i]['total']['events'] / input_data[i]['total'][metric] * 100.
                 if args.cutoff != -1 and norm_value < args.cutoff:
                     break
                 everything_else -= norm_value
-                if args.markdown:
+                if markdown:
                     markdown_key = key.replace('|',' - ')
                     print(f"| {markdown_key} | {value:.2f} | {norm_value:.2f}% |")
-                elif args.latex:
+                elif latex:
                     if args.aggregate:
                         # Update the nested dictionary with the parsed value
                         # Since this implies an aggregation of the data, this
@@ -316,58 +369,80 @@ def main():
             if args.aggregate:
                 if args.debug:
                     print(f"LIMITED_DATA: {limited_data}")
-                print_latex_table(hierarchical_data, dict(), args.metric, args.level, args.latexcutoff)
+                print_latex_table(hierarchical_data, dict(), metric, level, args.latexcutoff)
 
-    if len(input_data) != 2:
+    if len(input_data) < 2:
         return
-    # Print common keys first.
-    # Loop on the first file and print exclusive keys.
-    # Loop on the second file and print exclusive keys.
+    # Print common keys first, sorted by their value in the first file.
+    # Loop on each file and print the keys missing from some other file.
     #
-    # Find common keys
-    # Create a console that forces terminal
-    console = Console(force_terminal=True)
+    # Align the keys of all files
+    matrix = comparison_matrix(limited_data)
+    common_keys = [key for key, row in matrix.items() if None not in row]
+    # Normalisation of each file to its total, in percentage
+    scale = [data['total']['events'] / data['total'][metric] * 100. for data in input_data]
+    baseline = args.baseline
+    # Create a console that forces terminal, or one that writes plain text to a file
+    if terminal:
+        console = Console(force_terminal=True)
+    else:
+        console = Console(force_terminal=False, soft_wrap=True)
     print("\nCOMPARISONS\n")
     for i,f in enumerate(file_list):
-        console.print(f"[bold red]{i}[/] [bold yellow]{f}[/]")
-    common_keys = dict(limited_data[0]).keys() & dict(limited_data[1]).keys()
-    sorted_common_keys = sorted(common_keys, key=lambda k: dict(flat_data[0])[k], reverse=(args.sort == 'd'))
-    for key in sorted_common_keys:
-        value = dict(limited_data[0])[key]
-        norm_value = value * input_data[0]['total']['events'] / input_data[0]['total'][args.metric] * 100.
-        value2 = dict(limited_data[1])[key]
-        norm_value2 = value2 * input_data[1]['total']['events'] / input_data[1]['total'][args.metric] * 100.
-        if args.cutoff != -1 and (norm_value < args.cutoff or norm_value2 < args.cutoff):
+        suffix = " (baseline)" if i == baseline else ""
+        console.print(f"[bold red]{i}[/] [bold yellow]{f}[/]{suffix}")
+    sorted_common_keys = sorted(common_keys, key=lambda k: matrix[k][0], reverse=(args.sort == 'd'))
+    significance = None
+    if samples is not None:
+        # Bootstrap the differences with the baseline for all the common keys at once
+        runs = [align(sample, sorted_common_keys)[1] for sample in samples]
+        if totals is None:
+            significance = [significant(runs[baseline], values, args.bootstrap, args.confidence) for values in runs]
+        else:
+            significance = [significant(runs[baseline], values, args.bootstrap, args.confidence, 0, totals[baseline], run_totals) for values, run_totals in zip(runs, totals)]
+    for row, key in enumerate(sorted_common_keys):
+        values = matrix[key]
+        norm_values = [value * factor for value, factor in zip(values, scale)]
+        if args.cutoff != -1 and min(norm_values) < args.cutoff:
             break
-        if args.markdown:
+        if markdown:
             markdown_key = key.replace('|',' - ')
             if args.dropfirst > 0:
                 markdown_key = ' - '.join(markdown_key.split(' - ')[args.dropfirst:])
-            print(f"| {markdown_key} | {value:.2f} | {norm_value:.2f}% | {value2:.2f} | {norm_value2:.2f}% |")
-        elif args.latex:
+            columns = " | ".join(f"{value:.2f} | {norm_value:.2f}%" for value, norm_value in zip(values, norm_values))
+            print(f"| {markdown_key} | {columns} |")
+        elif latex:
             latex_key = key.replace('|',' - ')
             if args.dropfirst > 0:
                 latex_key = ' - '.join(latex_key.split(' - ')[args.dropfirst:])
-            print(f"{latex_key} & {value:.2f} & {norm_value:.2f}\% & {value2:.2f} & {norm_value2:.2f}\% \\tabularnewline")
+            columns = " & ".join(f"{value:.2f} & {norm_value:.2f}\\%" for value, norm_value in zip(values, norm_values))
+            print(f"{latex_key} & {columns} \\tabularnewline")
         else:
-            alert = False
-            if norm_value2 != 0:
-                alert = abs(norm_value-norm_value2)/norm_value2 > args.alert
-            color = "bold red" if alert else "green"
-            console.print(f"[orange]{key}[/]\t{value:.2f}\t[{color}]{norm_value:.2f}%[/]\t{value2:.2f}\t[{color}]{norm_value2:.2f}%[/]")
+            reference = norm_values[baseline]
+            alerts = [False] * len(norm_values)
+            if reference != 0:
+                alerts = [abs(norm_value - reference) / reference * 100. > args.alert for norm_value in norm_values]
+            if significance is not None:
+                alerts = [alert and bool(significance[i][row]) for i, alert in enumerate(alerts)]
+            # the baseline is highlighted if any other file differs from it
+            alerts[baseline] = any(alerts)
+            columns = "\t".join(f"{value:.2f}\t[{'bold red' if alert else 'green'}]{norm_value:.2f}%[/]" for value, norm_value, alert in zip(values, norm_values, alerts))
+            # do not wrap the rows, with many files they are wider than the terminal
+            console.print(f"[orange]{key}[/]\t{columns}", soft_wrap=True)
+    common_keys = set(common_keys)
     for i in range(len(input_data)):
         for key, value in limited_data[i]:
             if key in common_keys:
                 continue
-            norm_value = value *input_data[i]['total']['events'] / input_data[i]['total'][args.metric] * 100.
+            norm_value = value * scale[i]
             if args.cutoff != -1 and norm_value < args.cutoff:
                 break
-            if args.markdown:
+            if markdown:
                 markdown_key = key.replace('|',' - ')
                 if args.dropfirst > 0:
                     markdown_key = ' - '.join(markdown_key.split(' - ')[args.dropfirst:])
                 print(f"| {i} | {markdown_key} | {value:.2f} | {norm_value:.2f}% |")
-            elif args.latex:
+            elif latex:
                 latex_key = key.replace('|',' - ')
                 if args.dropfirst > 0:
                     latex_key = ' - '.join(latex_key.split(' - ')[args.dropfirst:])
@@ -376,6 +451,73 @@ def main():
                 print(f"{i} {key}: {value:.2f} {norm_value:.2f}%")
 
 
+def main():
+    args = parse_arguments()
+
+    # Load input data and group data
+    # Split the comma-separated list of file names into a list
+    group_data = load_json(args.group_file)
+    input_data = []
+    augmented_data = []
+    aggregated_data = []
+    repeated_data = []
+    repeated_runs = []
+    file_list = args.input_files.split(',')
+    if not 0 <= args.baseline < len(file_list):
+        print(f"Invalid baseline {args.baseline}: only {len(file_list)} input files are given.")
+        return
+    for entry in file_list:
+        if not args.repeat_sets:
+            document, columns = load_modules(entry, args.metrics)
+            input_data.append(document)
+
+            augmented_data.append(augment_json(columns, group_data, args.debug))
+
+            # Aggregate the data for all the requested metrics and levels in a single pass
+            aggregated_data.append(aggregate_many(input_data[-1], augmented_data[-1], args.metrics, args.levels, args.filter, args.dropfirst))
+            continue
+
+        # Aggregate each run of the repeat set, and use their mean
+        runs = []
+        repeats = []
+        for file in expand_repeat_set(entry):
+            document, columns = load_modules(file, args.metrics)
+            runs.append(document)
+            augment_json(columns, group_data, args.debug)
+            repeats.append(aggregate_many(runs[-1], columns, args.metrics, args.levels, args.filter, args.dropfirst))
+        input_data.append(mean_input(runs))
+        aggregated_data.append({key: mean_aggregate([repeat[key] for repeat in repeats]) for key in repeats[0]})
+        repeated_data.append(repeats)
+        repeated_runs.append(runs)
+
+    print_infos(args)
+
+    def samples(metric, level):
+        if not args.repeat_sets:
+            return None
+        return [[repeat[(metric, level)] for repeat in repeats] for repeats in repeated_data]
+
+    def totals(metric):
+        if not args.repeat_sets:
+            return None
+        return [[run['total'].get(metric, 0) / run['total']['events'] for run in runs] for runs in repeated_runs]
+
+    if not args.output_dir:
+        flat_data, limited_data = zip(*[sort_and_limit(data[(args.metric, args.level)], args.sort, args.limit) for data in aggregated_data])
+        print_tables(args, file_list, input_data, flat_data, limited_data, args.metric, args.level, args.markdown, args.latex, samples(args.metric, args.level), totals=totals(args.metric))
+        return
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for metric in args.metrics:
+        for level in args.levels:
+            flat_data, limited_data = zip(*[sort_and_limit(data[(metric, level)], args.sort, args.limit) for data in aggregated_data])
+            for extension, markdown, latex in (('txt', False, False), ('md', True, False), ('tex', False, True)):
+                name = os.path.join(args.output_dir, f"{metric}_level{level}.{extension}")
+                with open(name, 'w') as output, redirect_stdout(output):
+                    print_tables(args, file_list, input_data, flat_data, limited_data, metric, level, markdown, latex, samples(metric, level), terminal=False, totals=totals(metric))
+                print(name)
+
+
 if __name__ == "__main__":
     main()
 
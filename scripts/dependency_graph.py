@@ -0,0 +1,127 @@
+"""
+Read the dependency graph of a CMSSW job, written in Graphviz format by the
+DependencyGraph service, and the per-event cost of its modules from the
+resources.json file of the same job.
+
+Each module is a node with its label in the "label" attribute and its type in
+the "tooltip" attribute:
+
+    0[color=black, fillcolor=white, label=source, shape=oval, style=filled, tooltip=PoolSource];
+
+and each dependency is an edge from the module that produces a product to the
+one that consumes it:
+
+    0 -> 1;
+"""
+
+import re
+import sys
+
+from resources_io import load_resources
+
+NODE = re.compile(r'\s*([0-9]+)\s*\[(.*)\]\s*;?\s*$')
+EDGE = re.compile(r'\s*([0-9]+)\s*->\s*([0-9]+)')
+ATTRIBUTE = re.compile(r'''(\w+)\s*=\s*("[^"]*"|'[^']*'|[^,\s]+)''')
+
+# number of unmatched modules listed in the warning of node_costs()
+MAX_UNMATCHED = 10
+
+
+class DependencyGraph:
+    """The modules of a job, and the dependencies among them."""
+
+    def __init__(self):
+        # node id -> dictionary of attributes
+        self.nodes = {}
+        # (producer, consumer) pairs of node ids, without duplicates
+        self.edges = []
+
+    def module(self, node):
+        """Return the (type, label) of a node."""
+        attributes = self.nodes[node]
+        return attributes.get('tooltip', ''), attributes.get('label', '')
+
+    def consumers(self):
+        """Return the dictionary node id -> list of the nodes that depend on it."""
+        consumers = {node: [] for node in self.nodes}
+        for producer, consumer in self.edges:
+            consumers[producer].append(consumer)
+        return consumers
+
+
+def parse_attributes(text):
+    attributes = {}
+    for name, value in ATTRIBUTE.findall(text):
+        if value[:1] in '"\'' and value[-1:] == value[:1] and len(value) > 1:
+            value = value[1:-1]
+        attributes[name] = value
+    return attributes
+
+
+def read_graph(path):
+    """Read a dependency graph from a Graphviz file."""
+    graph = DependencyGraph()
+    seen = set()
+    with open(path) as f:
+        for line in f:
+            edge = EDGE.match(line)
+            if edge:
+                pair = (int(edge[1]), int(edge[2]))
+                if pair not in seen:
+                    seen.add(pair)
+                    graph.edges.append(pair)
+                continue
+            node = NODE.match(line)
+            if node:
+                graph.nodes[int(node[1])] = parse_attributes(node[2])
+    # nodes only mentioned by the edges
+    for pair in graph.edges:
+        for node in pair:
+            graph.nodes.setdefault(node, {})
+    return graph
+
+
+def module_costs(path, metric):
+    """
+    Return the per-event value of a metric for each module of a resources file,
+    as a dictionary (type, label) -> value, and the per-event total of the job.
+    """
+    data = load_resources(path)
+    events = data['total']['events'] or 1
+    costs = {}
+    for module in data['modules']:
+        key = (module['type'], module['label'])
+        costs[key] = costs.get(key, 0.) + module.get(metric, 0.) / events
+    return costs, data['total'].get(metric, 0.) / events
+
+
+def node_costs(graph, costs):
+    """
+    Return the per-event cost of each node of a graph. The modules are looked up
+    by type and label, or by label only if a single module has that label, since
+    the type of a module in the graph may be written differently. The nodes that
+    do not match any module have no cost, and are listed on the standard error.
+    """
+    by_label = {}
+    for key in costs:
+        by_label.setdefault(key[1], []).append(key)
+    result = {}
+    unmatched = []
+    for node in graph.nodes:
+        ctype, label = graph.module(node)
+        value = costs.get((ctype, label))
+        if value is None:
+            keys = by_label.get(label, [])
+            if len(keys) == 1:
+                value = costs[keys[0]]
+            else:
+                value = 0.
+                unmatched.append(f"{ctype}|{label}" + (f" (the label of {len(keys)} modules)" if keys else ""))
+        result[node] = value
+    if unmatched:
+        print(f"WARNING: {len(unmatched)} modules of the dependency graph do not match any module of the resources file, and have no cost:", file=sys.stderr)
+        for name in unmatched[:MAX_UNMATCHED]:
+            print(f"    {name}", file=sys.stderr)
+        if len(unmatched) > MAX_UNMATCHED:
+            print(f"    ... and {len(unmatched) - MAX_UNMATCHED} more", file=sys.stderr)
+    return result
@@ -0,0 +1,123 @@
+#! /usr/bin/env python3
+"""
+Collapse the dependency graph of a CMSSW job into a graph of its groups.
+
+Each module of the graph written by the DependencyGraph service is assigned to
+its group, using the same group files as the web pages; the groups become the
+nodes of the new graph, with an area proportional to their per-event time
+measured in the resources.json file of the same job, and the dependencies
+between modules of different groups become edges between the groups, with a
+width proportional to their number. A menu with thousands of modules gives a
+graph of a few dozen nodes, that Graphviz lays out immediately.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+
+from dependency_graph import read_graph, module_costs, node_costs
+from dot_colour import is_dark
+from group_matcher import CachedGroupMatcher
+
+BASE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+
+
+def collapse(graph, costs, matcher, level=0):
+    """
+    Return the per-event cost and number of modules of each group, and the
+    number of dependencies between each pair of different groups. With a
+    positive level, only the first `level` parts of the group names are kept.
+    """
+    groups = {}
+    for node in graph.nodes:
+        group = matcher.match(*graph.module(node)) or 'Unassigned'
+        if level > 0:
+            group = '|'.join(group.split('|')[:level])
+        groups[node] = group
+
+    cost = {}
+    size = {}
+    for node, group in groups.items():
+        cost[group] = cost.get(group, 0.) + costs[node]
+        size[group] = size.get(group, 0) + 1
+
+    edges = {}
+    for producer, consumer in graph.edges:
+        pair = (groups[producer], groups[consumer])
+        if pair[0] != pair[1]:
+            edges[pair] = edges.get(pair, 0) + 1
+    return cost, size, edges
+
+
+def group_colour(colours, group):
+    """Return the colour of a group, or of its top-level group."""
+    return colours.get(group) or colours.get(group.split('|')[0])
+
+
+def quote(text):
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def write_dot(out, cost, size, edges, colours, metric, total, max_size, min_edges=1):
+    largest = max(cost.values(), default=0.) or 1.
+    widest = max(edges.values(), default=0) or 1
+    names = {group: f"g{i}" for i, group in enumerate(sorted(cost))}
+
+    out.write('digraph groups {\n')
+    out.write(f'  label={quote(f"{metric} per event: {sum(cost.values()):.1f} ms of {total:.1f} ms")};\n')
+    out.write('  node [shape=box, style="filled,rounded", fixedsize=false];\n')
+    for group in sorted(cost, key=lambda group: -cost[group]):
+        # the area of a node is proportional to its cost
+        scale = math.sqrt(cost[group] / largest)
+        width = 0.75 + (max_size - 0.75) * scale
+        height = 0.5 + (max_size / 2 - 0.5) * scale
+        background = group_colour(colours, group) or '#ffffff'
+        foreground = 'white' if is_dark(background) else 'black'
+        label = quote(group)[:-1] + f'\\n{cost[group]:.2f} ms"'
+        tooltip = f"{size[group]} modules, {100 * cost[group] / total:.1f}% of the job" if total > 0 else f"{size[group]} modules"
+        out.write(f'  {names[group]} [label={label}, tooltip={quote(tooltip)}, width={width:.2f}, height={height:.2f}, fillcolor="{background}", fontcolor="{foreground}"];\n')
+    for (producer, consumer), count in sorted(edges.items(), key=lambda item: (-item[1], item[0])):
+        if count < min_edges:
+            break
+        penwidth = 1 + 5 * count / widest
+        out.write(f'  {names[producer]} -> {names[consumer]} [penwidth={penwidth:.2f}, label="{count}", tooltip={quote(f"{producer} -> {consumer}: {count} dependencies")}];\n')
+    out.write('}\n')
+
+
+def main():
+    groupsmap = {name[:-len('.json')]: os.path.join(BASE_DIR, 'web', 'groups', name) for name in os.listdir(os.path.join(BASE_DIR, 'web', 'groups')) if name.endswith('.json')}
+    coloursmap = {name[:-len('.json')]: os.path.join(BASE_DIR, 'web', 'colours', name) for name in os.listdir(os.path.join(BASE_DIR, 'web', 'colours')) if name.endswith('.json')}
+
+    parser = argparse.ArgumentParser(description='Collapse a DependencyGraph .dot file into a graph of the module groups, weighted by their measured cost.')
+    parser.add_argument('graph', metavar='DOT', help='Graphviz .dot file written by the DependencyGraph service')
+    parser.add_argument('resources', metavar='JSON', help='resources.json file of the same job, written by the FastTimerService')
+    parser.add_argument('-g', '--groups', choices=groupsmap, metavar='GROUP', default='hlt', help='module groupings (default: hlt)')
+    parser.add_argument('-c', '--colours', choices=coloursmap, metavar='COLOUR', default='default', help='colour scheme (default: default)')
+    parser.add_argument('-m', '--metric', choices=['time_real', 'time_thread'], default='time_real', help='metric used for the size of the nodes (default: time_real)')
+    parser.add_argument('-l', '--level', type=int, default=0, help='number of levels of the group names to keep, e.g. 1 to merge "Tracking|Portable" into "Tracking" (default: all)')
+    parser.add_argument('--max-size', type=float, default=3., help='width in inches of the most expensive group (default: 3)')
+    parser.add_argument('--min-edges', type=int, default=1, help='hide the edges between two groups with fewer dependencies than this (default: 1)')
+    parser.add_argument('-o', '--output', default='-', help='output .dot file (default: the standard output)')
+    args = parser.parse_args()
+
+    with open(groupsmap[args.groups]) as f:
+        matcher = CachedGroupMatcher(json.load(f))
+    with open(coloursmap[args.colours]) as f:
+        colours = json.load(f)
+
+    graph = read_graph(args.graph)
+    costs, total = module_costs(args.resources, args.metric)
+    cost, size, edges = collapse(graph, node_costs(graph, costs), matcher, args.level)
+    matcher.save()
+
+    if args.output == '-':
+        write_dot(sys.stdout, cost, size, edges, colours, args.metric, total, args.max_size, args.min_edges)
+    else:
+        with open(args.output, 'w') as f:
+            write_dot(f, cost, size, edges, colours, args.metric, total, args.max_size, args.min_edges)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,9 @@ from pathlib import Path
 import argparse
 import re
 import json
+from concurrent.futures import ProcessPoolExecutor
+
+from group_matcher import GroupMatcher
 
 
 def darken(value):
@@ -23,9 +26,18 @@ def is_dark(value):
 
 args = None
 groupsmap = {}
-groups = []
+groups = None
 coloursmap = {}
 colours = {}
+# (tooltip, label, fillcolor) -> (background, foreground)
+memo = {}
+
+# modules look something like
+#   0[color=black, fillcolor=white, label=source, shape=oval, style=filled, tooltip=PoolSource];
+pattern = re.compile(r'''([0-9]+)\[(((color=["']?(?P<color>[a-zA-Z0-9_]+)["']?)|(fillcolor=["']?(?P<fillcolor>[a-zA-Z0-9_]+)["']?)|(label=["']?(?P<label>[a-zA-Z0-9_]+)["']?)|(shape=["']?(?P<shape>[a-zA-Z0-9_]+)["']?)|(style=["']?(?P<style>[a-zA-Z0-9_]+)["']?)|(tooltip=["']?(?P<tooltip>[a-zA-Z0-9_]+)["']?))( *, *)?)+\];$''')
+# the attributes in the order and format written by the DependencyGraph service:
+# a line matching this simple pattern also matches the full one, with the same values
+simple = re.compile(r'''([0-9]+)\[color=["']?(\w+)["']?, fillcolor=["']?(\w+)["']?, label=["']?(\w+)["']?, shape=["']?(\w+)["']?, style=["']?(\w+)["']?, tooltip=["']?(\w+)["']?\];$''', re.ASCII)
 
 def populate_choices():
   global groupsmap, coloursmap
@@ -38,24 +50,18 @@ def populate_choices():
 def parse_cmdline_args():
   global args
   parser = argparse.ArgumentParser()
-  parser.add_argument("file", type = argparse.FileType('r'), metavar = 'FILE', default = 'dependency.dot', help = "Graphviz .dot file to colorise")
+  parser.add_argument("file", nargs = '+', metavar = 'FILE', default = 'dependency.dot', help = "Graphviz .dot file(s) to colorise; a single file is written to the standard output, several files to <name>.coloured.dot")
   parser.add_argument("-g", "--groups", choices = groupsmap, metavar = 'GROUP', default = 'hlt', help = "Modules' groupings: ")
   parser.add_argument("-c", "--colours", choices = coloursmap, metavar = 'COLOUR', default = 'default', help = "Colour schemes: ")
+  parser.add_argument("-w", "--write", action = 'store_true', help = "Write also a single file to <name>.coloured.dot")
+  parser.add_argument("-j", "--jobs", type = int, default = 1, metavar = 'N', help = "Colour N files in parallel")
   args = parser.parse_args()
 
 def parse_groups():
   global groups
   f = open(groupsmap[args.groups], 'r')
   d = json.load(f)
-  for pattern, group in d.items():
-    if '|' in pattern:
-      ctype, label = pattern.split('|')
-    else:
-      ctype = ''
-      label = pattern
-    ctype = re.compile(ctype.replace('?', '.').replace('*', '.*') + '$') if ctype else None
-    label = re.compile(label.replace('?', '.').replace('*', '.*') + '$') if label else None
-    groups.append([ctype, label, group])
+  groups = GroupMatcher(d)
 
 def parse_colours():
   global colours
@@ -63,33 +69,80 @@ def parse_colours():
   colours = json.load(coloursfile)
 
 
+def parse_node(line):
+  # return the id, color, fillcolor, label, shape, style and tooltip of a node, or None
+  if not line.endswith('];'):
+    return None
+  match = simple.match(line)
+  if match:
+    return match.groups()
+  match = pattern.match(line)
+  if match:
+    return (match[1], match['color'], match['fillcolor'], match['label'], match['shape'], match['style'], match['tooltip'])
+  return None
+
+def node_colours(module, label, fillcolor):
+  key = (module, label, fillcolor)
+  if key not in memo:
+    foreground = 'black'
+    background = fillcolor
+    light = True if background == 'white' else False
+    group = groups.match(module, label)
+    if group is not None and group in colours:
+      background = colours[group] if light else darken(colours[group])
+      foreground = 'white' if is_dark(background) else 'black'
+    memo[key] = (background, foreground)
+  return memo[key]
+
+def colour_lines(lines):
+  for line in lines:
+    line = line.strip()
+    node = parse_node(line)
+    if node:
+      index, color, fillcolor, label, shape, style, tooltip = node
+      background, foreground = node_colours(tooltip, label, fillcolor)
+      yield '%d[color="%s", fillcolor="%s", fontcolor="%s", label="%s", shape="%s", style="%s", tooltip="%s"];\n' % (int(index), color, background, foreground, label, shape, style, tooltip)
+    else:
+      yield line + '\n'
+
+def output_name(name):
+  base = name[:-len('.dot')] if name.endswith('.dot') else name
+  return base + '.coloured.dot'
+
+def init_worker(group_data, colour_data):
+  global groups, colours
+  groups = GroupMatcher(group_data)
+  colours = colour_data
+
+def colour_file(name):
+  with open(name, 'r') as f:
+    lines = list(colour_lines(f))
+  output = output_name(name)
+  with open(output, 'w') as f:
+    f.writelines(lines)
+  return output
+
 def main():
   populate_choices()
   parse_cmdline_args()
   parse_groups()
   parse_colours()
 
-  # modules look something like
-  #   0[color=black, fillcolor=white, label=source, shape=oval, style=filled, tooltip=PoolSource];
-  pattern = re.compile(r'''([0-9]+)\[(((color=["']?(?P<color>[a-zA-Z0-9_]+)["']?)|(fillcolor=["']?(?P<fillcolor>[a-zA-Z0-9_]+)["']?)|(label=["']?(?P<label>[a-zA-Z0-9_]+)["']?)|(shape=["']?(?P<shape>[a-zA-Z0-9_]+)["']?)|(style=["']?(?P<style>[a-zA-Z0-9_]+)["']?)|(tooltip=["']?(?P<tooltip>[a-zA-Z0-9_]+)["']?))( *, *)?)+\];$''')
-  for line in args.file:
-    match = pattern.match(line.strip())
-    if match:
-      foreground = 'black'
-      background = match['fillcolor']
-      module = match['tooltip']
-      label = match['label']
-      light = True if background == 'white' else False
-      for g in groups:
-        if (g[0] is None or g[0].match(module)) and (g[1] is None or g[1].match(label)):
-          group = g[2]
-          if group in colours:
-            background = colours[g[2]] if light else darken(colours[g[2]])
-            foreground = 'white' if is_dark(background) else 'black'
-          break
-      print('%d[color="%s", fillcolor="%s", fontcolor="%s", label="%s", shape="%s", style="%s", tooltip="%s"];' % (int(match[1]), match['color'], background, foreground, match['label'], match['shape'], match['style'], match['tooltip']))
+  if len(args.file) == 1 and not args.write:
+    if args.file[0] == '-':
+      sys.stdout.writelines(colour_lines(sys.stdin))
     else:
-      print(line.strip())
+      with open(args.file[0], 'r') as f:
+        sys.stdout.writelines(colour_lines(f))
+  elif args.jobs > 1:
+    with open(groupsmap[args.groups], 'r') as f:
+      group_data = json.load(f)
+    with ProcessPoolExecutor(max_workers = args.jobs, initializer = init_worker, initargs = (group_data, colours)) as pool:
+      for output in pool.map(colour_file, args.file):
+        print(output)
+  else:
+    for name in args.file:
+      print(colour_file(name))
 
 
 if __name__ == "__main__":
@@ -4,13 +4,16 @@ import sys
 import os, os.path
 from pathlib import Path
 import argparse
-import re
 import json
+from concurrent.futures import ProcessPoolExecutor
+
+from group_matcher import GroupMatcher
+from resources_io import load_resources, is_dataset
 
 
 args = None
 groupsmap = {}
-groups = []
+groups = None
 
 def populate_choices():
   global groupsmap
@@ -20,40 +23,89 @@ def populate_choices():
 
 def parse_cmdline_args():
   global args
-  parser = argparse.ArgumentParser()
-  parser.add_argument("file", type = argparse.FileType('r'), nargs = '+', metavar = 'FILE', default = 'resources.json', help = "JSON file(s) with the resource usage produced by the FastTimerService")
+  parser = argparse.ArgumentParser(description = "Print the modules that are not assigned to any group, as entries to be added to a group file. The counts of the files and the real time per event of each module are printed to the standard error.")
+  parser.add_argument("file", nargs = '+', metavar = 'FILE', default = 'resources.json', help = "JSON file(s) with the resource usage produced by the FastTimerService, or directories to be searched recursively for them")
   parser.add_argument("-g", "--groups", choices = groupsmap, metavar = 'GROUP', default = 'hlt', help = "Module groupings to check for unassigned modules")
+  parser.add_argument("-j", "--jobs", type = int, default = 1, metavar = 'N', help = "Read N files in parallel")
+  parser.add_argument("--sort", choices = ['name', 'files', 'time'], default = 'name', help = "Sort the entries by name (default), by number of files, or by real time per event")
+  parser.add_argument("--json", metavar = 'FILE', help = "Write the number of files and the real time per event of each unassigned module to FILE, as JSON")
+  parser.add_argument("-q", "--quiet", action = 'store_true', help = "Do not print the counts to the standard error")
   args = parser.parse_args()
 
 def parse_groups():
   global groups
   f = open(groupsmap[args.groups], 'r')
   d = json.load(f)
-  for pattern, group in d.items():
-    if '|' in pattern:
-      ctype, label = pattern.split('|')
+  groups = GroupMatcher(d)
+
+def find_files(paths):
+  for path in paths:
+    if os.path.isdir(path):
+      for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+          if is_dataset(name):
+            yield os.path.join(root, name)
     else:
-      ctype = ''
-      label = pattern
-    ctype = re.compile(ctype.replace('?', '.').replace('*', '.*') + '$') if ctype else None
-    label = re.compile(label.replace('?', '.').replace('*', '.*') + '$') if label else None
-    groups.append([ctype, label, group])
+      yield path
+
+def scan_file(name):
+  # return the real time per event of each module in a file
+  data = load_resources(name)
+  events = data['total'].get('events') or 1
+  modules = {}
+  for module in data['modules']:
+    if module['type'] == "" and module['label'] == "":
+      continue
+    key = (module['type'], module['label'])
+    modules[key] = modules.get(key, 0.) + module.get('time_real', 0.) / events
+  return modules
 
 def main():
   populate_choices()
   parse_cmdline_args()
   parse_groups()
 
-  for input in args.file:
-    data = json.loads(input.read())
-    for module in data['modules']:
-      if module['type'] == "" and module['label'] == "":
-        continue
-      for g in groups:
-        if (g[0] is None or g[0].match(module['type'])) and (g[1] is None or g[1].match(module['label'])):
-          break;
-      else:
-        print('  "{type}|{label}": "",'.format(**module))
+  # collect the unique modules across all the files before matching them
+  files = list(find_files(args.file))
+  counts = {}
+  times = {}
+  if args.jobs > 1:
+    with ProcessPoolExecutor(max_workers = args.jobs) as pool:
+      scanned = pool.map(scan_file, files, chunksize = 16)
+      for modules in scanned:
+        for key, time in modules.items():
+          counts[key] = counts.get(key, 0) + 1
+          times[key] = times.get(key, 0.) + time
+  else:
+    for name in files:
+      for key, time in scan_file(name).items():
+        counts[key] = counts.get(key, 0) + 1
+        times[key] = times.get(key, 0.) + time
+
+  unassigned = [key for key in counts if groups.match(*key) is None]
+  if args.sort == 'files':
+    unassigned.sort(key = lambda key: (-counts[key], key))
+  elif args.sort == 'time':
+    unassigned.sort(key = lambda key: (-times[key] / counts[key], key))
+  else:
+    unassigned.sort()
+
+  for key in unassigned:
+    print('  "{0}|{1}": "",'.format(*key))
+
+  if not args.quiet and unassigned:
+    width = max(len(ctype) + len(label) + 1 for ctype, label in unassigned)
+    sys.stderr.write('{0:<{1}}  {2:>6}  {3:>10}\n'.format('module', width, 'files', 'ms/event'))
+    for key in unassigned:
+      sys.stderr.write('{0:<{1}}  {2:>6}  {3:>10.3f}\n'.format('|'.join(key), width, counts[key], times[key] / counts[key]))
+  if not args.quiet:
+    sys.stderr.write('{0} unassigned modules out of {1} in {2} files\n'.format(len(unassigned), len(counts), len(files)))
+
+  if args.json:
+    with open(args.json, 'w') as f:
+      json.dump({ '|'.join(key): { 'files': counts[key], 'time_real': times[key] / counts[key] } for key in unassigned }, f, indent = 2)
+      f.write('\n')
 
 
 if __name__ == "__main__":
@@ -0,0 +1,375 @@
+#! /usr/bin/env python3
+"""
+Find the dead and ambiguous entries of a group file.
+
+The group files are ordered dictionaries of "type|label" globs, where the
+first pattern that matches a module determines its group (see group_matcher.py).
+This script reports
+  - the duplicate keys, of which json.load() silently keeps only the last group;
+  - the unreachable entries, whose modules are all matched by a single earlier
+    pattern: "redundant" if that pattern assigns the same group, "shadowed" if
+    it assigns a different one;
+  - the conflicting overlaps: pairs of entries that assign different groups
+    and match some common modules, but where neither contains the other, so
+    the order of the file silently decides the group of those modules.
+An earlier, more specific pattern with a different group than a later, more
+general one is the usual way to write an exception, and is not reported.
+
+The two sides of a pattern are compared as globs, where '*' matches any string
+and '?' (or '.', as the globs are used as regular expressions) any character:
+the containment and the intersection of two globs are decided exactly, on the
+patterns themselves. The few patterns with other regular expression characters
+are only compared with literal strings.
+
+Only the pairs of entries that can match a common module are compared: the
+candidates are looked up in an index of the literal types and labels, and of
+the prefixes of the "prefix*" patterns, on the most selective side of each
+pattern.
+
+Optionally, the patterns are also checked against the modules found in some
+resources files: the entries that never determine the group of a module are
+reported as unused.
+"""
+
+import argparse
+import bisect
+import json
+import os
+import sys
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+from group_matcher import ANY, EXACT, PREFIX, REGEX_SPECIAL, PrefixTable, compile_field, field_matches, parse_pattern
+from resources_io import load_resources, is_dataset
+
+STAR = '*'
+ONE = '?'
+
+Field = namedtuple('Field', ['text', 'compiled', 'tokens'])
+Entry = namedtuple('Entry', ['index', 'pattern', 'group', 'type', 'label'])
+
+
+def tokenize(text):
+    """
+    Split a glob into literal characters, STAR and ONE, or return None if it
+    uses other regular expression characters.
+    """
+    tokens = []
+    for char in text:
+        if char == '*':
+            # consecutive stars are equivalent to a single one
+            if not tokens or tokens[-1] is not STAR:
+                tokens.append(STAR)
+        elif char in '?.':
+            tokens.append(ONE)
+        elif char in REGEX_SPECIAL:
+            return None
+        else:
+            tokens.append(char)
+    return tuple(tokens)
+
+
+def make_field(text):
+    return Field(text, compile_field(text), tokenize(text))
+
+
+def _closure(tokens, states):
+    """Add to a set of positions in a glob the ones reached by matching the stars with the empty string."""
+    states = set(states)
+    stack = list(states)
+    while stack:
+        i = stack.pop()
+        if i < len(tokens) and tokens[i] is STAR and i + 1 not in states:
+            states.add(i + 1)
+            stack.append(i + 1)
+    return frozenset(states)
+
+
+def _step(tokens, states, char):
+    """Return the positions in a glob reached from the given ones by matching a character."""
+    following = set()
+    for i in states:
+        if i < len(tokens):
+            token = tokens[i]
+            if token is STAR:
+                following.add(i)
+            elif token is ONE or token == char:
+                following.add(i + 1)
+    return _closure(tokens, following)
+
+
+def _product(a, b):
+    """
+    Yield the pairs of sets of positions in the globs a and b reached by the
+    same strings, as long as some string can still be matched by b. The only
+    characters that need to be tried are the literal ones in the two globs,
+    and None for any other character.
+    """
+    alphabet = {token for token in a + b if token is not STAR and token is not ONE}
+    alphabet.add(None)
+    start = (_closure(a, {0}), _closure(b, {0}))
+    seen = {start}
+    stack = [start]
+    while stack:
+        states_a, states_b = stack.pop()
+        yield states_a, states_b
+        for char in alphabet:
+            following = (_step(a, states_a, char), _step(b, states_b, char))
+            if following[1] and following not in seen:
+                seen.add(following)
+                stack.append(following)
+
+
+@lru_cache(maxsize=None)
+def glob_covers(a, b):
+    """Return True if every string matched by the glob b is matched by the glob a."""
+    return not any(len(b) in states_b and len(a) not in states_a for states_a, states_b in _product(a, b))
+
+
+@lru_cache(maxsize=None)
+def glob_intersects(a, b):
+    """Return True if some string is matched by both the glob a and the glob b."""
+    return any(len(b) in states_b and len(a) in states_a for states_a, states_b in _product(a, b))
+
+
+def field_covers(a, b):
+    """Return True if the field a matches all the strings matched by the field b."""
+    if a.compiled[0] == ANY:
+        return True
+    if b.compiled[0] == ANY:
+        return False
+    if b.compiled[0] == EXACT:
+        return field_matches(a.compiled, b.text)
+    if a.tokens is not None and b.tokens is not None:
+        return glob_covers(a.tokens, b.tokens)
+    return a.text == b.text
+
+
+def field_intersects(a, b):
+    """Return True if the fields a and b match a common string."""
+    if a.compiled[0] == ANY or b.compiled[0] == ANY:
+        return True
+    if a.compiled[0] == EXACT:
+        return field_matches(b.compiled, a.text)
+    if b.compiled[0] == EXACT:
+        return field_matches(a.compiled, b.text)
+    if a.tokens is not None and b.tokens is not None:
+        return glob_intersects(a.tokens, b.tokens)
+    return a.text == b.text
+
+
+class FieldIndex:
+    """
+    Index of one side (type or label) of the entries of a group file, to find
+    the entries whose field may match a common string with a given field.
+    """
+
+    def __init__(self, entries, side):
+        self.exact = {}
+        self.prefix = PrefixTable()
+        self.prefixes = {}
+        self.other = []
+        for entry in entries:
+            kind, value = getattr(entry, side).compiled
+            if kind == EXACT:
+                self.exact.setdefault(value, []).append(entry.index)
+            elif kind == PREFIX:
+                self.prefix.setdefault(value, []).append(entry.index)
+                self.prefixes.setdefault(value, []).append(entry.index)
+            else:
+                self.other.append(entry.index)
+        self.keys = sorted(self.exact)
+
+    def candidates(self, field):
+        """
+        Return the indices of the entries whose field may intersect the given
+        one, or None if that cannot be narrowed down.
+        """
+        kind, value = field.compiled
+        if kind == EXACT:
+            found = list(self.exact.get(value, ()))
+            for indices in self.prefix.lookup(value):
+                found.extend(indices)
+        elif kind == PREFIX:
+            found = []
+            start = bisect.bisect_left(self.keys, value)
+            end = bisect.bisect_left(self.keys, value + '\U0010ffff')
+            for key in self.keys[start:end]:
+                found.extend(self.exact[key])
+            for prefix, indices in self.prefixes.items():
+                if prefix.startswith(value) or value.startswith(prefix):
+                    found.extend(indices)
+        else:
+            return None
+        found.extend(self.other)
+        return found
+
+
+class GroupLint:
+    """Analysis of the entries of a group file."""
+
+    def __init__(self, pairs):
+        # keep all the keys, including the duplicates that json.load() would merge
+        self.duplicates = {}
+        first = {}
+        for pattern, group in pairs:
+            if pattern in first:
+                self.duplicates.setdefault(pattern, [first[pattern]]).append(group)
+            else:
+                first[pattern] = group
+        group_data = dict(pairs)
+        self.entries = []
+        for index, (pattern, group) in enumerate(group_data.items()):
+            ctype, label = parse_pattern(pattern)
+            self.entries.append(Entry(index, pattern, group, make_field(ctype), make_field(label)))
+        self.types = FieldIndex(self.entries, 'type')
+        self.labels = FieldIndex(self.entries, 'label')
+
+    def candidates(self, type_field, label_field):
+        """Return the indices of the entries that may match a common module with the given fields."""
+        by_type = self.types.candidates(type_field)
+        by_label = self.labels.candidates(label_field)
+        if by_type is None and by_label is None:
+            return range(len(self.entries))
+        if by_type is None or (by_label is not None and len(by_label) < len(by_type)):
+            return sorted(set(by_label))
+        return sorted(set(by_type))
+
+    def analyse(self):
+        """
+        Return the unreachable entries, as (entry, earlier entry that contains
+        it), and the conflicting overlaps, as (earlier entry, later entry).
+        """
+        unreachable = []
+        overlaps = []
+        for entry in self.entries:
+            covered = None
+            conflicts = []
+            for index in self.candidates(entry.type, entry.label):
+                if index >= entry.index:
+                    break
+                other = self.entries[index]
+                if not (field_intersects(other.type, entry.type) and field_intersects(other.label, entry.label)):
+                    continue
+                if field_covers(other.type, entry.type) and field_covers(other.label, entry.label):
+                    covered = other
+                    break
+                if other.group != entry.group and not (field_covers(entry.type, other.type) and field_covers(entry.label, other.label)):
+                    conflicts.append((other, entry))
+            if covered is not None:
+                unreachable.append((entry, covered))
+            else:
+                overlaps.extend(conflicts)
+        return unreachable, overlaps
+
+    def matching(self, mtype, mlabel):
+        """Return the indices of all the entries that match a module, in file order."""
+        found = []
+        for index in self.candidates(make_field(mtype), make_field(mlabel)):
+            entry = self.entries[index]
+            if field_matches(entry.type.compiled, mtype) and field_matches(entry.label.compiled, mlabel):
+                found.append(index)
+        return found
+
+
+def find_modules(paths):
+    """Return the set of (type, label) of the modules in the given resources files or directories."""
+    modules = set()
+    for path in paths:
+        if os.path.isdir(path):
+            files = [os.path.join(root, name) for root, dirs, names in os.walk(path) for name in names if is_dataset(name)]
+        else:
+            files = [path]
+        for name in files:
+            modules.update((module['type'], module['label']) for module in load_resources(name)['modules'])
+    return modules
+
+
+def describe(entry):
+    return f'{entry.index + 1:5d}  "{entry.pattern}": "{entry.group}"'
+
+
+def main():
+    basepath = os.path.normpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+    groupsmap = {name[:-len('.json')]: os.path.join(basepath, 'web', 'groups', name) for name in os.listdir(os.path.join(basepath, 'web', 'groups')) if name.endswith('.json')}
+
+    parser = argparse.ArgumentParser(description='Find the duplicate, unreachable and conflicting entries of a group file.')
+    parser.add_argument('groups', metavar='GROUPS', help=f"group file, or the name of one of {', '.join(sorted(groupsmap))}")
+    parser.add_argument('-m', '--modules', nargs='+', metavar='FILE', default=None, help='resources files, or directories with resources files, with the modules used to find the unused entries')
+    parser.add_argument('--overlaps', action='store_true', help='list all the conflicting overlaps, not only their number')
+    parser.add_argument('--json', metavar='FILE', help='write the results as JSON to FILE')
+    parser.add_argument('--prune', metavar='FILE', help='write the group file without the duplicate and unreachable entries to FILE')
+    args = parser.parse_args()
+
+    path = groupsmap.get(args.groups, args.groups)
+    with open(path) as f:
+        pairs = json.load(f, object_pairs_hook=list)
+    lint = GroupLint(pairs)
+    unreachable, overlaps = lint.analyse()
+
+    print(f"{path}: {len(pairs)} entries")
+    if lint.duplicates:
+        print(f"\n{len(lint.duplicates)} duplicate keys, only the last group is used:")
+        for pattern, groups in lint.duplicates.items():
+            print(f'         "{pattern}": ' + ', '.join(f'"{group}"' for group in groups))
+    redundant = [(entry, other) for entry, other in unreachable if entry.group == other.group]
+    shadowed = [(entry, other) for entry, other in unreachable if entry.group != other.group]
+    if redundant:
+        print(f"\n{len(redundant)} redundant entries, contained in an earlier entry with the same group:")
+        for entry, other in redundant:
+            print(f"{describe(entry)}\n    by {describe(other)}")
+    if shadowed:
+        print(f"\n{len(shadowed)} shadowed entries, contained in an earlier entry with a different group:")
+        for entry, other in shadowed:
+            print(f"{describe(entry)}\n    by {describe(other)}")
+    if overlaps:
+        print(f"\n{len(overlaps)} conflicting overlaps, where the earlier entry wins:")
+        if args.overlaps:
+            for other, entry in overlaps:
+                print(f"{describe(other)}\n   and {describe(entry)}")
+        else:
+            counts = Counter(entry for pair in overlaps for entry in pair)
+            print("the entries with the most overlaps are (use --overlaps to list them all):")
+            for entry, count in sorted(counts.items(), key=lambda item: (-item[1], item[0].index))[:10]:
+                print(f"{describe(entry)}  ({count})")
+
+    unused = None
+    if args.modules:
+        modules = find_modules(args.modules)
+        used = set()
+        for mtype, mlabel in modules:
+            found = lint.matching(mtype, mlabel)
+            if found:
+                used.add(found[0])
+        dead = {entry.index for entry, _ in unreachable}
+        unused = [entry for entry in lint.entries if entry.index not in used and entry.index not in dead]
+        print(f"\n{len(unused)} of the other entries are not used by any of the {len(modules)} modules:")
+        for entry in unused:
+            print(describe(entry))
+
+    if args.json:
+        result = {
+            'duplicates': lint.duplicates,
+            'redundant': [{'entry': entry.pattern, 'by': other.pattern} for entry, other in redundant],
+            'shadowed': [{'entry': entry.pattern, 'group': entry.group, 'by': other.pattern, 'by_group': other.group} for entry, other in shadowed],
+            'overlaps': [{'first': other.pattern, 'first_group': other.group, 'second': entry.pattern, 'second_group': entry.group} for other, entry in overlaps],
+        }
+        if unused is not None:
+            result['unused'] = [entry.pattern for entry in unused]
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+
+    if args.prune:
+        dead = {entry.index for entry, _ in unreachable}
+        pruned = {entry.pattern: entry.group for entry in lint.entries if entry.index not in dead}
+        with open(args.prune, 'w') as f:
+            json.dump(pruned, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+
+    if lint.duplicates or unreachable:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+#! /usr/bin/env python3
+"""
+Assign CMSSW modules to the groups defined in web/groups/*.json.
+
+A group file is an ordered dictionary of "type|label" glob patterns: the first
+pattern that matches a module's type and label determines its group. An empty
+type or label matches anything, and a pattern without a '|' only constrains the
+label.
+
+Instead of scanning every pattern for every module, GroupMatcher indexes the
+patterns by how they can be matched:
+  - literal types (and, for patterns without a type, literal labels) are looked
+    up in a dictionary;
+  - pure prefix globs like "HLT*" are looked up in a table keyed by prefix;
+  - everything else is scanned in order as a regular expression.
+Each pattern keeps its position in the group file, so the first-match-wins
+semantics of the linear scan are preserved.
+
+The assignments are also cached on disk (see AssignmentCache), keyed by a hash
+of the group definition, so that applying the same group file to the same
+modules again does not need any matching at all.
+
+When run as a script, benchmark the indexed matcher against the linear scan.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+# characters that make a pattern something other than a literal string once
+# the globs have been converted to a regular expression
+REGEX_SPECIAL = frozenset('.^$*+?{}[]\\|()')
+
+# kinds of compiled fields
+ANY, EXACT, PREFIX, REGEX = range(4)
+
+# bump when the matching semantics change, to invalidate the cached assignments
+CACHE_VERSION = 1
+
+
+def parse_pattern(pattern):
+    """
+    Split a group pattern into its type and label parts. The pattern is split
+    on the first '|'; a pattern without a '|' only describes the label.
+    """
+    pattern = str(pattern)
+    ctype, sep, label = pattern.partition('|')
+    if sep == '':
+        ctype = ''
+        label = pattern
+    return ctype.strip(), label.strip()
+
+
+def glob_to_regex(text):
+    """Convert a glob to the (anchored) regular expression used by the linear scan."""
+    return re.compile(text.replace('?', '.').replace('*', '.*') + '$')
+
+
+def compile_field(text):
+    """
+    Compile one side of a "type|label" pattern into a (kind, value) pair:
+      - (ANY, None) for an empty field, that matches anything;
+      - (EXACT, text) for a literal field;
+      - (PREFIX, prefix) for a field like "prefix*";
+      - (REGEX, regex) for anything else.
+    """
+    if not text:
+        return (ANY, None)
+    if not REGEX_SPECIAL.intersection(text):
+        return (EXACT, text)
+    if text.endswith('*') and not REGEX_SPECIAL.intersection(text[:-1]):
+        return (PREFIX, text[:-1])
+    return (REGEX, glob_to_regex(text))
+
+
+def field_matches(field, text):
+    kind, value = field
+    if kind == ANY:
+        return True
+    if kind == EXACT:
+        return text == value
+    if kind == PREFIX:
+        return text.startswith(value)
+    return value.match(text) is not None
+
+
+class PrefixTable:
+    """
+    Map prefixes to values, and look up all the prefixes of a string.
+    Only the distinct prefix lengths are probed, so a lookup costs a handful of
+    dictionary accesses.
+    """
+
+    def __init__(self):
+        self.table = {}
+        self.lengths = []
+
+    def setdefault(self, prefix, default):
+        if prefix not in self.table:
+            self.lengths = sorted(set(self.lengths) | {len(prefix)})
+        return self.table.setdefault(prefix, default)
+
+    def lookup(self, text):
+        size = len(text)
+        for length in self.lengths:
+            if length > size:
+                break
+            value = self.table.get(text[:length])
+            if value is not None:
+                yield value
+
+
+class GroupMatcher:
+    """
+    Indexed, first-match-wins matcher for the content of a group file.
+    """
+
+    def __init__(self, group_data):
+        self.groups = []
+        # literal or prefix type -> [(index, label field)], in file order
+        self._by_type = {}
+        self._by_type_prefix = PrefixTable()
+        # patterns without a type: literal or prefix label -> first index
+        self._by_label = {}
+        self._by_label_prefix = PrefixTable()
+        # everything else: [(index, type field, label field)], in file order
+        self._generic = []
+
+        for index, (pattern, group) in enumerate(group_data.items()):
+            self.groups.append(group)
+            ctype, label = parse_pattern(pattern)
+            ctype = compile_field(ctype)
+            label = compile_field(label)
+            if ctype[0] == EXACT:
+                self._by_type.setdefault(ctype[1], []).append((index, label))
+            elif ctype[0] == PREFIX:
+                self._by_type_prefix.setdefault(ctype[1], []).append((index, label))
+            elif ctype[0] == ANY and label[0] == EXACT:
+                self._by_label.setdefault(label[1], index)
+            elif ctype[0] == ANY and label[0] == PREFIX:
+                self._by_label_prefix.setdefault(label[1], index)
+            else:
+                self._generic.append((index, ctype, label))
+
+    def __len__(self):
+        return len(self.groups)
+
+    def match_index(self, mtype, mlabel):
+        """
+        Return the position in the group file of the first pattern matching the
+        given module type and label, or None if no pattern matches.
+        """
+        best = len(self.groups)
+
+        # patterns with a literal or prefix type
+        candidates = []
+        entries = self._by_type.get(mtype)
+        if entries is not None:
+            candidates.append(entries)
+        candidates.extend(self._by_type_prefix.lookup(mtype))
+        for entries in candidates:
+            for index, label in entries:
+                if index >= best:
+                    break
+                if field_matches(label, mlabel):
+                    best = index
+                    break
+
+        # patterns with only a literal or prefix label
+        index = self._by_label.get(mlabel)
+        if index is not None and index < best:
+            best = index
+        for index in self._by_label_prefix.lookup(mlabel):
+            if index < best:
+                best = index
+
+        # everything else, in order
+        for index, ctype, label in self._generic:
+            if index >= best:
+                break
+            if field_matches(ctype, mtype) and field_matches(label, mlabel):
+                best = index
+                break
+
+        return best if best < len(self.groups) else None
+
+    def match(self, mtype, mlabel):
+        """
+        Return the group of the first pattern matching the given module type
+        and label, or None if no pattern matches.
+        """
+        index = self.match_index(mtype, mlabel)
+        return None if index is None else self.groups[index]
+
+
+def groups_digest(group_data):
+    """
+    Return a hash of the content of a group definition. The hash depends on the
+    patterns, their order and their groups, but not on the formatting of the file.
+    """
+    content = json.dumps([CACHE_VERSION, [[str(pattern), group] for pattern, group in group_data.items()]])
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def default_cache_dir():
+    if os.environ.get('CIRCLES_CACHE_DIR'):
+        return os.environ['CIRCLES_CACHE_DIR']
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'circles')
+
+
+class AssignmentCache:
+    """
+    Persistent cache of the group assigned to each (type, label) pair, stored as
+    an SQLite database in the cache directory ($CIRCLES_CACHE_DIR, by default
+    ~/.cache/circles).
+
+    Entries are keyed by the hash of the group definition, so any change to a
+    group file automatically gives a new set of entries. When the cache grows
+    beyond max_entries, the entries of the least recently used group
+    definitions are evicted.
+
+    The cache is only an optimisation: if the database cannot be used, a
+    warning is printed and the matching falls back to the uncached path.
+    """
+
+    def __init__(self, path = None, max_entries = None):
+        if path is None:
+            path = os.path.join(default_cache_dir(), 'assignments.sqlite')
+        if max_entries is None:
+            max_entries = int(os.environ.get('CIRCLES_CACHE_SIZE', 1000000))
+        self.path = path
+        self.max_entries = max_entries
+        self.db = None
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+            self.db = sqlite3.connect(path, timeout = 60)
+            with self.db:
+                self.db.execute('CREATE TABLE IF NOT EXISTS digests (digest TEXT PRIMARY KEY, used REAL)')
+                self.db.execute('CREATE TABLE IF NOT EXISTS assignments (digest TEXT, type TEXT, label TEXT, grp TEXT, PRIMARY KEY (digest, type, label))')
+        except (OSError, sqlite3.Error) as e:
+            self.disable(e)
+
+    def disable(self, error):
+        print("Warning: the group assignment cache %s is disabled: %s" % (self.path, error), file = sys.stderr)
+        if self.db is not None:
+            self.db.close()
+        self.db = None
+
+    def load(self, digest):
+        """Return a dictionary {(type, label): group} with the entries cached for the given digest."""
+        if self.db is None:
+            return {}
+        try:
+            with self.db:
+                self.db.execute('INSERT OR REPLACE INTO digests VALUES (?, ?)', (digest, time.time()))
+                rows = self.db.execute('SELECT type, label, grp FROM assignments WHERE digest = ?', (digest, )).fetchall()
+        except sqlite3.Error as e:
+            self.disable(e)
+            return {}
+        return { (ctype, label): group for ctype, label, group in rows }
+
+    def store(self, digest, assignments):
+        """Add the {(type, label): group} entries to the cache, and evict the old ones if needed."""
+        if self.db is None or not assignments:
+            return
+        try:
+            with self.db:
+                self.db.execute('INSERT OR REPLACE INTO digests VALUES (?, ?)', (digest, time.time()))
+                self.db.executemany('INSERT OR REPLACE INTO assignments VALUES (?, ?, ?, ?)',
+                    ((digest, ctype, label, group) for (ctype, label), group in assignments.items()))
+                self.evict(keep = digest)
+        except sqlite3.Error as e:
+            self.disable(e)
+
+    def evict(self, keep):
+        size = self.db.execute('SELECT COUNT(*) FROM assignments').fetchone()[0]
+        if size <= self.max_entries:
+            return
+        for (digest, ) in self.db.execute('SELECT digest FROM digests WHERE digest != ? ORDER BY used', (keep, )).fetchall():
+            self.db.execute('DELETE FROM assignments WHERE digest = ?', (digest, ))
+            self.db.execute('DELETE FROM digests WHERE digest = ?', (digest, ))
+            size = self.db.execute('SELECT COUNT(*) FROM assignments').fetchone()[0]
+            if size <= self.max_entries:
+                return
+        # the current group definition alone is larger than the cache
+        self.db.execute('DELETE FROM assignments WHERE digest = ?', (keep, ))
+
+
+_cache = None
+
+def get_cache():
+    """Return the shared AssignmentCache, or None if the cache is disabled by $CIRCLES_NO_CACHE."""
+    global _cache
+    if os.environ.get('CIRCLES_NO_CACHE'):
+        return None
+    if _cache is None:
+        _cache = AssignmentCache()
+    return _cache
+
+
+class CachedGroupMatcher:
+    """
+    GroupMatcher backed by the on-disk AssignmentCache.
+
+    The GroupMatcher is only built if some modules are not found in the cache;
+    the new assignments are written back to the cache by save().
+    """
+
+    def __init__(self, group_data, cache = None):
+        self.group_data = group_data
+        self.cache = cache if cache is not None else get_cache()
+        self.digest = groups_digest(group_data)
+        self.known = self.cache.load(self.digest) if self.cache is not None else {}
+        self.new = {}
+        self._matcher = None
+
+    @property
+    def matcher(self):
+        if self._matcher is None:
+            self._matcher = GroupMatcher(self.group_data)
+        return self._matcher
+
+    def match(self, mtype, mlabel):
+        key = (mtype, mlabel)
+        try:
+            return self.known[key]
+        except KeyError:
+            group = self.matcher.match(mtype, mlabel)
+            self.known[key] = group
+            self.new[key] = group
+            return group
+
+    def save(self):
+        if self.cache is not None:
+            self.cache.store(self.digest, self.new)
+        self.new = {}
+
+
+def linear_match(groups, mtype, mlabel):
+    """Reference implementation: scan all the compiled patterns in order."""
+    for ctype, label, group in groups:
+        if (ctype is None or ctype.match(mtype)) and (label is None or label.match(mlabel)):
+            return group
+    return None
+
+
+def compile_linear(group_data):
+    groups = []
+    for pattern, group in group_data.items():
+        ctype, label = parse_pattern(pattern)
+        groups.append([glob_to_regex(ctype) if ctype else None, glob_to_regex(label) if label else None, group])
+    return groups
+
+
+def synthetic_menu(group_data):
+    """
+    Build a list of (type, label) pairs from the literal patterns of a group
+    file, to be used as a stand-in for a full menu.
+    """
+    modules = []
+    for pattern in group_data:
+        ctype, label = parse_pattern(pattern)
+        if REGEX_SPECIAL.intersection(ctype) or REGEX_SPECIAL.intersection(label):
+            continue
+        modules.append((ctype, label or ctype[:1].lower() + ctype[1:]))
+    return modules
+
+
+def main():
+    basepath = Path(os.path.dirname(os.path.realpath(__file__))).parent
+    groupsmap = { f.stem: str(f) for f in (basepath / 'web' / 'groups').glob('**/*.json') }
+
+    parser = argparse.ArgumentParser(description = "Benchmark the indexed group matcher against a linear scan of the patterns.")
+    parser.add_argument("file", nargs = '*', metavar = 'FILE', help = "JSON file(s) with the resource usage produced by the FastTimerService; if none are given, use the modules listed in the 'hlt' group file")
+    parser.add_argument("-g", "--groups", choices = groupsmap, metavar = 'GROUP', default = 'packages', help = "Module groupings to match against")
+    parser.add_argument("-n", "--repeat", type = int, default = 1, help = "Number of times each menu is matched")
+    args = parser.parse_args()
+
+    with open(groupsmap[args.groups]) as f:
+        group_data = json.load(f)
+
+    if args.file:
+        from resources_io import load_resources
+        modules = []
+        for name in args.file:
+            modules.extend((m['type'], m['label']) for m in load_resources(name)['modules'])
+    else:
+        with open(groupsmap['hlt']) as f:
+            modules = synthetic_menu(json.load(f))
+
+    start = time.perf_counter()
+    groups = compile_linear(group_data)
+    linear = [linear_match(groups, t, l) for _ in range(args.repeat) for t, l in modules]
+    linear_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matcher = GroupMatcher(group_data)
+    indexed = [matcher.match(t, l) for _ in range(args.repeat) for t, l in modules]
+    indexed_time = time.perf_counter() - start
+
+    print("%d patterns, %d modules x %d" % (len(group_data), len(modules), args.repeat))
+    print("linear scan:     %8.3f s" % linear_time)
+    print("indexed matcher: %8.3f s  (%.1fx faster)" % (indexed_time, linear_time / indexed_time if indexed_time > 0 else float('inf')))
+    if linear != indexed:
+        mismatches = sum(1 for a, b in zip(linear, indexed) if a != b)
+        print("Error: %d modules are assigned to different groups" % mismatches)
+        sys.exit(1)
+    print("all assignments are identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#! /usr/bin/env python3
+"""
+Maintain an index of the datasets available to the web interface.
+
+The index is a JSON file next to the data directory (web/dataset_index.json for
+web/data, web/<name>_dataset_index.json for web/<name>), that lists for each
+dataset its name, modification time, size, process label, number of events and
+available metrics. The web pages and the cgi-bin scripts serve the list of
+datasets from the index when it exists, instead of walking the data directory
+on every request.
+
+The index is updated incrementally: the content of a directory whose
+modification time has not changed is taken from the previous index, and only
+the new or modified files in the other directories are read.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from merge import list_metrics
+from resources_io import load_resources, is_dataset, dataset_name
+
+INDEX_VERSION = 2
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_DATA = os.path.join(SCRIPT_DIR, os.pardir, 'web', 'data')
+
+
+def index_path(data_dir):
+    """Return the name of the index of a data directory, following the naming of the dataset.js cache."""
+    data_dir = os.path.normpath(data_dir)
+    name = os.path.basename(data_dir)
+    prefix = '' if name == 'data' else name + '_'
+    return os.path.join(os.path.dirname(data_dir), prefix + 'dataset_index.json')
+
+
+def describe(path):
+    """Return the process label, number of events and metrics of a dataset; the values are None if it cannot be read."""
+    try:
+        data = load_resources(path)
+        total = data.get("total", {})
+        return {
+            "label": total.get("label"),
+            "events": total.get("events"),
+            "metrics": list_metrics(data.get("resources", [])),
+        }
+    except (OSError, EOFError, ValueError, AttributeError, TypeError, RuntimeError):
+        return {"label": None, "events": None, "metrics": None}
+
+
+def load_index(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            index = json.load(f)
+    except ValueError:
+        return None
+    if index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+
+def update_index(data_dir, index=None, check_files=False):
+    """
+    Build the index of a data directory, reusing the content of a previous index.
+
+    The datasets are listed in the same order as the PHP pages list them when
+    there is no index: the files of each directory sorted by name, followed by
+    the content of its subdirectories. Return the new index and the number of files read.
+    """
+    old_dirs = index["directories"] if index else {}
+    old_datasets = {entry["name"]: entry for entry in index["datasets"]} if index else {}
+    directories = {}
+    datasets = []
+    read = 0
+
+    def visit(rel):
+        nonlocal read
+        path = os.path.join(data_dir, rel)
+        mtime = os.stat(path).st_mtime
+        cached = old_dirs.get(rel)
+        unchanged = cached is not None and cached["mtime"] == mtime
+        if unchanged:
+            files, subdirs = cached["files"], cached["dirs"]
+        else:
+            files, subdirs = [], []
+            for entry in sorted(os.listdir(path)):
+                if entry.startswith('.'):
+                    continue
+                full = os.path.join(path, entry)
+                if os.path.isdir(full):
+                    subdirs.append(entry)
+                elif is_dataset(entry) and os.path.isfile(full):
+                    files.append(entry)
+        directories[rel] = {"mtime": mtime, "files": files, "dirs": subdirs}
+
+        for entry in files:
+            name = os.path.join(rel, dataset_name(entry)) if rel else dataset_name(entry)
+            old = old_datasets.get(name)
+            if unchanged and old is not None and not check_files:
+                datasets.append(old)
+                continue
+            full = os.path.join(path, entry)
+            stat = os.stat(full)
+            if old is not None and old["mtime"] == stat.st_mtime and old["size"] == stat.st_size:
+                datasets.append(old)
+                continue
+            read += 1
+            info = {"name": name, "mtime": stat.st_mtime, "size": stat.st_size}
+            info.update(describe(full))
+            datasets.append(info)
+
+        for entry in subdirs:
+            if os.path.isdir(os.path.join(path, entry)):
+                visit(os.path.join(rel, entry) if rel else entry)
+
+    visit('')
+    return {"version": INDEX_VERSION, "directories": directories, "datasets": datasets}, read
+
+
+def write_index(index, path):
+    # write to a temporary file and rename it, so the web pages never read a partial index
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(index, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create or update the index of the datasets available to the web interface.')
+    parser.add_argument('data', nargs='?', default=DEFAULT_DATA, help='data directory to index (default: web/data)')
+    parser.add_argument('-o', '--output', default=None, help='index file (default: dataset_index.json or <name>_dataset_index.json next to the data directory)')
+    parser.add_argument('--full', action='store_true', help='ignore the previous index, and read all the files again')
+    parser.add_argument('--check-files', action='store_true', help='check the modification time of every file, also in the directories that did not change')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not print a summary')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.data):
+        print(f"Error: {args.data} is not a directory", file=sys.stderr)
+        sys.exit(1)
+    output = args.output or index_path(args.data)
+    index = None if args.full else load_index(output)
+    index, read = update_index(args.data, index, args.check_files)
+    write_index(index, output)
+    if not args.quiet:
+        print(f"{output}: {len(index['datasets'])} datasets, {read} read")
+
+
+if __name__ == "__main__":
+    main()
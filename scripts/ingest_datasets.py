@@ -0,0 +1,127 @@
+#! /usr/bin/env python3
+"""
+Precompute the grouped trees shown by the web pages for new datasets.
+
+For each dataset, and for each group file in web/groups/ and each metric listed
+in the "resources" section of the dataset, build the same tree returned by
+cgi-bin/grouped.py, and write it as a gzipped sidecar file:
+
+    web/trees/<data_name>/<dataset>/<groups>.<metric>.json.gz
+
+The web pages load the sidecar files directly, and fall back to cgi-bin/grouped.py
+or to the grouping in the browser when they are missing or out of date: each
+sidecar records the modification time of its group file, and the modification
+time and size of its dataset.
+Only the sidecar files older than their dataset or group file are rebuilt.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from merge import list_metrics
+from resources_io import load_resources, is_dataset, dataset_name, dataset_file
+
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+WEB_DIR = os.path.normpath(os.path.join(SCRIPT_DIR, os.pardir, 'web'))
+sys.path.insert(0, os.path.join(WEB_DIR, 'cgi-bin'))
+from grouped import Groups, build_tree
+
+
+def sidecar_path(web_dir, data_name, dataset, groups, metric):
+    return os.path.join(web_dir, 'trees', data_name, dataset, f"{groups}.{metric}.json.gz")
+
+
+def write_sidecar(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    # a fixed mtime in the gzip header makes the output reproducible
+    with open(tmp, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+        f.write(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+    os.replace(tmp, path)
+
+
+def ingest(task):
+    """Build the stale sidecar files of one dataset; return the number of files written."""
+    web_dir, data_name, dataset, group_files, force = task
+    path = os.path.join(web_dir, data_name, dataset_file(dataset))
+    dataset_mtime = os.path.getmtime(path)
+    dataset_size = os.path.getsize(path)
+
+    data = None
+    written = 0
+    compiled = {}
+    for groups, groups_file in group_files:
+        groups_mtime = os.path.getmtime(groups_file)
+        if data is None:
+            data = load_resources(path)
+            metrics = list_metrics(data.get("resources", []))
+        for metric in metrics:
+            sidecar = sidecar_path(web_dir, data_name, dataset, groups, metric)
+            if not force and os.path.exists(sidecar) and os.path.getmtime(sidecar) >= max(dataset_mtime, groups_mtime):
+                continue
+            if groups not in compiled:
+                with open(groups_file) as f:
+                    compiled[groups] = Groups(json.load(f))
+            payload = build_tree(data, compiled[groups], metric, True)
+            # let the web pages detect a sidecar older than the group file they use, or built from another dataset file
+            payload["groups_version"] = int(groups_mtime)
+            payload["dataset_version"] = int(dataset_mtime)
+            payload["dataset_size"] = dataset_size
+            write_sidecar(sidecar, payload)
+            written += 1
+    return dataset, written
+
+
+def find_datasets(data_dir):
+    for root, dirs, files in os.walk(data_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if is_dataset(name):
+                yield dataset_name(os.path.relpath(os.path.join(root, name), data_dir))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute the grouped trees of the datasets for all the group files and metrics.')
+    parser.add_argument('datasets', nargs='*', metavar='DATASET', help='datasets to ingest, as paths to their JSON files or names relative to the data directory (default: all the datasets)')
+    parser.add_argument('-d', '--data-name', default='data', help='data directory under web/ (default: data)')
+    parser.add_argument('-g', '--groups', action='append', default=None, metavar='GROUPS', help='group file to use, without the .json extension (default: all the files in web/groups/)')
+    parser.add_argument('--web', default=WEB_DIR, help='web directory (default: the one in this repository)')
+    parser.add_argument('-f', '--force', action='store_true', help='rebuild the sidecar files even if they are up to date')
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N', help='ingest N datasets in parallel')
+    args = parser.parse_args()
+
+    data_dir = os.path.join(args.web, args.data_name)
+    groups_dir = os.path.join(args.web, 'groups')
+    names = args.groups or sorted(f[:-len('.json')] for f in os.listdir(groups_dir) if f.endswith('.json'))
+    group_files = [(name, os.path.join(groups_dir, name + '.json')) for name in names]
+
+    if args.datasets:
+        datasets = []
+        for dataset in args.datasets:
+            if os.path.isfile(dataset):
+                dataset = os.path.relpath(os.path.realpath(dataset), os.path.realpath(data_dir))
+                if dataset.startswith(os.pardir):
+                    parser.error(f"{dataset} is not in {data_dir}")
+                dataset = dataset_name(dataset)
+            datasets.append(dataset)
+    else:
+        datasets = list(find_datasets(data_dir))
+
+    tasks = [(args.web, args.data_name, dataset, group_files, args.force) for dataset in datasets]
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(ingest, tasks))
+    else:
+        results = [ingest(task) for task in tasks]
+    for dataset, written in results:
+        if written:
+            print(f"{dataset}: {written} trees written")
+    print(f"{len(datasets)} datasets, {sum(written for _, written in results)} trees written")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Batch version of compare_json_hist.py: compare two timing JSONs at the package
+level, and then for each package at the label level.
+
+Both inputs are loaded and augmented only once, all the figures are prepared
+from the in-memory data, and they are rendered in parallel by a pool of worker
+processes. The output files have the same names as the ones written by earlier
+versions of make_comparisons.sh, which now simply calls this script.
+"""
+
+import argparse
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List
+
+import compare_json_hist as cjh
+
+SCRIPT_DIR = Path(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_COLORS = SCRIPT_DIR.parent / "web" / "colours" / "default.json"
+
+
+def slugify(name: str) -> str:
+    """Lower case, replace non-alphanumeric characters with underscores, collapse repeats, trim edges."""
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+
+def packages_from_mapping(group_data) -> List[str]:
+    """Return the top-level packages used by a grouping JSON."""
+    return sorted({str(group).split("|")[0] for group in group_data.values()} - {""})
+
+
+def packages_from_file(path: Path) -> List[str]:
+    """Read one package name per line, skipping empty lines."""
+    with path.open("r") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def render(panels):
+    cjh.bar_panels(**panels)
+
+
+def main():
+    p = argparse.ArgumentParser(
+        description="Compare two timing JSONs by package, and for each package by label, saving one image per comparison."
+    )
+    p.add_argument("json_a", type=Path, help="First timing JSON")
+    p.add_argument("json_b", type=Path, help="Second timing JSON")
+    p.add_argument("map", type=Path, help="Grouping JSON (for augment_json)")
+    p.add_argument("out_dir", type=Path, help="Where to save the images")
+    p.add_argument(
+        "packages",
+        type=Path,
+        nargs="?",
+        default=None,
+        help="Optional file with one package name per line (default: all the packages in the grouping JSON)",
+    )
+
+    # The defaults can be overridden by the same environment variables used by make_comparisons.sh
+    p.add_argument("-m", "--metric", default=os.environ.get("METRIC", "time_real"), help="Metric to use (default: time_real)")
+    p.add_argument(
+        "--per-event",
+        type=int,
+        choices=[0, 1],
+        default=int(os.environ.get("PER_EVENT", "1")),
+        help="1 to divide the metric by the file's total events, 0 for the raw values (default: 1)",
+    )
+    p.add_argument("--top-packages", type=int, default=int(os.environ.get("TOP_PACKAGES", "15")), help="Top N packages for the overall package plot")
+    p.add_argument("--top-labels", type=int, default=int(os.environ.get("TOP_LABELS", "15")), help="Top N labels per package")
+    p.add_argument("--rotate", type=int, default=int(os.environ.get("ROTATE", "60")), help="Rotation of the x tick labels of the package plot")
+    p.add_argument("--label-fontsize", type=int, default=int(os.environ.get("LABEL_FONTSIZE", "6")), help="Font size for the x tick labels of the package plot")
+    p.add_argument("--colors", type=Path, default=DEFAULT_COLORS, help="Colors JSON mapping Package -> HEX")
+    p.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of worker processes used to render the figures (default: all cores)")
+
+    args = p.parse_args()
+
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    base_a = args.json_a.stem
+    base_b = args.json_b.stem
+    mode = "per-event" if args.per_event else "raw"
+
+    # Load and augment both inputs only once
+    group_data = cjh.load_grouping(args.map)
+    color_map = cjh.load_colors(args.colors)
+    data_a = cjh.load_table(args.json_a, group_data, [args.metric])
+    data_b = cjh.load_table(args.json_b, group_data, [args.metric])
+    # ... and compute the keys and metrics of their modules only once for all the figures
+
+    common = dict(
+        title=None,
+        name_a=args.json_a.name,
+        name_b=args.json_b.name,
+        style="outline",
+        package_top="stacked",
+        outline_width=0.8,
+        stack_key="diff",
+        show=False,
+    )
+    jobs = []
+
+    # 1) Overall comparison at PACKAGE level
+    overall_png = args.out_dir / f"compare_packages_{base_a}_vs_{base_b}.png"
+    print(f"[1/2] Making overall package-level comparison -> {overall_png}")
+    panels = cjh.prepare_comparison(
+        data_a, data_b, color_map, metric=args.metric, per_event=bool(args.per_event),
+        level="package", sort_by="diff", top=args.top_packages,
+    )
+    jobs.append(dict(
+        common,
+        **panels,
+        level="package",
+        title=f"Timing by package ({mode}): {base_a} vs {base_b}",
+        rotate=args.rotate,
+        truncate=48,
+        fontsize=args.label_fontsize,
+        save=overall_png,
+    ))
+
+    # 2) Per-package comparisons at LABEL level
+    if args.packages:
+        packages = packages_from_file(args.packages)
+    else:
+        with args.map.open("r") as f:
+            packages = packages_from_mapping(json.load(f))
+
+    print(f"[2/2] Making per-label comparisons for {len(packages)} packages…")
+    for pkg in packages:
+        out_png = args.out_dir / f"{slugify(pkg)}_{base_a}_vs_{base_b}.png"
+        print(f"  - {pkg} -> {out_png}")
+        panels = cjh.prepare_comparison(
+            data_a, data_b, color_map, metric=args.metric, per_event=bool(args.per_event),
+            level="label", package=pkg, sort_by="diff", top=args.top_labels,
+        )
+        jobs.append(dict(
+            common,
+            **panels,
+            level="label",
+            title=f"Timing by label ({pkg}; {mode}): {base_a} vs {base_b}",
+            rotate=20,
+            truncate=25,
+            fontsize=6,
+            save=out_png,
+        ))
+
+    if args.jobs and args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            for _ in pool.map(render, jobs):
+                pass
+    else:
+        for job in jobs:
+            render(job)
+
+    print(f"Done. Images saved under: {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#! /usr/bin/env python3
+"""
+Generate a group file that assigns each framework module to its package.
+
+All the framework modules declared in the plugins, src and interface
+subdirectories of the packages of a CMSSW release are assigned to their
+"Subsystem|Package", like make_packages_json.sh does, and the resulting group
+file is printed in the format of web/groups/packages.json.
+
+The modules declared in each source file are kept in a cache, together with the
+size, modification time and SHA-1 hash of the file: only the files that have
+changed since the cache was written are scanned again, in parallel. The cache
+is keyed by the path of the files relative to the release, so the files of a
+new release that are identical to those of the previous one are recognised by
+their hash, and not scanned again.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+MACROS = ('DEFINE_FWK_MODULE', 'DEFINE_FWK_INPUT_SOURCE', 'DEFINE_FWK_VECTOR_INPUT_SOURCE', 'DEFINE_FWK_EVENTSETUP_MODULE', 'DEFINE_FWK_EVENTSETUP_SOURCE')
+ALPAKA_MACROS = ('DEFINE_FWK_ALPAKA_MODULE', 'DEFINE_FWK_EVENTSETUP_ALPAKA_MODULE')
+
+# subdirectories of each package that are searched for modules, and files that define the macros
+SUBDIRS = ('plugins', 'src', 'interface')
+EXCLUDE = ('MakerMacros.h', 'ModuleFactory.h')
+PACKAGE = re.compile(r'\w+$', re.ASCII)
+
+# modules that are not declared by any macro
+FRAMEWORK_MODULES = {
+    'PathStatusInserter|': 'FWCore|Framework',
+    'EndPathStatusInserter|': 'FWCore|Framework',
+    'TriggerResultInserter|': 'FWCore|Framework',
+}
+
+# entries always written at the end of the group file
+SPECIAL_ENTRIES = {
+    'idle|idle': 'idle',
+    'other|other': 'other|other',
+}
+SPECIAL = re.compile(r'\b(idle|other)\b')
+
+CACHE_VERSION = 1
+
+
+def macro_regex(macros):
+    # a macro at the beginning of a line, and the type of the module without its namespace
+    return re.compile(rb'^ *(?:' + b'|'.join(macro.encode() for macro in macros) + rb')\b *\( *(?:.*::)?([a-zA-Z0-9_<>:]+) *\)', re.MULTILINE)
+
+
+MODULE = macro_regex(MACROS)
+ALPAKA_MODULE = macro_regex(ALPAKA_MACROS)
+
+
+def walk(src, path, sources):
+    # append to sources the files under src/path, and their status, sorted by name;
+    # like grep -r, the symbolic links found in the subdirectories are not followed
+    with os.scandir(os.path.join(src, path)) as entries:
+        entries = sorted(entries, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            walk(src, path + os.sep + entry.name, sources)
+        elif entry.is_file(follow_symlinks=False) and entry.name not in EXCLUDE:
+            sources.append((path + os.sep + entry.name, entry.stat()))
+
+
+def find_sources(src):
+    """
+    Return the paths, relative to src, and the status of the files to be
+    scanned, in the order the modules are assigned: the plugins of all
+    packages first, then their src and interface directories.
+    """
+    packages = []
+    for subsystem in sorted(os.listdir(src)):
+        if PACKAGE.match(subsystem) and os.path.isdir(os.path.join(src, subsystem)):
+            packages.extend(subsystem + os.sep + package for package in sorted(os.listdir(os.path.join(src, subsystem))) if PACKAGE.match(package))
+    sources = []
+    for subdir in SUBDIRS:
+        for package in packages:
+            if os.path.isdir(os.path.join(src, package, subdir)):
+                walk(src, package + os.sep + subdir, sources)
+    return sources
+
+
+def is_alpaka(path):
+    # Subsystem/Package/(plugins|src|interface)/alpaka/...
+    parts = path.split(os.sep)
+    return len(parts) > 4 and parts[3] == 'alpaka'
+
+
+def find_modules(content, alpaka):
+    """Return the types of the modules declared in the content of a source file."""
+    modules = [match.decode('utf-8', 'replace') for match in MODULE.findall(content)]
+    if alpaka:
+        modules.extend(match.decode('utf-8', 'replace') + '@alpaka' for match in ALPAKA_MODULE.findall(content))
+    return modules
+
+
+def scan_file(task):
+    """
+    Scan a source file, unless its hash matches the cached one; return the hash
+    of the file and its modules, or None if the cached modules are still valid.
+    """
+    src, path, digest = task
+    with open(os.path.join(src, path), 'rb') as f:
+        content = f.read()
+    sha1 = hashlib.sha1(content).hexdigest()
+    if sha1 == digest:
+        return sha1, None
+    return sha1, find_modules(content, is_alpaka(path))
+
+
+def load_cache(name):
+    if not name or not os.path.exists(name):
+        return {}
+    with open(name) as f:
+        cache = json.load(f)
+    if cache.get('version') != CACHE_VERSION:
+        return {}
+    return cache['files']
+
+
+def save_cache(files, name):
+    # write to a temporary file and rename it, so an interrupted update leaves the previous cache intact
+    tmp = name + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(json.dumps({'version': CACHE_VERSION, 'files': files}, separators=(',', ':')))
+    os.replace(tmp, name)
+
+
+def scan_release(src, cache, jobs):
+    """
+    Return the modules declared in each source file of a release, as a
+    dictionary path -> cache entry, and the number of files that were read.
+    """
+    files = {}
+    tasks = []
+    for path, stat in find_sources(src):
+        entry = cache.get(path)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            files[path] = entry
+        else:
+            files[path] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha1': None, 'modules': []}
+            tasks.append((src, path, entry['sha1'] if entry and entry['size'] == stat.st_size else None))
+
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(scan_file, tasks, chunksize=64))
+    else:
+        results = [scan_file(task) for task in tasks]
+    for (_, path, _), (sha1, modules) in zip(tasks, results):
+        files[path]['sha1'] = sha1
+        files[path]['modules'] = cache[path]['modules'] if modules is None else modules
+    return files, len(tasks)
+
+
+def make_groups(files, update=None):
+    """
+    Assign each module to the package of the first file that declares it, and
+    keep the entries of an existing group file for the modules that are not
+    found in the release.
+    """
+    groups = {}
+    # the modules of the alpaka subdirectories are assigned after all the others
+    for alpaka in (False, True):
+        for path, entry in files.items():
+            package = '|'.join(path.split(os.sep)[:2])
+            for module in entry['modules']:
+                if module.endswith('@alpaka') == alpaka:
+                    groups.setdefault(module + '|', package)
+    for key, value in FRAMEWORK_MODULES.items():
+        groups.setdefault(key, value)
+    if update:
+        for key, value in update.items():
+            if not SPECIAL.search(key) and not SPECIAL.search(value):
+                groups.setdefault(key, value)
+    result = {key: groups[key] for key in sorted(groups)}
+    result.update(SPECIAL_ENTRIES)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find all framework modules declared in the plugins, src, and interface subdirectories of all packages of a CMSSW release, and print a JSON file suitable for the groups of a circles piechart.')
+    parser.add_argument('-r', '--release', default=os.environ.get('CMSSW_RELEASE_BASE'), metavar='DIR', help='base directory of the CMSSW release (default: $CMSSW_RELEASE_BASE)')
+    parser.add_argument('-u', '--update', metavar='FILE', help='start from the content of an existing JSON group file, e.g. web/groups/packages.json; the modules found in the release take precedence')
+    parser.add_argument('-c', '--cache', metavar='FILE', help='read the modules of the unchanged source files from FILE, and update it')
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N', help='scan N files in parallel')
+    parser.add_argument('-o', '--output', default='-', metavar='FILE', help='write the group file to FILE instead of the standard output')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not print the number of files scanned to the standard error')
+    args = parser.parse_args()
+
+    if not args.release:
+        parser.error('the CMSSW release must be given with --release, or by $CMSSW_RELEASE_BASE')
+    src = os.path.join(args.release, 'src')
+    if not os.path.isdir(src):
+        sys.exit(f'Error: {src} is not a directory')
+
+    update = None
+    if args.update and os.path.exists(args.update):
+        with open(args.update) as f:
+            update = json.load(f)
+
+    cache = load_cache(args.cache)
+    files, scanned = scan_release(src, cache, args.jobs)
+    if args.cache and (scanned or files.keys() != cache.keys()):
+        save_cache(files, args.cache)
+    groups = make_groups(files, update)
+    if not args.quiet:
+        sys.stderr.write(f'{len(groups) - len(SPECIAL_ENTRIES)} modules from {len(files)} files, {scanned} of them read\n')
+
+    if args.output == '-':
+        json.dump(groups, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(groups, f, indent=2)
+            f.write('\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,19 @@
 #! /usr/bin/env python3
 
 import sys
+import argparse
+import glob
+import hashlib
+import io
 import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from itertools import repeat
+from operator import add, itemgetter, mul
+
+from resources_io import load_resources, open_resources, dump_resources
 
 def merge_into(metrics, data, dest):
   dest["events"] += data["events"]
@@ -32,47 +44,462 @@ def convert_old_resources(resources, filename):
           new_resources.append(resource)
   return new_resources
 
-if (len(sys.argv) == 1):
-  print("""Usage: merge.py FILE [FILE ...]
-Merge the content of multiple "resources.json" files and print the result to standard output.""")
-  sys.exit(1)
 
-with open(sys.argv[1]) as f:
-  output = json.load(f)
+def list_metrics(resources):
+  metrics = []
+  for resource in resources:
+    if "name" in resource:
+      metrics.append(resource["name"])
+    else:
+      for key in resource:
+        metrics.append(key)
+  return metrics
 
-output["resources"] = convert_old_resources(output["resources"], sys.argv[1])
 
-metrics = []
-for resource in output["resources"]:
-  if "name" in resource:
-    metrics.append(resource["name"])
-  else:
-    for key in resource:
-      metrics.append(key)
+def merge_files(files):
+  with open_resources(files[0]) as f:
+    output = json.load(f)
 
-datamap = { module["type"] + '|' + module["label"] : module for module in output["modules"] }
+  output["resources"] = convert_old_resources(output["resources"], files[0])
+  metrics = list_metrics(output["resources"])
 
-for arg in sys.argv[2:]:
-  with open(arg) as f:
-    input = json.load(f)
+  datamap = { module["type"] + '|' + module["label"] : module for module in output["modules"] }
 
-  input["resources"] = convert_old_resources(input["resources"], arg)
+  for arg in files[1:]:
+    with open_resources(arg) as f:
+      input = json.load(f)
 
-  if output["resources"] != input["resources"]:
-      print("Error: input files describe different metrics")
-      sys.exit(1)
+    input["resources"] = convert_old_resources(input["resources"], arg)
+
+    if output["resources"] != input["resources"]:
+        print("Error: input files describe different metrics")
+        sys.exit(1)
+
+    if output["total"]["label"] != input["total"]["label"]:
+      print("Warning: input files describe different process names")
+    merge_into(metrics, input["total"], output["total"])
+
+    for module in input["modules"]:
+      key = module["type"] + '|' + module["label"]
+      if key in datamap:
+        merge_into(metrics, module, datamap[key])
+      else:
+        datamap[key] = module
+        output["modules"].append(datamap[key])
+
+  return output
 
-  if output["total"]["label"] != input["total"]["label"]:
-    print("Warning: input files describe different process names")
-  merge_into(metrics, input["total"], output["total"])
 
-  for module in input["modules"]:
+# exponent of each power of two, for the denominators of the floating point values
+EXPONENTS = { 1 << k: k for k in range(1100) }
+# largest integer that can be converted to a floating point value exactly
+SAFE_INTEGER = 1 << 53
+
+
+def scale_of(shift):
+  # the values of a column with a very fine denominator are always added one by one
+  return 2. ** shift if shift <= 960 else math.nan
+
+
+class Accumulator:
+  """Columnar accumulator: one row per module, one column per metric.
+
+  Row 0 holds the job total, the other rows the modules, in order of first
+  appearance; as in merge_files(), all the modules of the first file are kept,
+  and the modules of the other files are added to the last module of the same
+  type and label. Each cell holds the exact sum of its values, as an integer
+  numerator over a power of two denominator shared by the whole column, so
+  partial accumulators can be combined in any order and still give the same,
+  correctly rounded, result. Infinite and NaN values are summed separately.
+  Columns that only ever received integers are written back as integers.
+  """
+
+  def __init__(self, metrics):
+    self.columns = ["events"] + list(metrics)
+    self.header = None
+    self.index = {}
+    self.modules = [ None ]
+    self.numerators = [ [ 0 ] for column in self.columns ]
+    self.shifts = [ 0 for column in self.columns ]
+    self.integral = [ True for column in self.columns ]
+    # (column, row) -> sum of the infinite and NaN values of the cell
+    self.special = {}
+
+  def row(self, module, duplicate = False):
     key = module["type"] + '|' + module["label"]
-    if key in datamap:
-      merge_into(metrics, module, datamap[key])
+    row = self.index.get(key)
+    if row is None or duplicate:
+      row = self.index[key] = len(self.modules)
+      self.modules.append(module)
+      for numerators in self.numerators:
+        numerators.append(0)
+    return row
+
+  def rescale(self, i, shift):
+    # use a finer denominator for a column
+    numerators = self.numerators[i]
+    numerators[:] = [ n << (shift - self.shifts[i]) for n in numerators ]
+    self.shifts[i] = shift
+
+  def add(self, i, row, value):
+    """Add a single value to a cell, and return the shift of its column."""
+    try:
+      n, d = value.as_integer_ratio()
+    except (ValueError, OverflowError):
+      # NaN or infinity
+      self.special[i, row] = self.special.get((i, row), 0.) + value
+      return self.shifts[i]
+    k = EXPONENTS[d]
+    if k > self.shifts[i]:
+      self.rescale(i, k)
+    self.numerators[i][row] += n << (self.shifts[i] - k)
+    return self.shifts[i]
+
+  def fold(self, rows, data):
+    """Add the values of a list of modules, or of the total, to the given rows."""
+    # the modules of most files come in the same order as in the first one
+    first = rows[0] if rows else 0
+    last = first + len(rows)
+    contiguous = rows == list(range(first, last))
+    for i, column in enumerate(self.columns):
+      numerators = self.numerators[i]
+      shift = self.shifts[i]
+      try:
+        values = list(map(itemgetter(column), data))
+      except KeyError:
+        values = [ entry.get(column, 0) for entry in data ]
+      types = set(map(type, values))
+      if float not in types:
+        if shift:
+          values = [ value << shift for value in values ]
+      elif int in types and any(value.__class__ is int and not -SAFE_INTEGER <= value <= SAFE_INTEGER for value in values):
+        # large integers are not exact as floating point values
+        self.integral[i] = False
+        for row, value in zip(rows, values):
+          self.add(i, row, value)
+        continue
+      else:
+        # multiplying by a power of two is exact: the result is an integer unless the
+        # value needs a finer denominator, or is too large, infinite or NaN
+        self.integral[i] = False
+        scaled = list(map(mul, values, repeat(scale_of(shift), len(values))))
+        if not all(map(float.is_integer, scaled)):
+          for row, value in zip(rows, values):
+            self.add(i, row, value)
+          continue
+        values = list(map(int, scaled))
+      if contiguous:
+        numerators[first:last] = map(add, numerators[first:last], values)
+      else:
+        for row, value in zip(rows, values):
+          numerators[row] += value
+
+  def add_modules(self, modules, first = False):
+    if first:
+      rows = [ self.row(module, True) for module in modules ]
     else:
-      datamap[key] = module
-      output["modules"].append(datamap[key])
+      index = self.index
+      rows = [ index.get(module["type"] + '|' + module["label"]) for module in modules ]
+      if None in rows:
+        rows = [ self.row(module) if row is None else row for row, module in zip(rows, modules) ]
+    self.fold(rows, modules)
+
+  def add_total(self, total):
+    if self.modules[0] is None:
+      self.modules[0] = total
+    self.fold([ 0 ], [ total ])
+
+  def merge(self, other):
+    """Fold the content of another accumulator, that follows this one in the input order."""
+    if self.header is None:
+      self.header = other.header
+    rows = []
+    for other_row, module in enumerate(other.modules):
+      if other_row == 0:
+        if module is not None and self.modules[0] is None:
+          self.modules[0] = module
+        rows.append(0)
+      else:
+        rows.append(self.row(module))
+    for i in range(len(self.columns)):
+      if other.shifts[i] > self.shifts[i]:
+        self.rescale(i, other.shifts[i])
+      numerators = self.numerators[i]
+      shift = self.shifts[i] - other.shifts[i]
+      for row, n in zip(rows, other.numerators[i]):
+        numerators[row] += n << shift
+    for (i, other_row), value in other.special.items():
+      key = (i, rows[other_row])
+      self.special[key] = self.special.get(key, 0.) + value
+    self.integral = [ a and b for a, b in zip(self.integral, other.integral) ]
+    return self
+
+  def value(self, i, row):
+    if (i, row) in self.special:
+      return self.special[i, row]
+    n = self.numerators[i][row]
+    k = self.shifts[i]
+    if self.integral[i]:
+      return n
+    # integer true division is correctly rounded
+    return n / (1 << k)
+
+  def fill(self, row):
+    data = self.modules[row]
+    for i, column in enumerate(self.columns):
+      if column in data:
+        data[column] = self.value(i, row)
+    return data
+
+  def output(self):
+    output = dict(self.header)
+    output["total"] = self.fill(0)
+    output["modules"] = [ self.fill(row) for row in range(1, len(self.modules)) ]
+    return output
+
+  def state(self):
+    return {
+      "columns": self.columns,
+      "header": self.header,
+      "modules": self.modules,
+      "numerators": self.numerators,
+      "shifts": self.shifts,
+      "integral": self.integral,
+      "special": [ [ i, row, value ] for (i, row), value in self.special.items() ],
+    }
+
+  @classmethod
+  def from_state(cls, state):
+    self = cls(state["columns"][1:])
+    self.header = state["header"]
+    self.modules = state["modules"]
+    # the modules of the other files are added to the last module with the same type and label
+    self.index = { module["type"] + '|' + module["label"] : row for row, module in enumerate(self.modules) if row > 0 }
+    self.numerators = state["numerators"]
+    self.shifts = state["shifts"]
+    self.integral = state["integral"]
+    self.special = { (i, row): value for i, row, value in state["special"] }
+    return self
+
+
+def merge_chunk(files):
+  """Merge a list of files into an Accumulator.
+
+  Also return one record per file, with the messages to print and whether
+  the merge should stop there, so that they can be replayed in the original
+  order when the files are merged in parallel.
+  """
+  accumulator = None
+  reference = None
+  records = []
+  for arg in files:
+    data = {}
+    messages = io.StringIO()
+    try:
+      with redirect_stdout(messages):
+        data = load_resources(arg)
+        data["resources"] = convert_old_resources(data["resources"], arg)
+        if reference is None:
+          reference = data
+        elif reference["resources"] != data["resources"]:
+          print("Error: input files describe different metrics")
+          sys.exit(1)
+        elif reference["total"]["label"] != data["total"]["label"]:
+          print("Warning: input files describe different process names")
+    except SystemExit:
+      records.append((messages.getvalue(), data, True))
+      break
+    # only the metrics of the modules are kept, the rest of the file is released
+    order = list(data)
+    modules = data.pop("modules", [])
+    records.append((messages.getvalue(), data, False))
+
+    first = accumulator is None
+    if first:
+      # the first file provides the structure of the output
+      accumulator = Accumulator(list_metrics(data["resources"]))
+      accumulator.header = { key: data.get(key) for key in order }
+    accumulator.add_total(data["total"])
+    accumulator.add_modules(modules, first)
+
+  return records, accumulator
+
+
+def replay(records, reference = None):
+  """Print the messages of each file, checking it against the first one, and stop on errors."""
+  for messages, data, stop in records:
+    if reference is not None and not stop:
+      # the file was checked against the first file of its chunk, check it against the first file overall
+      messages = ''
+      if reference["resources"] != data["resources"]:
+        messages = "Error: input files describe different metrics\n"
+        stop = True
+      elif reference["total"]["label"] != data["total"]["label"]:
+        messages = "Warning: input files describe different process names\n"
+    sys.stdout.write(messages)
+    if stop:
+      sys.exit(1)
+    if reference is None:
+      reference = data
+
+
+def stream_merge(files, reference = None):
+  records, accumulator = merge_chunk(files)
+  replay(records, reference)
+  return accumulator
+
+
+def combine(pair):
+  return pair[0].merge(pair[1])
+
+
+def parallel_merge(files, jobs, reference = None):
+  """Merge contiguous chunks of files in parallel, and combine the partial results in a tree reduction."""
+  size = (len(files) + jobs - 1) // jobs
+  chunks = [ files[i:i+size] for i in range(0, len(files), size) ]
+  with ProcessPoolExecutor(max_workers = jobs) as pool:
+    results = list(pool.map(merge_chunk, chunks))
+    replay([ record for records, _ in results for record in records ], reference)
+    parts = [ accumulator for _, accumulator in results ]
+    while len(parts) > 1:
+      merged = list(pool.map(combine, zip(parts[0::2], parts[1::2])))
+      if len(parts) % 2:
+        merged.append(parts[-1])
+      parts = merged
+  return parts[0]
+
+
+STATE_VERSION = 2
+
+def file_digest(name):
+  digest = hashlib.sha256()
+  with open(name, 'rb') as f:
+    for block in iter(lambda: f.read(1 << 20), b''):
+      digest.update(block)
+  return digest.hexdigest()
+
+
+def load_state(name):
+  """Load the state of an incremental merge, or return an empty state if the file does not exist."""
+  state = { "version": STATE_VERSION, "digests": [], "files": {}, "accumulator": None }
+  if not os.path.exists(name):
+    return state
+  with open(name) as f:
+    state = json.load(f)
+  if state.get("version") == 1:
+    # version 1 kept a denominator for each cell, use the finest one for the whole column
+    accumulator = state["accumulator"]
+    if accumulator is not None:
+      for i, shifts in enumerate(accumulator["shifts"]):
+        shift = max(shifts)
+        accumulator["numerators"][i] = [ n << (shift - k) for n, k in zip(accumulator["numerators"][i], shifts) ]
+        accumulator["shifts"][i] = shift
+      accumulator["special"] = []
+    state["version"] = STATE_VERSION
+  if state.get("version") != STATE_VERSION:
+    print("Error: unsupported merge state file " + name)
+    sys.exit(1)
+  if state["accumulator"] is not None:
+    state["accumulator"] = Accumulator.from_state(state["accumulator"])
+  return state
+
+
+def save_state(state, name):
+  state = dict(state)
+  if state["accumulator"] is not None:
+    state["accumulator"] = state["accumulator"].state()
+  # write to a temporary file and rename it, so an interrupted update leaves the previous state intact
+  tmp = name + '.tmp'
+  with open(tmp, 'w') as f:
+    json.dump(state, f, separators = (',', ':'))
+  os.replace(tmp, name)
+
+
+def incremental_merge(files, state, jobs):
+  """Fold into the state the files whose content has not been merged yet.
+
+  The digest of each file is cached together with its size and modification
+  time, so unchanged files are not read again. Files with the same content are
+  merged only once. Since the sums are exact, the result is the same as merging
+  all the files at once.
+  """
+  merged = set(state["digests"])
+  known = state["files"]
+  new = []
+  for name in files:
+    path = os.path.abspath(name)
+    stat = os.stat(path)
+    entry = known.get(path)
+    if entry is None or entry[0] != stat.st_size or entry[1] != stat.st_mtime_ns:
+      entry = known[path] = [ stat.st_size, stat.st_mtime_ns, file_digest(path) ]
+    if entry[2] not in merged:
+      merged.add(entry[2])
+      new.append((name, entry[2]))
+
+  if not new:
+    return state
+
+  accumulator = state["accumulator"]
+  reference = None
+  if accumulator is not None:
+    reference = { "resources": accumulator.header["resources"], "total": { "label": accumulator.header["total"]["label"] } }
+  names = [ name for name, _ in new ]
+  if jobs > 1 and len(names) > 1:
+    update = parallel_merge(names, jobs, reference)
+  else:
+    update = stream_merge(names, reference)
+  state["accumulator"] = update if accumulator is None else accumulator.merge(update)
+  state["digests"].extend(digest for _, digest in new)
+  return state
+
+
+def read_file_list(name):
+  f = sys.stdin if name == '-' else open(name)
+  with f:
+    return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def main():
+  parser = argparse.ArgumentParser(description = 'Merge the content of multiple "resources.json" files and print the result to standard output.')
+  parser.add_argument("files", nargs = '*', metavar = 'FILE', help = 'JSON file(s) with the resource usage produced by the FastTimerService')
+  parser.add_argument("-l", "--file-list", action = 'append', default = [], metavar = 'LIST', help = 'read the names of the files to merge from LIST, one per line ("-" for standard input)')
+  parser.add_argument("-g", "--glob", action = 'append', default = [], metavar = 'PATTERN', help = 'merge all the files matching PATTERN, e.g. "harvest/**/resources.json"')
+  parser.add_argument("-s", "--stream", action = 'store_true', help = 'parse the inputs incrementally and accumulate the metrics in a compact columnar form')
+  parser.add_argument("-j", "--jobs", type = int, default = 1, metavar = 'N', help = 'merge chunks of the inputs in N parallel processes, and combine them in a tree reduction (implies --stream)')
+  parser.add_argument("-S", "--state", metavar = 'STATE', help = 'merge incrementally: fold only the inputs that are not yet in the STATE file, and update it (implies --stream)')
+  parser.add_argument("-w", "--write", action = 'store_true', help = 'with --state, write the merged result held in the STATE file')
+  parser.add_argument("-o", "--output", default = '-', metavar = 'FILE', help = 'write the result to FILE instead of standard output, compressed if FILE ends with .gz or .br')
+  parser.add_argument("--compact", action = 'store_true', help = 'write compact JSON, without indentation')
+  args = parser.parse_args()
+
+  files = list(args.files)
+  for name in args.file_list:
+    files.extend(read_file_list(name))
+  for pattern in args.glob:
+    files.extend(sorted(glob.glob(pattern, recursive = True)))
+
+  if not files and not (args.state and args.write):
+    parser.print_usage()
+    sys.exit(1)
+
+  if args.state:
+    state = incremental_merge(files, load_state(args.state), args.jobs)
+    save_state(state, args.state)
+    if not args.write:
+      return
+    if state["accumulator"] is None:
+      print("Error: the merge state file " + args.state + " is empty")
+      sys.exit(1)
+    output = state["accumulator"].output()
+  elif args.jobs > 1 and len(files) > 1:
+    output = parallel_merge(files, args.jobs).output()
+  elif args.stream or args.jobs > 1:
+    output = stream_merge(files).output()
+  else:
+    output = merge_files(files)
+
+  dump_resources(output, args.output, args.compact)
+
 
-json.dump(output, sys.stdout, indent = 2 )
-sys.stdout.write('\n')
+if __name__ == "__main__":
+  main()
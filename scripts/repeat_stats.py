@@ -0,0 +1,152 @@
+#! /usr/bin/env python3
+"""
+Statistics over "repeat sets": several resources.json files with repeated
+measurements of the same configuration.
+
+The aggregated values of each run (a dictionary key -> value, as returned by
+the aggregations of data_analytics.py or compare_json_hist.py) are aligned in
+a keys x runs matrix, a key missing from a run counting as zero. The mean,
+standard deviation and bootstrap confidence interval of the mean are then
+computed for all the keys at once: each bootstrap replica is described by the
+number of times each run is drawn, so the means of all the replicas are a
+single matrix product. Given the total of each run, the ratio of the mean of
+each key to the mean total is resampled instead, drawing the same runs for both.
+"""
+
+import glob
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_BOOTSTRAP = 1000
+DEFAULT_CONFIDENCE = 0.95
+
+
+def expand_repeat_set(spec: str) -> List[str]:
+    """
+    Return the files of a repeat set, given as a "+" separated list of files
+    or glob patterns, e.g. "run1.json+run2.json" or "runs/*.json".
+    """
+    files = []
+    for part in spec.split("+"):
+        matches = sorted(glob.glob(part)) if glob.has_magic(part) else [part]
+        if not matches:
+            raise SystemExit(f"ERROR: no files match {part!r}")
+        files.extend(matches)
+    return files
+
+
+def align(aggs: Sequence[Dict[str, float]], keys: Optional[List[str]] = None) -> Tuple[List[str], np.ndarray]:
+    """
+    Align the aggregated values of several runs: return the keys, in order of
+    first appearance unless given, and the keys x runs matrix of their values.
+    """
+    if keys is None:
+        index: Dict[str, int] = {}
+        for agg in aggs:
+            for key in agg:
+                index.setdefault(key, len(index))
+        keys = list(index)
+    values = np.zeros((len(keys), len(aggs)))
+    for j, agg in enumerate(aggs):
+        values[:, j] = [agg.get(key, 0.0) for key in keys]
+    return keys, values
+
+
+def mean_aggregate(aggs: Sequence[Dict[str, float]]) -> Dict[str, float]:
+    """Return the mean over the runs of the aggregated values of each key."""
+    keys, values = align(aggs)
+    return dict(zip(keys, values.mean(axis=1).tolist()))
+
+
+def bootstrap_means(values: np.ndarray, n_boot: int, rng: np.random.Generator, totals: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Return the keys x n_boot matrix of the means of the bootstrap replicas of
+    the runs; if the totals of the runs are given, the means are divided by the
+    mean total of the same replica.
+    """
+    n_runs = values.shape[1]
+    counts = rng.multinomial(n_runs, np.full(n_runs, 1.0 / n_runs), size=n_boot)
+    means = values @ counts.T / n_runs
+    if totals is not None:
+        means = means / (counts @ np.asarray(totals, dtype=float) / n_runs)
+    return means
+
+
+def interval(boot: np.ndarray, confidence: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the percentile interval of the bootstrap replicas of each key."""
+    alpha = (1.0 - confidence) / 2.0
+    low, high = np.percentile(boot, [100.0 * alpha, 100.0 * (1.0 - alpha)], axis=1)
+    return low, high
+
+
+class RepeatStats:
+    """
+    Mean, standard deviation and bootstrap confidence interval of the mean of
+    each key, over the runs of a repeat set.
+    """
+
+    def __init__(
+        self,
+        aggs: Sequence[Dict[str, float]],
+        keys: Optional[List[str]] = None,
+        n_boot: int = DEFAULT_BOOTSTRAP,
+        confidence: float = DEFAULT_CONFIDENCE,
+        seed: int = 0,
+    ):
+        self.keys, self.values = align(aggs, keys)
+        self.runs = self.values.shape[1]
+        self.mean = self.values.mean(axis=1)
+        if self.runs > 1:
+            self.std = self.values.std(axis=1, ddof=1)
+        else:
+            self.std = np.zeros(len(self.keys))
+        boot = bootstrap_means(self.values, n_boot, np.random.default_rng(seed))
+        self.low, self.high = interval(boot, confidence)
+
+    def errors(self) -> np.ndarray:
+        """Return the asymmetric errors of the means, in the 2 x keys format of matplotlib's yerr."""
+        return np.vstack([self.mean - self.low, self.high - self.mean]).clip(min=0.0)
+
+
+def difference_interval(
+    values_a: np.ndarray,
+    values_b: np.ndarray,
+    n_boot: int = DEFAULT_BOOTSTRAP,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: int = 0,
+    totals_a: Optional[np.ndarray] = None,
+    totals_b: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return the difference of the means of two repeat sets (B - A) for each key,
+    given as keys x runs matrices, and its bootstrap confidence interval, with
+    the two sets resampled independently. If the totals of the runs of both
+    sets are given, the difference of the means normalised to the mean totals
+    is returned instead.
+    """
+    rng = np.random.default_rng(seed)
+    boot = bootstrap_means(values_b, n_boot, rng, totals_b) - bootstrap_means(values_a, n_boot, rng, totals_a)
+    low, high = interval(boot, confidence)
+    mean_a = values_a.mean(axis=1) if totals_a is None else values_a.mean(axis=1) / np.mean(totals_a)
+    mean_b = values_b.mean(axis=1) if totals_b is None else values_b.mean(axis=1) / np.mean(totals_b)
+    return mean_b - mean_a, low, high
+
+
+def significant(
+    values_a: np.ndarray,
+    values_b: np.ndarray,
+    n_boot: int = DEFAULT_BOOTSTRAP,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: int = 0,
+    totals_a: Optional[np.ndarray] = None,
+    totals_b: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Return a mask of the keys whose means (normalised to the mean totals, if
+    given) differ significantly between two repeat sets, i.e. whose confidence
+    interval of the difference excludes zero.
+    With a single run per set every difference is significant.
+    """
+    _, low, high = difference_interval(values_a, values_b, n_boot, confidence, seed, totals_a, totals_b)
+    return (low > 0.0) | (high < 0.0)
@@ -0,0 +1,289 @@
+#! /usr/bin/env python3
+"""
+Helpers to read the "resources.json" files produced by the FastTimerService.
+
+iter_resources() parses a file incrementally: the modules are returned one at a
+time, without building the whole document in memory.
+
+load_resources() reads a whole file, either in JSON or in the compact columnar
+format described in columnar.py; load_columns() reads only some attributes of
+the modules, through the arrays of the columnar format without building the
+modules.
+
+The JSON files can be compressed with gzip (".json.gz") or, if the brotli module
+is available, with brotli (".json.br"): open_resources() decompresses them
+transparently, and dump_resources() compresses the output based on the name of
+the file.
+"""
+
+import codecs
+import gzip
+import io
+import json
+import os
+import re
+import sys
+
+from columnar import ColumnarResources, is_columnar, read_columnar
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CHUNK_SIZE = 1 << 16
+GZIP_MAGIC = b'\x1f\x8b'
+DATASET_SUFFIXES = ('.json', '.json.gz', '.json.br')
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class _Scanner:
+    """
+    Minimal incremental JSON tokenizer on top of json.JSONDecoder.raw_decode:
+    complete values are decoded from a buffer that is refilled from the file
+    as needed.
+    """
+
+    def __init__(self, f, chunk_size = CHUNK_SIZE):
+        self.file = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+        self.scan = self.decoder.scan_once
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    def fill(self):
+        if self.eof:
+            return False
+        data = self.file.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        if isinstance(data, bytes):
+            data = self.utf8.decode(data)
+        if self.pos > self.chunk_size:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        self.buffer += data
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character, without consuming it."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError('unexpected end of JSON input')
+
+    def next(self):
+        """Consume and return the next non-whitespace character."""
+        c = self.peek()
+        self.pos += 1
+        return c
+
+    def expect(self, c):
+        found = self.next()
+        if found != c:
+            raise ValueError('expected %r at position %d, found %r' % (c, self.pos - 1, found))
+
+    def decode(self):
+        """Decode and consume the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.scan(self.buffer, self.pos)
+            except (json.JSONDecodeError, StopIteration):
+                if self.fill():
+                    continue
+                # let the decoder report the error
+                self.decoder.raw_decode(self.buffer, self.pos)
+                raise ValueError('invalid JSON value at position %d' % self.pos)
+            # a number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_resources(f, chunk_size = CHUNK_SIZE):
+    """
+    Parse a resources.json file incrementally, from a text or binary file object.
+
+    Yield ("modules", module) for each element of the top-level "modules" array,
+    and (key, value) for any other top-level key, in the order they appear in
+    the file.
+    """
+    scanner = _Scanner(f, chunk_size)
+    scanner.expect('{')
+    if scanner.peek() == '}':
+        return
+    while True:
+        key = scanner.decode()
+        scanner.expect(':')
+        if key == 'modules' and scanner.peek() == '[':
+            scanner.expect('[')
+            if scanner.peek() == ']':
+                scanner.next()
+            else:
+                while True:
+                    yield key, scanner.decode()
+                    c = scanner.next()
+                    if c == ']':
+                        break
+                    if c != ',':
+                        raise ValueError('expected "," or "]" in the modules array, found %r' % c)
+        else:
+            yield key, scanner.decode()
+        c = scanner.next()
+        if c == '}':
+            break
+        if c != ',':
+            raise ValueError('expected "," or "}" at the top level, found %r' % c)
+
+
+def is_dataset(name):
+    """Check if a file name looks like a JSON dataset, possibly compressed."""
+    return name.endswith(DATASET_SUFFIXES)
+
+
+def dataset_name(name):
+    """Strip the ".json" extension, but keep the compression suffix to tell the compressed datasets apart."""
+    return name[:-len('.json')] if name.endswith('.json') else name
+
+
+def dataset_file(name):
+    """Return the file name of a dataset, the inverse of dataset_name()."""
+    return name if name.endswith(DATASET_SUFFIXES) else name + '.json'
+
+
+def compression_of(path):
+    """Return "gzip", "brotli" or None, from the name of the file and, for gzip, its content."""
+    path = os.fspath(path)
+    if path.endswith('.br'):
+        return 'brotli'
+    if path.endswith('.gz'):
+        return 'gzip'
+    with open(path, 'rb') as f:
+        if f.read(len(GZIP_MAGIC)) == GZIP_MAGIC:
+            return 'gzip'
+    return None
+
+
+def _require_brotli(path):
+    if brotli is None:
+        raise RuntimeError(f"reading or writing {path} requires the brotli module")
+
+
+class _BrotliReader(io.RawIOBase):
+    """Decompress a brotli stream incrementally."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.decompressor = brotli.Decompressor()
+        self.buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.buffer:
+            data = self.raw.read(CHUNK_SIZE)
+            if not data:
+                return 0
+            self.buffer = self.decompressor.process(data)
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        self.buffer = self.buffer[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+        super().close()
+
+
+class _BrotliWriter(io.RawIOBase):
+    """Compress a brotli stream incrementally."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.compressor = brotli.Compressor()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.raw.write(self.compressor.process(bytes(b)))
+        return len(b)
+
+    def close(self):
+        if not self.closed:
+            self.raw.write(self.compressor.finish())
+            self.raw.close()
+        super().close()
+
+
+def open_resources(path, mode = 'r'):
+    """
+    Open a file for reading ("r" or "rb") or writing ("w" or "wb"), compressing
+    or decompressing it transparently with gzip or brotli.
+    """
+    path = os.fspath(path)
+    binary = 'b' in mode
+    if mode[0] == 'r':
+        compression = compression_of(path)
+    else:
+        compression = 'brotli' if path.endswith('.br') else 'gzip' if path.endswith('.gz') else None
+    if compression is None:
+        return open(path, mode) if binary else open(path, mode, encoding = 'utf-8')
+    if compression == 'gzip':
+        f = gzip.open(path, mode[0] + 'b')
+    else:
+        _require_brotli(path)
+        raw = open(path, mode[0] + 'b')
+        f = io.BufferedReader(_BrotliReader(raw)) if mode[0] == 'r' else io.BufferedWriter(_BrotliWriter(raw))
+    return f if binary else io.TextIOWrapper(f, encoding = 'utf-8')
+
+
+def load_resources(path):
+    """Load a resources.json document from a file in JSON or columnar format, detected from its content."""
+    if is_columnar(path):
+        return read_columnar(path)
+    with open_resources(path) as f:
+        return json.load(f)
+
+
+def load_columns(path, names):
+    """
+    Load the document of a file without its "modules", and the values of the
+    given attributes of the modules, as a dictionary name -> list of values,
+    with None for the modules that do not have the attribute.
+    """
+    if is_columnar(path):
+        resources = ColumnarResources(path)
+        document = {key: value for key, value in resources.header["document"].items() if key != "modules"}
+        return document, {name: resources.values(name) for name in names}
+    with open_resources(path) as f:
+        document = json.load(f)
+    modules = document.pop("modules", [])
+    return document, {name: [module.get(name) for module in modules] for name in names}
+
+
+def dump_resources(data, path, compact = False, indent = 2):
+    """
+    Write a resources.json document to a file, or to the standard output if
+    path is "-", compressed if the name ends with ".gz" or ".br".
+    """
+    f = sys.stdout if str(path) == '-' else open_resources(path, 'w')
+    try:
+        if compact:
+            json.dump(data, f, separators = (',', ':'))
+        else:
+            json.dump(data, f, indent = indent)
+        f.write('\n')
+    finally:
+        if f is not sys.stdout:
+            f.close()
@@ -0,0 +1,340 @@
+#! /usr/bin/env python3
+"""
+Track the per-event metrics of the modules and groups over a growing series of
+datasets, e.g. one resources.json for every nightly build, and report the ones
+whose value jumped.
+
+The time series are kept in an append-only store, a directory with
+
+    store.json      the group file and the metrics tracked by the store;
+    builds.jsonl    one line per ingested dataset: its name, modification
+                    time, size and number of events;
+    keys.jsonl      one line per module ("type|label") or group ("Group" and
+                    "Group|Subgroup"), the line number being the key index;
+    <metric>.bin    the (build, key, value per event) records of each metric.
+
+Each run only ingests the datasets that are not in the store yet, identified
+by their name: the new keys and records are appended to their files, and the
+build is appended last, so that the records of a partially written build are
+ignored and overwritten by the next run. A dataset that changed after it was
+ingested is reported, and not ingested again.
+
+The detection compares the mean of the most recent builds with the median of
+the builds before them, for all the keys at once: a key is reported if its
+value grew by more than a relative threshold, by more than a minimum absolute
+amount, and by more than a number of times the median absolute deviation of
+the previous builds, and is higher than in any of the previous builds, so that
+the outliers that recur in the series are not reported again. The records are
+appended in build order, so only the tail of the (memory mapped) record files
+is read, however long the series.
+"""
+
+import argparse
+import json
+import os
+import sys
+import warnings
+
+import numpy as np
+
+from group_matcher import CachedGroupMatcher
+from resources_io import load_resources, is_dataset, dataset_name
+
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+GROUPS_DIR = os.path.normpath(os.path.join(SCRIPT_DIR, os.pardir, 'web', 'groups'))
+
+STORE_VERSION = 1
+DEFAULT_METRICS = ['time_real', 'time_thread']
+RECORD = np.dtype([('build', '<u4'), ('key', '<u4'), ('value', '<f8')])
+
+MODULE = 'module'
+GROUP = 'group'
+
+# scale factor from the median absolute deviation to the standard deviation of a normal distribution
+MAD_SIGMA = 1.4826
+
+
+class Store:
+    """Append-only store of the per-event metrics of a series of builds."""
+
+    def __init__(self, path, groups=None, metrics=None):
+        self.path = path
+        meta_file = os.path.join(path, 'store.json')
+        if os.path.exists(meta_file):
+            with open(meta_file) as f:
+                meta = json.load(f)
+            if meta['version'] != STORE_VERSION:
+                raise SystemExit(f"ERROR: {path} has version {meta['version']}, expected {STORE_VERSION}")
+            if groups is not None and groups != meta['groups']:
+                raise SystemExit(f"ERROR: {path} groups the modules with {meta['groups']!r}, not {groups!r}")
+            if metrics is not None and metrics != meta['metrics']:
+                raise SystemExit(f"ERROR: {path} tracks {', '.join(meta['metrics'])}, not {', '.join(metrics)}")
+        else:
+            meta = {'version': STORE_VERSION, 'groups': groups or 'hlt', 'metrics': metrics or DEFAULT_METRICS}
+            os.makedirs(path, exist_ok=True)
+            with open(meta_file, 'w') as f:
+                json.dump(meta, f, indent=2)
+        self.groups = meta['groups']
+        self.metrics = meta['metrics']
+        self.sizes = {}
+        self.builds = self._read_lines('builds.jsonl')
+        self.keys = [tuple(key) for key in self._read_lines('keys.jsonl')]
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.checked = False
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_lines(self, name):
+        try:
+            with open(self._file(name), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            content = b''
+        # a truncated last line is the remnant of an interrupted run
+        complete = content[:content.rfind(b'\n') + 1]
+        self.sizes[name] = len(complete)
+        return [json.loads(line) for line in complete.splitlines()]
+
+    def _truncate(self, name, size):
+        path = self._file(name)
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            with open(path, 'r+b') as f:
+                f.truncate(size)
+
+    def known(self):
+        """Return the dictionary name -> (mtime, size) of the builds already in the store."""
+        return {build['name']: (build['mtime'], build['size']) for build in self.builds}
+
+    def records(self, metric):
+        """Return the records of a metric, memory mapped, without those of a partially written build."""
+        path = self._file(f"{metric}.bin")
+        if not os.path.exists(path) or os.path.getsize(path) < RECORD.itemsize:
+            return np.zeros(0, dtype=RECORD)
+        records = np.memmap(path, dtype=RECORD, mode='r', shape=(os.path.getsize(path) // RECORD.itemsize,))
+        return records[:np.searchsorted(records['build'], len(self.builds))]
+
+    def append(self, name, mtime, size, events, values):
+        """
+        Append a build, given the dictionary metric -> {key: value per event}
+        of its modules and groups.
+        """
+        if not self.checked:
+            # drop the remnants of a previous build that was not completed, before appending anything
+            for lines, length in self.sizes.items():
+                self._truncate(lines, length)
+            for metric in self.metrics:
+                self._truncate(f"{metric}.bin", self.records(metric).size * RECORD.itemsize)
+            self.checked = True
+        build = len(self.builds)
+        new_keys = []
+        for metric in self.metrics:
+            for key in values[metric]:
+                if key not in self.index:
+                    self.index[key] = len(self.keys)
+                    self.keys.append(key)
+                    new_keys.append(key)
+        if new_keys:
+            with open(self._file('keys.jsonl'), 'a') as f:
+                f.writelines(json.dumps(list(key)) + '\n' for key in new_keys)
+        for metric in self.metrics:
+            records = np.zeros(len(values[metric]), dtype=RECORD)
+            records['build'] = build
+            records['key'] = [self.index[key] for key in values[metric]]
+            records['value'] = list(values[metric].values())
+            with open(self._file(f"{metric}.bin"), 'ab') as f:
+                records.tofile(f)
+        entry = {'name': name, 'mtime': mtime, 'size': size, 'events': events}
+        with open(self._file('builds.jsonl'), 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        self.builds.append(entry)
+
+    def matrix(self, metric, first):
+        """
+        Return the builds x keys matrix of the values of a metric, from build
+        `first` on; the keys missing from a build are NaN.
+        """
+        records = self.records(metric)
+        records = records[np.searchsorted(records['build'], first):]
+        if records.size and records['key'].max() >= len(self.keys):
+            raise SystemExit(f"ERROR: the {metric} records of {self.path} refer to {records['key'].max() + 1} keys, but keys.jsonl has only {len(self.keys)}")
+        values = np.full((len(self.builds) - first, len(self.keys)), np.nan)
+        values[records['build'] - first, records['key']] = records['value']
+        return values
+
+
+def build_values(data, matcher, metrics):
+    """
+    Return the dictionary metric -> {key: value per event} of the modules and
+    groups of a dataset; each group is accumulated at every level of its name.
+    """
+    events = data['total']['events']
+    values = {metric: {} for metric in metrics}
+    for module in data['modules']:
+        group = matcher.match(module['type'], module['label']) or 'Unassigned'
+        fields = group.split('|')
+        keys = [(MODULE, f"{module['type']}|{module['label']}")]
+        keys.extend((GROUP, '|'.join(fields[:level])) for level in range(1, len(fields) + 1))
+        for metric in metrics:
+            value = module.get(metric, 0.) / events
+            result = values[metric]
+            for key in keys:
+                result[key] = result.get(key, 0.) + value
+    return values, events
+
+
+def find_datasets(paths):
+    """
+    Return the (file, name) of the datasets under the given files or
+    directories; the datasets found in a directory are named by their path
+    relative to it, e.g. "CMSSW_14_0_X_2024-01-01-2300/resources".
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                files.extend((os.path.join(root, name), dataset_name(os.path.relpath(os.path.join(root, name), path))) for name in names if is_dataset(name))
+        else:
+            files.append((path, dataset_name(os.path.basename(path))))
+    return files
+
+
+def ingest(store, paths, verbose=False):
+    """Append to the store the datasets it does not contain yet, oldest first; return how many."""
+    known = store.known()
+    new = []
+    for path, name in find_datasets(paths):
+        stat = os.stat(path)
+        version = (int(stat.st_mtime), stat.st_size)
+        if name in known:
+            # a build is a single point of the series, even if its dataset was touched or copied again
+            if known[name] != version:
+                print(f"WARNING: {path} changed since it was ingested as {name}, the store keeps the previous version", file=sys.stderr)
+            continue
+        known[name] = version
+        new.append((stat.st_mtime, path, (name, *version)))
+    new.sort()
+
+    with open(os.path.join(GROUPS_DIR, store.groups + '.json')) as f:
+        matcher = CachedGroupMatcher(json.load(f))
+    for _, path, (name, mtime, size) in new:
+        values, events = build_values(load_resources(path), matcher, store.metrics)
+        store.append(name, mtime, size, events, values)
+        if verbose:
+            print(f"ingested {path}", file=sys.stderr)
+    matcher.save()
+    return len(new)
+
+
+def detect(store, metric, window, recent, threshold, min_delta, sigma, min_history):
+    """
+    Return the regressions of a metric in the last `recent` builds, as a list
+    of dictionaries sorted by decreasing increase of the value per event.
+    """
+    total = len(store.builds)
+    if total <= recent:
+        return []
+    first = max(0, total - recent - window)
+    values = store.matrix(metric, first)
+    history, latest = values[:-recent], values[-recent:]
+    with warnings.catch_warnings():
+        # keys missing from all the builds of a slice give NaN, and are not reported
+        warnings.simplefilter('ignore', RuntimeWarning)
+        baseline = np.nanmedian(history, axis=0)
+        noise = MAD_SIGMA * np.nanmedian(np.abs(history - baseline), axis=0)
+        current = np.nanmean(latest, axis=0)
+        highest = np.nanmax(history, axis=0)
+    delta = current - baseline
+    counts = np.count_nonzero(~np.isnan(history), axis=0)
+    with np.errstate(invalid='ignore'):
+        flagged = (counts >= min_history) & (delta > min_delta) & (delta > threshold * baseline) & (delta > sigma * noise) & (current > highest)
+
+    # the first recent build above the threshold is where the jump happened
+    with np.errstate(invalid='ignore'):
+        above = latest > (baseline + np.maximum(threshold * baseline, sigma * noise))[np.newaxis, :]
+    onset = np.argmax(above, axis=0)
+
+    regressions = []
+    for k in np.flatnonzero(flagged):
+        kind, name = store.keys[k]
+        regressions.append({
+            'metric': metric,
+            'kind': kind,
+            'key': name,
+            'build': store.builds[total - recent + onset[k]]['name'],
+            'baseline': float(baseline[k]),
+            'value': float(current[k]),
+            'delta': float(delta[k]),
+            # None rather than infinity, which is not valid JSON
+            'relative': float(delta[k] / baseline[k]) if baseline[k] > 0 else None,
+            'noise': float(noise[k]),
+        })
+    regressions.sort(key=lambda r: r['delta'], reverse=True)
+    return regressions
+
+
+def print_report(store, regressions, window, recent):
+    builds = store.builds
+    print(f"{len(builds)} builds, {len(store.keys)} modules and groups")
+    if len(builds) <= recent:
+        print("not enough builds to detect regressions")
+        return
+    print(f"last {recent} build(s) from {builds[-recent]['name']} to {builds[-1]['name']}, compared with up to {window} builds before them")
+    if not regressions:
+        print("no regressions")
+        return
+    width = max(len(r['key']) for r in regressions)
+    for metric in store.metrics:
+        selected = [r for r in regressions if r['metric'] == metric]
+        if not selected:
+            continue
+        print()
+        print(f"{metric} per event: {len(selected)} regressions")
+        print(f"    {'kind':<6}  {'key':<{width}}  {'baseline':>10}  {'value':>10}  {'delta':>10}  {'relative':>8}  build")
+        for r in selected:
+            relative = f"{r['relative']:+8.1%}" if r['relative'] is not None else f"{'+inf':>8}"
+            print(f"    {r['kind']:<6}  {r['key']:<{width}}  {r['baseline']:10.3f}  {r['value']:10.3f}  {r['delta']:+10.3f}  {relative}  {r['build']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingest new datasets into a time series store, and report the modules and groups whose time per event jumped.')
+    parser.add_argument('store', metavar='STORE', help='directory of the time series store, created if needed')
+    parser.add_argument('paths', nargs='*', metavar='PATH', help='datasets, or directories with datasets, to ingest')
+    parser.add_argument('-g', '--groups', default=None, metavar='GROUPS', help='group file used to build the groups of a new store, without the .json extension (default: hlt)')
+    parser.add_argument('-m', '--metric', action='append', default=None, dest='metrics', help=f"metric tracked by a new store (default: {' and '.join(DEFAULT_METRICS)})")
+    parser.add_argument('-w', '--window', type=int, default=10, help='number of builds before the recent ones used as the baseline (default: 10)')
+    parser.add_argument('-r', '--recent', type=int, default=1, help='number of most recent builds checked for regressions (default: 1)')
+    parser.add_argument('-t', '--threshold', type=float, default=0.1, help='minimum relative increase (default: 0.1)')
+    parser.add_argument('--min-delta', type=float, default=0.1, help='minimum absolute increase, in the units of the metric per event (default: 0.1)')
+    parser.add_argument('--sigma', type=float, default=5., help='minimum increase, in units of the spread of the baseline builds (default: 5)')
+    parser.add_argument('--min-history', type=int, default=3, help='minimum number of baseline builds with the key (default: 3)')
+    parser.add_argument('--kind', choices=[MODULE, GROUP], default=None, help='report only the modules or only the groups')
+    parser.add_argument('--json', metavar='FILE', help="write the regressions as JSON to FILE, or to stdout for '-'")
+    parser.add_argument('-v', '--verbose', action='store_true', help='print the ingested datasets')
+    args = parser.parse_args()
+    if args.window < 1 or args.recent < 1:
+        parser.error('--window and --recent must be at least 1')
+
+    store = Store(args.store, args.groups, args.metrics)
+    if args.paths:
+        count = ingest(store, args.paths, args.verbose)
+        print(f"{count} new builds ingested", file=sys.stderr)
+
+    regressions = []
+    for metric in store.metrics:
+        regressions.extend(detect(store, metric, args.window, args.recent, args.threshold, args.min_delta, args.sigma, args.min_history))
+    if args.kind:
+        regressions = [r for r in regressions if r['kind'] == args.kind]
+
+    if args.json == '-':
+        json.dump(regressions, sys.stdout, indent=2)
+        print()
+    else:
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(regressions, f, indent=2)
+        print_report(store, regressions, args.window, args.recent)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+#include "FWCore/Framework/interface/ModuleFactory.h"
+#include "FWCore/Framework/interface/SourceFactory.h"
+
+DEFINE_FWK_EVENTSETUP_MODULE(SiStripFakeAPVSimulationParametersESSource);
+DEFINE_FWK_EVENTSETUP_SOURCE(SiStripFedCablingFakeESSource);
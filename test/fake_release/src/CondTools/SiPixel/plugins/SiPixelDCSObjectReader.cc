@@ -0,0 +1,6 @@
+#include "FWCore/Framework/interface/MakerMacros.h"
+
+template <class Record>
+class PixelDCSObjectReader;
+
+DEFINE_FWK_MODULE(PixelDCSObjectReader<PixelCaenChannelRcd>);
@@ -0,0 +1,10 @@
+#ifndef FWCore_Framework_MakerMacros_h
+#define FWCore_Framework_MakerMacros_h
+
+#include "FWCore/Framework/interface/maker/MakerPluginFactory.h"
+
+#define DEFINE_FWK_MODULE(type) \
+  DEFINE_EDM_PLUGIN(edm::MakerPluginFactory, edm::WorkerMaker<type>, #type)
+DEFINE_FWK_MODULE(NotAModule)
+
+#endif
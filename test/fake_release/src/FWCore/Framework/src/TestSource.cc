@@ -0,0 +1,7 @@
+#include "FWCore/Framework/interface/InputSourceMacros.h"
+
+namespace edm {
+  class EmptySource;
+}
+using edm::EmptySource;
+DEFINE_FWK_INPUT_SOURCE(EmptySource);
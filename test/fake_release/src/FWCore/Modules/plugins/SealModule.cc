@@ -0,0 +1,8 @@
+#include "FWCore/Framework/interface/MakerMacros.h"
+#include "FWCore/Modules/interface/EventIDChecker.h"
+#include "FWCore/Modules/interface/Prescaler.h"
+
+DEFINE_FWK_MODULE(EventIDChecker);
+DEFINE_FWK_MODULE(edm::Prescaler);
+  DEFINE_FWK_MODULE( IterateNTimesLooper );
+// DEFINE_FWK_MODULE(DisabledModule);
@@ -0,0 +1,6 @@
+#ifndef HeterogeneousCore_AlpakaTest_interface_alpaka_ModuleFactory_h
+#define HeterogeneousCore_AlpakaTest_interface_alpaka_ModuleFactory_h
+
+DEFINE_FWK_EVENTSETUP_ALPAKA_MODULE(NotAModule);
+
+#endif
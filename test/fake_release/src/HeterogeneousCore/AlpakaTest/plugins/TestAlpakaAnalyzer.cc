@@ -0,0 +1,6 @@
+#include "FWCore/Framework/interface/MakerMacros.h"
+
+class TestAlpakaAnalyzer;
+DEFINE_FWK_MODULE(TestAlpakaAnalyzer);
+// the alpaka macros are only taken into account in the alpaka subdirectories
+DEFINE_FWK_ALPAKA_MODULE(NotAnAlpakaModule);
@@ -0,0 +1,7 @@
+#include "HeterogeneousCore/AlpakaCore/interface/alpaka/ModuleFactory.h"
+
+namespace ALPAKA_ACCELERATOR_NAMESPACE {
+  class TestAlpakaESProducerA;
+}  // namespace ALPAKA_ACCELERATOR_NAMESPACE
+
+DEFINE_FWK_EVENTSETUP_ALPAKA_MODULE(TestAlpakaESProducerA);
@@ -0,0 +1,7 @@
+#include "FWCore/Framework/interface/InputSourceMacros.h"
+#include "IOPool/Input/src/PoolSource.h"
+#include "IOPool/Input/src/EmbeddedRootSource.h"
+
+using edm::PoolSource;
+DEFINE_FWK_INPUT_SOURCE(PoolSource);
+DEFINE_FWK_VECTOR_INPUT_SOURCE(edm::EmbeddedRootSource);
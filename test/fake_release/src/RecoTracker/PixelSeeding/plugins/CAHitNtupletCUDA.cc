@@ -0,0 +1,6 @@
+#include "FWCore/Framework/interface/MakerMacros.h"
+
+class CAHitNtupletCUDA;
+DEFINE_FWK_MODULE(CAHitNtupletCUDA);
+// the same module is also declared by another package, the first one is kept
+DEFINE_FWK_MODULE(EventIDChecker);
@@ -0,0 +1,12 @@
+#include "HeterogeneousCore/AlpakaCore/interface/alpaka/MakerMacros.h"
+
+namespace ALPAKA_ACCELERATOR_NAMESPACE {
+  template <typename TrackerTraits>
+  class CAHitNtupletAlpaka;
+
+  using CAHitNtupletAlpakaPhase1 = CAHitNtupletAlpaka<pixelTopology::Phase1>;
+  using CAHitNtupletAlpakaPhase2 = CAHitNtupletAlpaka<pixelTopology::Phase2>;
+}  // namespace ALPAKA_ACCELERATOR_NAMESPACE
+
+DEFINE_FWK_ALPAKA_MODULE(CAHitNtupletAlpakaPhase1);
+DEFINE_FWK_ALPAKA_MODULE(CAHitNtupletAlpakaPhase2);
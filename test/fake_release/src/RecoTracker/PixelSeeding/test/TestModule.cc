@@ -0,0 +1,4 @@
+#include "FWCore/Framework/interface/MakerMacros.h"
+
+// the test directories are not scanned
+DEFINE_FWK_MODULE(PixelSeedingTestModule);
@@ -61,8 +61,10 @@ Client-side (JavaScript):
       $data_name = $_GET["data_name"];
     }
     $dataset_cache = "${data_name}_dataset.js";
+    $dataset_index = "${data_name}_dataset_index.json";
     if ($data_name == "data"){
       $dataset_cache = "dataset.js";
+      $dataset_index = "dataset_index.json";
     }
     function preformat($file) {
       $file = explode('/', $file);
@@ -73,18 +75,54 @@ Client-side (JavaScript):
       else
         return "'" . dirname($file) . "/" . basename($file, ".json") . "'";
     }
-    function rglob($pattern, $flags = 0) {
-      $files = glob($pattern, $flags);
-      foreach (glob(dirname($pattern).'/*', GLOB_ONLYDIR) as $dir) {
-        $files = array_merge($files, rglob($dir.'/'.basename($pattern), $flags));
-      }
-      return $files;
+    // list the datasets, also compressed with gzip or brotli, in the same order as
+    // scripts/index_datasets.py: the files of each directory sorted by name, then
+    // the content of its subdirectories
+    function datasets($dir) {
+        $files = array();
+        $dirs = array();
+        // sort the names byte by byte, like Python does
+        $entries = scandir($dir, SCANDIR_SORT_NONE);
+        sort($entries, SORT_STRING);
+        foreach ($entries as $entry) {
+            if ($entry[0] == '.')
+                continue;
+            if (is_dir("$dir/$entry"))
+                $dirs[] = "$dir/$entry";
+            elseif (is_file("$dir/$entry") && preg_match('/\.json(\.gz|\.br)?$/', $entry))
+                $files[] = "$dir/$entry";
+        }
+        foreach ($dirs as $subdir)
+            $files = array_merge($files, datasets($subdir));
+        return $files;
+    }
+    // the index is used only while the directories it lists have not changed, so that
+    // the datasets added after its last update are listed as well
+    function current_index($file, $dir) {
+        $index = file_exists($file) ? json_decode(file_get_contents($file), true) : null;
+        if (!$index || !isset($index["directories"]))
+            return null;
+        foreach ($index["directories"] as $rel => $entry) {
+            // filemtime() has a resolution of one second
+            $mtime = @filemtime($rel === "" ? $dir : "$dir/$rel");
+            if ($mtime === false || $mtime != floor($entry["mtime"]))
+                return null;
+        }
+        return $index;
+    }
+    // list the datasets from the index maintained by scripts/index_datasets.py, if available
+    function indexed($entry) {
+      return "'" . $entry["name"] . "'";
     }
     if (file_exists($dataset_cache)){
       print(file_get_contents($dataset_cache));
     } else {
       print("var data_name = \"$data_name\";");
-      print("var datasets = [ " . join(", ", array_map("preformat", rglob($data_name.'/*.json'))) . " ];\n");
+      $index = current_index($dataset_index, $data_name);
+      if ($index)
+        print("var datasets = [ " . join(", ", array_map("indexed", $index["datasets"])) . " ];\n");
+      else
+        print("var datasets = [ " . join(", ", array_map("preformat", datasets($data_name))) . " ];\n");
       print("var groups = [ " . join(", ", array_map("preformat", glob('groups/*.json'))) . " ];\n");
       print("var colours = [ " . join(", ", array_map("preformat", glob('colours/*.json'))) . " ];\n");
     }
@@ -180,7 +218,7 @@ Client-side (JavaScript):
       </div>
       <div style="display:inline-block;">
         or <b>upload</b>
-        <input type="file" accept=".json" id="dataset_upload" oninput="uploadDataset(this.files)"/>
+        <input type="file" accept=".json,.gz,.br" id="dataset_upload" oninput="uploadDataset(this.files)"/>
       </div>
       <div style="display:inline-block;">
         <b>Metric</b>
@@ -355,8 +393,10 @@ function uploadDataset(files){
   document.getElementById("dataset_menu").selectedIndex=0;
   config.dataset=null; config.local=true;
   var file=files[0];
-  file.text().then(function(content){
-    current.dataset = JSON.parse(content);
+  file.arrayBuffer().then(function(buffer){
+    return parseJsonBuffer(buffer, file.name);
+  }).then(function(dataset){
+    current.dataset = dataset;
     loadAvailableMetrics();
     updateDownloadButtonLabel();
   });
@@ -368,7 +408,10 @@ function updateDataset(){
   config.dataset = menu.options[idx].value;
   config.local=false;
   updateDownloadButtonLabel();
-  loadJsonInto(current,"dataset",config.data_name + "/" + config.dataset + ".json",loadAvailableMetrics);
+  fetchDataset(config.dataset).then(function(dataset){
+    current.dataset = dataset;
+    loadAvailableMetrics();
+  }).catch(e=>console.error("Failed to load dataset "+config.dataset,e));
 }
 
 function updatePage(){
@@ -410,22 +453,29 @@ function updateDataView(){
   }
   current.processing=true;
 
-  current.data = {
-    "label": current.dataset.total.label,
-    "expected": current.dataset.total[config.resource],
-    "ratio": current.dataset.total.ratio,
-    "weight":0.,
-    "groups":[]
-  };
-  for (module of current.dataset.modules){
-    var g=findGroup(module);
-    g.push(module.type);
-    makeOrUpdateGroup(g,module);
-  }
-  if (unassigned.length){
-    console.log("Unassigned modules"); console.table(unassigned);
-  }
-  normalise(current.data,current.dataset.total.events);
+  // use the tree grouped by cgi-bin/grouped.py if available, otherwise group the modules locally
+  loadGroupedTree(drawBarChartView, function(){
+    current.data = {
+      "label": current.dataset.total.label,
+      "expected": current.dataset.total[config.resource],
+      "ratio": current.dataset.total.ratio,
+      "weight":0.,
+      "groups":[]
+    };
+    for (module of current.dataset.modules){
+      var g=findGroup(module);
+      g.push(module.type);
+      makeOrUpdateGroup(g,module);
+    }
+    if (unassigned.length){
+      console.log("Unassigned modules"); console.table(unassigned);
+    }
+    normalise(current.data,current.dataset.total.events);
+    drawBarChartView();
+  });
+}
+
+function drawBarChartView(){
   for (key in current.colours){
     var grp = getGroup(key.split("|"));
     if (grp) grp.color = current.colours[key];
@@ -764,7 +814,7 @@ function updateDownloadButtonLabel(){
   if (config.local) {
     btn.textContent = "Download local file";
   } else if (config.dataset) {
-    btn.textContent = "Download " + config.dataset + ".json";
+    btn.textContent = "Download " + datasetFileName(config.dataset);
   } else {
     btn.textContent = "Download dataset";
   }
@@ -1121,8 +1171,7 @@ function loadComparisonDataset(name){
     processComparisonRaw(name, comparisonCache[name]);
     return Promise.resolve();
   }
-  return fetch(config.data_name + '/' + name + '.json')
-    .then(r=>r.json())
+  return fetchDataset(name)
     .then(raw=>{
       comparisonCache[name]=raw;
       processComparisonRaw(name, raw);
@@ -1,6 +1,6 @@
 #! /usr/bin/python
 
-import sys, os, os.path, glob, fnmatch
+import sys, os, os.path, glob, fnmatch, json
 
 print "Content-Type: text/javascript;charset=utf-8\n"
 
@@ -13,13 +13,39 @@ def find_files(directory, pattern):
                 yield filename
 
 
-# list all JSON files
-files = list(find_files('../data', '*.json'))
-# sort by modification time
-files.sort(key = os.path.getmtime)
-# remove the path and extension
-names = [ os.path.splitext(os.path.relpath(f,'../data'))[0] for f in files ]
-# convert to string, using double quotes
-value = str(names).replace("'", '"')
+# the index is used only while the directories it lists have not changed, so that
+# the datasets added after its last update are listed as well
+def current_index(path, data_dir):
+  if not os.path.exists(path):
+    return None
+  with open(path) as f:
+    index = json.load(f)
+  for rel, entry in index.get('directories', {}).items():
+    try:
+      if os.path.getmtime(os.path.join(data_dir, rel)) != entry['mtime']:
+        return None
+    except OSError:
+      return None
+  return index if 'directories' in index else None
+
+
+# use the index maintained by scripts/index_datasets.py, if available and up to date
+index = current_index('../dataset_index.json', '../data')
+if index:
+  entries = index['datasets']
+  # sort by modification time
+  entries.sort(key = lambda entry: entry['mtime'])
+  # convert to string, using double quotes
+  value = json.dumps([ entry['name'] for entry in entries ])
+else:
+  # list all JSON files, also compressed with gzip or brotli
+  files = [ f for pattern in ('*.json', '*.json.gz', '*.json.br') for f in find_files('../data', pattern) ]
+  # sort by modification time
+  files.sort(key = os.path.getmtime)
+  # remove the path and extension; the compressed files keep their full name
+  names = [ os.path.relpath(f,'../data') for f in files ]
+  names = [ n[:-len('.json')] if n.endswith('.json') else n for n in names ]
+  # convert to string, using double quotes
+  value = str(names).replace("'", '"')
 # print the result
 print 'var datasets = %s;' % value
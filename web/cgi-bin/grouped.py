@@ -0,0 +1,295 @@
+#! /usr/bin/python
+#
+# Return the hierarchical tree of a dataset, with its modules already assigned
+# to the groups and aggregated, in the same format built by updateDataView() in
+# common.js; the web pages fetch it instead of grouping all the modules in the
+# browser, and fall back to the local grouping if it is not available.
+#
+# Parameters:
+#   data_name    the data directory (default: "data")
+#   dataset      the name of the dataset, without the .json extension; the
+#                datasets compressed with gzip or brotli keep their full name,
+#                e.g. "run.json.gz"
+#   groups       the name of the group file, without the .json extension
+#   metric       the metric used for the weights
+#   show_labels  0 to hide the labels of the modules (default: 1)
+#
+# The response is a JSON object with the tree ("tree") and the list of modules
+# that do not match any group ("unassigned"). It is cached on disk, in the
+# directory given by CIRCLES_WEB_CACHE (default: ../cache), keyed by the
+# parameters and by the modification times of the dataset and group files.
+# The entries not used for more than CIRCLES_WEB_CACHE_AGE days (default: 30)
+# are removed, and so are the least recently used ones when the cache grows
+# above CIRCLES_WEB_CACHE_SIZE MB (default: 256).
+
+import sys, os, os.path, re, json, hashlib, gzip, time, collections
+
+try:
+  from urllib.parse import parse_qs
+except ImportError:
+  from urlparse import parse_qs
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+VERSION = 2
+WEB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+CACHE_DIR = os.environ.get('CIRCLES_WEB_CACHE', os.path.join(WEB_DIR, 'cache'))
+CACHE_SIZE = float(os.environ.get('CIRCLES_WEB_CACHE_SIZE', 256)) * 1024 * 1024
+CACHE_AGE = float(os.environ.get('CIRCLES_WEB_CACHE_AGE', 30)) * 24 * 3600
+ARRAY_INDEX = re.compile(r'^(0|[1-9][0-9]*)$')
+
+
+def js_key_order(keys):
+  # JavaScript iterates over the integer-like keys of an object first, in numerical order
+  indices = sorted((k for k in keys if ARRAY_INDEX.match(k) and int(k) < 2**32 - 1), key = int)
+  return indices + [k for k in keys if not (ARRAY_INDEX.match(k) and int(k) < 2**32 - 1)]
+
+
+def compile_pattern(pattern):
+  # same as compilePattern() in common.js
+  if pattern == "":
+    return None
+  if "?" in pattern or "*" in pattern:
+    return re.compile("^" + pattern.replace("?", ".").replace("*", ".*") + "$")
+  return pattern
+
+
+def is_literal(pattern):
+  return pattern is not None and not hasattr(pattern, 'search')
+
+
+def match_pattern(pattern, text):
+  if pattern is None:
+    return True
+  if is_literal(pattern):
+    return pattern == text
+  return text is not None and pattern.search(text) is not None
+
+
+class Groups(object):
+  """
+  Same matching as compileGroups() and findGroup() in common.js: the first
+  matching group wins. The patterns with a literal type or label are indexed,
+  so that only the candidates for each module are tested.
+  """
+
+  def __init__(self, groups):
+    compiled = []
+    for key in js_key_order(list(groups)):
+      if "|" in key:
+        fields = key.split("|")
+        t, l = compile_pattern(fields[0]), compile_pattern(fields[1])
+      else:
+        t, l = None, compile_pattern(key)
+      compiled.append((t, l, groups[key]))
+    if "other" not in groups:
+      compiled.append((re.compile(".*"), re.compile("^other$"), "other"))
+
+    self.by_type = {}
+    self.by_label = {}
+    self.generic = []
+    for position, (t, l, g) in enumerate(compiled):
+      if is_literal(t):
+        self.by_type.setdefault(t, []).append((position, l, g))
+      elif is_literal(l):
+        self.by_label.setdefault(l, []).append((position, t, g))
+      else:
+        self.generic.append((position, t, l, g))
+
+  def find(self, module_type, module_label):
+    best = None
+    for position, l, g in self.by_type.get(module_type, ()):
+      if match_pattern(l, module_label):
+        best = (position, g)
+        break
+    for position, t, g in self.by_label.get(module_label, ()):
+      if best is not None and position > best[0]:
+        break
+      if match_pattern(t, module_type):
+        best = (position, g)
+        break
+    for position, t, l, g in self.generic:
+      if best is not None and position > best[0]:
+        break
+      if match_pattern(t, module_type) and match_pattern(l, module_label):
+        best = (position, g)
+        break
+    return None if best is None else best[1]
+
+
+def make_or_update_group(root, path, module, metric, show_labels, children):
+  # same as makeOrUpdateGroup() in common.js; children maps each node to the
+  # first of its children with a given label, to avoid the linear searches
+  value = module[metric]
+  data = root
+  data["elements"] = 0
+  for label in path:
+    data["weight"] += value
+    siblings = children.setdefault(id(data), {})
+    element = siblings.get(label)
+    if element is not None:
+      element["id"] = label
+    else:
+      element = { "label": label, "weight": 0., "groups": [] }
+      data["groups"].append(element)
+      siblings[label] = element
+    data = element
+  label = ""
+  if show_labels or module.get("label") == "other":
+    label = module.get("label")
+  entry = { "label": label, "weight": value }
+  if "events" in module:
+    entry["events"] = module["events"]
+  if "ratio" in module:
+    entry["ratio"] = module["ratio"]
+  if module.get("record"):
+    entry["record"] = module["record"]
+  data["groups"].append(entry)
+  children.setdefault(id(data), {}).setdefault(label, entry)
+  data["weight"] += value
+
+
+def normalise(data, events):
+  data["weight"] /= events
+  if "events" in data:
+    data["events"] /= events
+  for group in data.get("groups", ()):
+    normalise(group, events)
+
+
+def build_tree(dataset, groups, metric, show_labels):
+  """Group and aggregate the modules of a dataset, like updateDataView() in common.js."""
+  total = dataset["total"]
+  root = { "label": total.get("label"), "weight": 0., "groups": [] }
+  if metric in total:
+    root["expected"] = total[metric]
+  if "ratio" in total:
+    root["ratio"] = total["ratio"]
+
+  unassigned = []
+  children = {}
+  for module in dataset["modules"]:
+    # skip the modules without the metric, like the comparisons in barchart.php
+    if metric not in module:
+      continue
+    group = groups.find(module.get("type"), module.get("label"))
+    if group is None:
+      unassigned.append({ "type": module.get("type"), "label": module.get("label") })
+      group = "Unassigned"
+    path = group.split("|")
+    path.append(module.get("type"))
+    make_or_update_group(root, path, module, metric, show_labels, children)
+  if total.get("events") is not None:
+    normalise(root, total["events"])
+  return { "tree": root, "unassigned": unassigned }
+
+
+def dataset_path(data_dir, name):
+  if name.endswith(('.json.gz', '.json.br')):
+    return os.path.join(data_dir, name)
+  return os.path.join(data_dir, name + '.json')
+
+
+def load_dataset(path):
+  # the datasets can be compressed with gzip or, if the module is available, with brotli
+  if path.endswith('.br'):
+    if brotli is None:
+      fail('501 Not Implemented', 'brotli-compressed datasets are not supported')
+    with open(path, 'rb') as f:
+      return json.loads(brotli.decompress(f.read()).decode('utf-8'))
+  if path.endswith('.gz'):
+    f = gzip.open(path, 'rb')
+    try:
+      return json.loads(f.read().decode('utf-8'))
+    finally:
+      f.close()
+  with open(path) as f:
+    return json.load(f)
+
+
+def cache_name(params, files):
+  key = [ VERSION, params ] + [ (f, os.path.getmtime(f)) for f in files ]
+  return os.path.join(CACHE_DIR, hashlib.sha1(json.dumps(key, sort_keys = True).encode('utf-8')).hexdigest() + '.json')
+
+
+def prune_cache():
+  # the modification time of each entry is updated when it is used
+  entries = []
+  for name in os.listdir(CACHE_DIR):
+    path = os.path.join(CACHE_DIR, name)
+    try:
+      stat = os.stat(path)
+    except OSError:
+      # removed by another request
+      continue
+    entries.append((stat.st_mtime, stat.st_size, path))
+  entries.sort(reverse = True)
+  now = time.time()
+  total = 0
+  for mtime, size, path in entries:
+    total += size
+    if total > CACHE_SIZE or now - mtime > CACHE_AGE:
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+
+
+def fail(status, message):
+  sys.stdout.write("Status: %s\nContent-Type: text/plain;charset=utf-8\n\n%s\n" % (status, message))
+  sys.exit(0)
+
+
+def main():
+  query = parse_qs(os.environ.get('QUERY_STRING', ''))
+  params = dict((key, query.get(key, [''])[0]) for key in ('data_name', 'dataset', 'groups', 'metric', 'show_labels'))
+  params['data_name'] = params['data_name'] or 'data'
+  params['show_labels'] = params['show_labels'] not in ('0', 'false')
+  if not re.match(r'^[a-z0-9_-]*$', params['data_name']) or not re.match(r'^[A-Za-z0-9_.-]+$', params['groups']):
+    fail('400 Bad Request', 'invalid data_name or groups')
+  if not params['dataset'] or not params['metric']:
+    fail('400 Bad Request', 'missing dataset or metric')
+
+  data_dir = os.path.realpath(os.path.join(WEB_DIR, params['data_name']))
+  dataset_file = os.path.realpath(dataset_path(data_dir, params['dataset']))
+  groups_file = os.path.join(WEB_DIR, 'groups', params['groups'] + '.json')
+  if not dataset_file.startswith(data_dir + os.sep):
+    fail('400 Bad Request', 'invalid dataset')
+  if not os.path.isfile(dataset_file) or not os.path.isfile(groups_file):
+    fail('404 Not Found', 'dataset or group file not found')
+
+  cached = cache_name(params, [dataset_file, groups_file])
+  if os.path.exists(cached):
+    with open(cached) as f:
+      body = f.read()
+    try:
+      os.utime(cached, None)
+    except OSError:
+      pass
+  else:
+    dataset = load_dataset(dataset_file)
+    with open(groups_file) as f:
+      # the first matching group wins, so the order of the file must be kept also with Python 2
+      groups = Groups(json.load(f, object_pairs_hook = collections.OrderedDict))
+    body = json.dumps(build_tree(dataset, groups, params['metric'], params['show_labels']), separators = (',', ':'))
+    try:
+      if not os.path.isdir(CACHE_DIR):
+        os.makedirs(CACHE_DIR)
+      tmp = cached + '.%d.tmp' % os.getpid()
+      with open(tmp, 'w') as f:
+        f.write(body)
+      os.rename(tmp, cached)
+      prune_cache()
+    except (IOError, OSError):
+      # the cache is optional
+      pass
+
+  sys.stdout.write("Content-Type: application/json;charset=utf-8\n\n")
+  sys.stdout.write(body)
+
+
+if __name__ == "__main__":
+  main()
@@ -59,6 +59,85 @@ function loadJsonInto(target, attribute, url, then) {
   xhttp.send(null);
 }
 
+// The compressed datasets are listed with their full file name, e.g. "run.json.gz"
+var compressedDataset = /\.json\.(gz|br)$/;
+
+// Return the URL of a dataset
+function datasetUrl(name) {
+  if (compressedDataset.test(name)) {
+    return config.data_name + "/" + name;
+  }
+  return config.data_name + "/" + name + ".json";
+}
+
+// Modification time (in seconds) and size of the dataset files loaded by the page,
+// as served by the web server, used to tell if a precomputed tree is out of date
+var datasetVersions = {};
+
+// Fetch and parse a dataset, and record the version of its file
+function fetchDataset(name) {
+  return fetchJson(datasetUrl(name), function (response) {
+    var modified = Date.parse(response.headers.get("Last-Modified"));
+    var length = response.headers.get("Content-Length");
+    datasetVersions[name] = {
+      mtime: isNaN(modified) ? null : modified / 1000,
+      // the length of an encoded response is not the size of the file
+      size: (length === null || response.headers.get("Content-Encoding")) ? null : Number(length)
+    };
+  });
+}
+
+// Return the file name to use when downloading a dataset, without compression
+function datasetFileName(name) {
+  return name.replace(compressedDataset, "") + ".json";
+}
+
+// Parse a JSON file, decompressing it if it is compressed with gzip or, if the
+// browser supports it, with brotli; the web server may already have decompressed
+// it, if it serves it with "Content-Encoding: gzip" or "br".
+function parseJsonBuffer(buffer, name) {
+  var bytes = new Uint8Array(buffer);
+  var format = null;
+  if (bytes.length >= 2 && bytes[0] == 0x1f && bytes[1] == 0x8b) {
+    format = "gzip";
+  } else if (/\.br$/.test(name)) {
+    try {
+      return Promise.resolve(JSON.parse(new TextDecoder().decode(bytes)));
+    } catch (error) {
+      format = "brotli";
+    }
+  } else {
+    return Promise.resolve(JSON.parse(new TextDecoder().decode(bytes)));
+  }
+  if (typeof DecompressionStream === "undefined") {
+    return Promise.reject(new Error("DecompressionStream not supported"));
+  }
+  try {
+    var stream = new Blob([buffer]).stream().pipeThrough(new DecompressionStream(format));
+  } catch (error) {
+    return Promise.reject(new Error(format + " decompression not supported (" + error + ")"));
+  }
+  return new Response(stream).json();
+}
+
+// Fetch and parse a JSON file, possibly compressed; if given, inspect() is called
+// with the response before its content is read
+function fetchJson(url, inspect) {
+  return fetch(url)
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status + " " + response.statusText);
+      }
+      if (inspect) {
+        inspect(response);
+      }
+      return response.arrayBuffer();
+    })
+    .then(function (buffer) {
+      return parseJsonBuffer(buffer, url.split("?")[0]);
+    });
+}
+
 function groupColorDecorator(options, properties, variables) {
   // customize only the top level groups' colours
   if (properties.level > 0){
@@ -288,7 +367,15 @@ function updateDataset() {
   config.local = false;
 
   // Load the selected dataset, and the associated resource metrics
-  loadJsonInto(current, "dataset", config.data_name + "/" + config.dataset + ".json", loadAvailableMetrics);
+  console.log("Loading " + datasetUrl(config.dataset));
+  fetchDataset(config.dataset)
+    .then(function (dataset) {
+      current.dataset = dataset;
+      loadAvailableMetrics();
+    })
+    .catch(function (error) {
+      console.log("Failed to load the dataset " + config.dataset + " (" + error + ")");
+    });
 }
 
 // Upload a JSON file
@@ -298,10 +385,14 @@ function uploadDataset(files) {
   config.dataset = null;
   config.local = true;
   var file = files[0];
-  file.text().then(function (content) {
-    current.dataset = JSON.parse(content);
-    loadAvailableMetrics();
-  });
+  file.arrayBuffer()
+    .then(function (buffer) {
+      return parseJsonBuffer(buffer, file.name);
+    })
+    .then(function (dataset) {
+      current.dataset = dataset;
+      loadAvailableMetrics();
+    });
 }
 
 function downloadDataset() {
@@ -310,7 +401,7 @@ function downloadDataset() {
   var url = URL.createObjectURL(blob);
   var a = document.createElement("a");
   a.href = url;
-  a.download = config.dataset + '.json';
+  a.download = datasetFileName(config.dataset);
   a.click();
 }
 
@@ -689,6 +780,92 @@ function updateDataView() {
 
   current.processing = true;
 
+  loadGroupedTree(drawDataView, function () {
+    groupModules();
+    drawDataView();
+  });
+}
+
+// Fetch the tree of the current dataset, already grouped and aggregated by
+// scripts/ingest_datasets.py or by cgi-bin/grouped.py, and call then(); call
+// fallback() to group the modules locally if neither is available.
+function loadGroupedTree(then, fallback) {
+  if (config.local || !config.dataset) {
+    fallback();
+    return;
+  }
+  loadPrecomputedTree()
+    .catch(function (error) {
+      console.log("Precomputed tree not available (" + error + "), using the server-side grouping");
+      return loadServerTree();
+    })
+    .then(function (grouped) {
+      current.data = grouped.tree;
+      if (grouped.unassigned.length) {
+        console.log("Unassigned modules:");
+        console.table(grouped.unassigned);
+      }
+      then();
+    }, function (error) {
+      console.log("Server-side grouping not available (" + error + "), grouping the modules locally");
+      fallback();
+    });
+}
+
+// Load the gzipped tree precomputed by scripts/ingest_datasets.py, with the
+// labels of the modules; reject it if it is older than the group file, or if it
+// was built from a dataset file with a different modification time or size.
+function loadPrecomputedTree() {
+  var url = "trees/" + config.data_name + "/" + config.dataset + "/" + config.groups + "." + config.resource + ".json.gz";
+  return fetchJson(url + groupCacheBuster(config.groups))
+    .then(function (grouped) {
+      if (typeof group_versions !== "undefined" && group_versions[config.groups] > grouped.groups_version) {
+        throw new Error("out of date");
+      }
+      var version = datasetVersions[config.dataset];
+      if (version && ((version.mtime !== null && version.mtime != grouped.dataset_version) || (version.size !== null && version.size != grouped.dataset_size))) {
+        throw new Error("built from another version of the dataset");
+      }
+      if (!current.show_labels) {
+        hideLabels(grouped.tree);
+      }
+      return grouped;
+    });
+}
+
+// Fetch the tree grouped by cgi-bin/grouped.py
+function loadServerTree() {
+  var url = "cgi-bin/grouped.py?" + [
+    "data_name=" + encodeURIComponent(config.data_name),
+    "dataset=" + encodeURIComponent(config.dataset),
+    "groups=" + encodeURIComponent(config.groups),
+    "metric=" + encodeURIComponent(config.resource),
+    "show_labels=" + (current.show_labels ? 1 : 0)
+  ].join("&") + groupCacheBuster(config.groups).replace("?", "&");
+  return fetch(url)
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status + " " + response.statusText);
+      }
+      return response.json();
+    });
+}
+
+// Remove the labels of the modules, like makeOrUpdateGroup() does when show_labels is not set
+function hideLabels(data) {
+  for (var group of data.groups) {
+    if (group.groups === undefined) {
+      if (group.label != "other") {
+        group.label = "";
+      }
+    } else {
+      hideLabels(group);
+    }
+  }
+}
+
+// Group and aggregate the modules of the current dataset
+function groupModules() {
   current.data = {
     "label": current.dataset.total.label,
     "expected": current.dataset.total[config.resource],
@@ -709,7 +886,10 @@ function updateDataView() {
   if (current.dataset.total.events !== undefined) {
     normalise(current.data, current.dataset.total.events);
   }
+}
 
+// Apply the colour scheme to the grouped data, and draw it
+function drawDataView() {
   for (key in current.colours) {
     group = getGroup(key.split("|"));
     if (group != null) {
@@ -9,19 +9,54 @@
           return "'" . dirname($file) . "/" . basename($file, ".json") . "'";
       }
 
-      // from https://stackoverflow.com/a/17161106/2050986
-      // does not support flag GLOB_BRACE
-      function rglob($basedir, $pattern, $flags = 0) {
-          $files = glob($basedir.'/'.$pattern, $flags);
-          foreach (glob($basedir.'/*', GLOB_ONLYDIR) as $dir) {
-              $files = array_merge($files, rglob($dir, $pattern, $flags));
+      // list the datasets, also compressed with gzip or brotli, in the same order as
+      // scripts/index_datasets.py: the files of each directory sorted by name, then
+      // the content of its subdirectories
+      function datasets($dir) {
+          $files = array();
+          $dirs = array();
+          // sort the names byte by byte, like Python does
+          $entries = scandir($dir, SCANDIR_SORT_NONE);
+          sort($entries, SORT_STRING);
+          foreach ($entries as $entry) {
+              if ($entry[0] == '.')
+                  continue;
+              if (is_dir("$dir/$entry"))
+                  $dirs[] = "$dir/$entry";
+              elseif (is_file("$dir/$entry") && preg_match('/\.json(\.gz|\.br)?$/', $entry))
+                  $files[] = "$dir/$entry";
           }
+          foreach ($dirs as $subdir)
+              $files = array_merge($files, datasets($subdir));
           return $files;
       }
+      // the index is used only while the directories it lists have not changed, so that
+      // the datasets added after its last update are listed as well
+      function current_index($file, $dir) {
+          $index = file_exists($file) ? json_decode(file_get_contents($file), true) : null;
+          if (!$index || !isset($index["directories"]))
+              return null;
+          foreach ($index["directories"] as $rel => $entry) {
+              // filemtime() has a resolution of one second
+              $mtime = @filemtime($rel === "" ? $dir : "$dir/$rel");
+              if ($mtime === false || $mtime != floor($entry["mtime"]))
+                  return null;
+          }
+          return $index;
+      }
+      // list the datasets from the index maintained by scripts/index_datasets.py, if available
+      function indexed($entry) {
+        return "'" . $entry["name"] . "'";
+      }
       $data = "data";
       if ($argc > 1) {$data = $argv[1];}
+      $dataset_index = ($data == "data") ? "dataset_index.json" : "${data}_dataset_index.json";
+      $index = current_index($dataset_index, $data);
       print("var data_name = \"$data\";\n");
-      print("var datasets = [ " . join(", ", array_map("preformat", rglob($data,"*.json"))) . " ];\n");
+      if ($index)
+        print("var datasets = [ " . join(", ", array_map("indexed", $index["datasets"])) . " ];\n");
+      else
+        print("var datasets = [ " . join(", ", array_map("preformat", datasets($data))) . " ];\n");
       print("var groups = [ " . join(", ", array_map("preformat", glob("groups/*.json"))) . " ];\n");
       print("var colours = [ " . join(", ", array_map("preformat", glob("colours/*.json"))) . " ];\n");
     ?>
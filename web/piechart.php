@@ -29,8 +29,10 @@
         $data_name = $_GET["data_name"];
       }
       $dataset_cache = "${data_name}_dataset.js";
+      $dataset_index = "${data_name}_dataset_index.json";
       if ($data_name == "data"){
         $dataset_cache = "dataset.js";
+        $dataset_index = "dataset_index.json";
       }
 
       function preformat($file) {
@@ -43,21 +45,55 @@
           return "'" . dirname($file) . "/" . basename($file, ".json") . "'";
       }
 
-      // from https://stackoverflow.com/a/17161106/2050986
-      // does not support flag GLOB_BRACE
-      function rglob($pattern, $flags = 0) {
-          $files = glob($pattern, $flags);
-          foreach (glob(dirname($pattern).'/*', GLOB_ONLYDIR) as $dir) {
-              $files = array_merge($files, rglob($dir.'/'.basename($pattern), $flags));
+      // list the datasets, also compressed with gzip or brotli, in the same order as
+      // scripts/index_datasets.py: the files of each directory sorted by name, then
+      // the content of its subdirectories
+      function datasets($dir) {
+          $files = array();
+          $dirs = array();
+          // sort the names byte by byte, like Python does
+          $entries = scandir($dir, SCANDIR_SORT_NONE);
+          sort($entries, SORT_STRING);
+          foreach ($entries as $entry) {
+              if ($entry[0] == '.')
+                  continue;
+              if (is_dir("$dir/$entry"))
+                  $dirs[] = "$dir/$entry";
+              elseif (is_file("$dir/$entry") && preg_match('/\.json(\.gz|\.br)?$/', $entry))
+                  $files[] = "$dir/$entry";
           }
+          foreach ($dirs as $subdir)
+              $files = array_merge($files, datasets($subdir));
           return $files;
       }
+      // the index is used only while the directories it lists have not changed, so that
+      // the datasets added after its last update are listed as well
+      function current_index($file, $dir) {
+          $index = file_exists($file) ? json_decode(file_get_contents($file), true) : null;
+          if (!$index || !isset($index["directories"]))
+              return null;
+          foreach ($index["directories"] as $rel => $entry) {
+              // filemtime() has a resolution of one second
+              $mtime = @filemtime($rel === "" ? $dir : "$dir/$rel");
+              if ($mtime === false || $mtime != floor($entry["mtime"]))
+                  return null;
+          }
+          return $index;
+      }
+      // list the datasets from the index maintained by scripts/index_datasets.py, if available
+      function indexed($entry) {
+        return "'" . $entry["name"] . "'";
+      }
       if (file_exists($dataset_cache)){
         print(file_get_contents($dataset_cache));
       }
       else {
         print("var data_name = \"$data_name\";");
-        print("var datasets = [ " . join(", ", array_map("preformat", rglob($data_name."/*.json"))) . " ];\n");
+        $index = current_index($dataset_index, $data_name);
+        if ($index)
+          print("var datasets = [ " . join(", ", array_map("indexed", $index["datasets"])) . " ];\n");
+        else
+          print("var datasets = [ " . join(", ", array_map("preformat", datasets($data_name))) . " ];\n");
         print("var groups = [ " . join(", ", array_map("preformat", glob("groups/*.json"))) . " ];\n");
         print("var colours = [ " . join(", ", array_map("preformat", glob("colours/*.json"))) . " ];\n");
       }
@@ -128,7 +164,7 @@
         </div>
         <div style="display:inline-block;">
           or <b>upload a file</b>
-          <input type="file" accept=".json" id="dataset_upload" oninput="uploadDataset(this.files)"/>
+          <input type="file" accept=".json,.gz,.br" id="dataset_upload" oninput="uploadDataset(this.files)"/>
         </div>
         <div style="display:inline-block;">
           <b>Metric</b>